@@ -0,0 +1,72 @@
+from typing import ClassVar
+
+import numpy as np
+import xarray as xr
+
+import xnemogcm  # noqa: F401, registers the ds.xnemogcm accessor
+
+
+def _ocean_dataset():
+    """
+    T field of a basin with about 35% of land points: land on the sides and at the
+    bottom, deeper in the middle of the basin
+    """
+    nt, nz, ny, nx = 12, 30, 400, 600
+    rng = np.random.default_rng(0)
+    depth = np.minimum(np.arange(nx), np.arange(nx)[::-1]) * 3 * nz / nx
+    bottom = np.broadcast_to(np.minimum(depth, nz).astype(int), (ny, nx))
+    tmask = np.arange(nz)[:, None, None] < bottom
+    return xr.Dataset(
+        {
+            "toce": (
+                ("t", "z_c", "y_c", "x_c"),
+                rng.random((nt, nz, ny, nx), dtype="float32"),
+            ),
+            "tmask": (("z_c", "y_c", "x_c"), tmask),
+            "e1t": (("y_c", "x_c"), np.full((ny, nx), 1e4)),
+            "e2t": (("y_c", "x_c"), np.full((ny, nx), 1e4)),
+            "e3t_0": (("z_c", "y_c", "x_c"), rng.random((nz, ny, nx)) + 1),
+        },
+        coords={"x_c": np.arange(nx), "y_c": np.arange(ny), "z_c": np.arange(nz)},
+    )
+
+
+class OceanMean:
+    """
+    Volume weighted mean of a T field over the ocean points, on the grid (masked)
+    or on the compact layout of the ocean points
+    """
+
+    params: ClassVar = ["grid", "compact"]
+    param_names: ClassVar = ["layout"]
+    timeout = 600
+
+    def setup(self, layout):
+        ds = _ocean_dataset()
+        if layout == "compact":
+            ds = ds.xnemogcm.compress(["toce"])
+        self.data = ds
+
+    def time_mean(self, layout):
+        self.data.xnemogcm.mean(["toce"])
+
+    def peakmem_mean(self, layout):
+        self.data.xnemogcm.mean(["toce"])
+
+
+class CompactLayout:
+    """
+    Conversions of a T field between the grid and the compact layout of the ocean points
+    """
+
+    timeout = 600
+
+    def setup(self):
+        self.ds = _ocean_dataset()
+        self.compact = self.ds.xnemogcm.compress(["toce"])
+
+    def time_compress(self):
+        self.ds.xnemogcm.compress(["toce"])
+
+    def time_decompress(self):
+        self.ds.xnemogcm.decompress(self.compact)
@@ -0,0 +1,24 @@
+from typing import ClassVar
+
+import xnemogcm
+
+from . import synthetic
+
+
+class OpenDomainCfg:
+    """
+    Opening of mesh masks with all the known variables, at ORCA resolutions
+    """
+
+    params: ClassVar = [(362, 332), (1442, 1021), (4322, 3059)]
+    param_names: ClassVar = ["shape"]
+    timeout = 600
+
+    def setup_cache(self):
+        for nx, ny in self.params:
+            synthetic.write_mesh_mask(
+                f"domcfg_{nx}", nx=nx, ny=ny, nz=75, header_only=True
+            )
+
+    def time_open_domain_cfg(self, shape):
+        xnemogcm.open_domain_cfg(datadir=f"domcfg_{shape[0]}")
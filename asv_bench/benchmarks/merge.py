@@ -0,0 +1,49 @@
+from typing import ClassVar
+
+import xnemogcm
+
+from . import synthetic
+
+
+class MergeNemoAndDomainCfg:
+    """
+    Merge of the nemo outputs with the domcfg at ORCA resolutions, with the coordinates
+    of the outputs shared with the domcfg (as given by open_nemo), or with other
+    coordinates, compared with the ones of the domcfg when merging
+    """
+
+    params: ClassVar = ([(362, 332), (1442, 1021), (4322, 3059)], [True, False])
+    param_names: ClassVar = ["shape", "shared_coords"]
+    timeout = 600
+
+    def setup_cache(self):
+        for nx, ny in self.params[0]:
+            synthetic.write_mesh_mask(
+                f"domcfg_{nx}", nx=nx, ny=ny, nz=75, header_only=True
+            )
+
+    def setup(self, shape, shared_coords):
+        nx, ny = shape
+        if not shared_coords and nx == 4322:
+            # xarray.merge loads the compared coordinates: 7.4 GiB for gdept_0
+            raise NotImplementedError
+        self.domcfg = xnemogcm.open_domain_cfg(datadir=f"domcfg_{nx}")
+        positions = [
+            (synthetic.nemo_dataset(point_type, nx, ny, 75, 12, lazy=True), point_type)
+            for point_type in "TUVW"
+        ]
+        self.nemo_ds = xnemogcm.process_nemo(positions, self.domcfg)
+        if not shared_coords:
+            # coordinates computed lazily from the ones of domcfg, compared when merging
+            self.nemo_ds = self.nemo_ds.assign_coords(
+                {
+                    i: self.nemo_ds[i].chunk("auto") + 0
+                    for i in ["glamt", "gphit", "gdept_0"]
+                }
+            )
+
+    def time_merge_nemo_and_domain_cfg(self, shape, shared_coords):
+        xnemogcm._merge_nemo_and_domain_cfg(self.nemo_ds, self.domcfg)
+
+    def peakmem_merge_nemo_and_domain_cfg(self, shape, shared_coords):
+        xnemogcm._merge_nemo_and_domain_cfg(self.nemo_ds, self.domcfg)
@@ -0,0 +1,53 @@
+from typing import ClassVar
+
+import dask.array as dsa
+import numpy as np
+import xarray as xr
+
+from xnemogcm.metrics import compute_missing_metrics
+
+
+class ComputeMissingMetrics:
+    """
+    Computation of the missing scale factors from a time varying e3t
+    """
+
+    params: ClassVar = ["xgcm", "numpy", "lazy"]
+    param_names: ClassVar = ["engine"]
+    timeout = 600
+
+    def setup(self, engine):
+        nt, nz, ny, nx = 4, 30, 400, 600
+        coords = {}
+        for axis, dim, n, shift in [
+            ("X", "x", nx, 0.5),
+            ("Y", "y", ny, 0.5),
+            ("Z", "z", nz, -0.5),
+        ]:
+            coords[f"{dim}_c"] = (f"{dim}_c", np.arange(n), {"axis": axis})
+            coords[f"{dim}_f"] = (
+                f"{dim}_f",
+                np.arange(n) + shift,
+                {"axis": axis, "c_grid_axis_shift": shift},
+            )
+        e3t = dsa.random.random((nt, nz, ny, nx), chunks=(1, nz, 200, 300))
+        self.ds = xr.Dataset(
+            {"e3t": (("t", "z_c", "y_c", "x_c"), e3t.astype("float32"))},
+            coords=coords,
+        )
+
+    def _compute_missing_metrics(self, engine):
+        if engine == "lazy":
+            return compute_missing_metrics(self.ds.copy(), lazy=True)
+        return compute_missing_metrics(self.ds.copy(), engine=engine)
+
+    def time_compute_missing_metrics(self, engine):
+        ds = self._compute_missing_metrics(engine)
+        xr.Dataset({i: ds[i] for i in ds.data_vars if i != "e3t"}).compute()
+
+    def time_graph(self, engine):
+        self._compute_missing_metrics(engine)
+
+    def time_e3u_region(self, engine):
+        ds = self._compute_missing_metrics(engine)
+        ds.e3u.isel(t=0, x_f=slice(0, 100), y_c=slice(0, 100)).compute()
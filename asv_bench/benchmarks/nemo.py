@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import ClassVar
+
+import xarray as xr
+
+import xnemogcm
+
+from . import synthetic
+
+
+class OpenNemoParallel:
+    """
+    Serial versus process pool opening (and preprocessing) of nemo files, against the
+    number of files and the number of worker processes
+    """
+
+    params: ClassVar = ([16, 64, 256], [False, 2, 4])
+    param_names: ClassVar = ["n_files", "parallel"]
+    timeout = 600
+
+    def setup_cache(self):
+        synthetic.write_mesh_mask("domcfg")
+        for n_files in self.params[0]:
+            synthetic.write_nemo_files(f"nemo_{n_files}", n_times=n_files // 4)
+
+    def setup(self, n_files, parallel):
+        self.domcfg = xnemogcm.open_domain_cfg(datadir="domcfg")
+        files = sorted(Path(f"nemo_{n_files}").glob("*grid_*.nc"))
+        self.positions = [(xr.open_dataset(f, chunks={}), None) for f in files]
+
+    def teardown(self, n_files, parallel):
+        for ds, _ in self.positions:
+            ds.close()
+
+    def time_open_nemo(self, n_files, parallel):
+        xnemogcm.open_nemo(
+            domcfg=self.domcfg, datadir=f"nemo_{n_files}", parallel=parallel
+        )
+
+    def time_process_nemo(self, n_files, parallel):
+        xnemogcm.process_nemo(self.positions, self.domcfg, parallel=parallel)
+
+
+class ProcessNemoCombine:
+    """
+    Combination of many datasets split along time (500 time steps x 4 point types)
+    """
+
+    params: ClassVar = ["by_point", "by_coords"]
+    param_names: ClassVar = ["combine"]
+    timeout = 600
+
+    def setup_cache(self):
+        synthetic.write_mesh_mask("domcfg", nx=10, ny=10, nz=2)
+
+    def setup(self, combine):
+        self.domcfg = xnemogcm.open_domain_cfg(datadir="domcfg")
+        self.positions = [
+            (
+                synthetic.nemo_dataset(point_type, nx=10, ny=10, nz=2, nt=1, t0=i),
+                point_type,
+            )
+            for i in range(500)
+            for point_type in "TUVW"
+        ]
+
+    def time_process_nemo(self, combine):
+        xnemogcm.process_nemo(self.positions, self.domcfg, combine=combine)
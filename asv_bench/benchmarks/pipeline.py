@@ -0,0 +1,110 @@
+from pathlib import Path
+from typing import ClassVar
+
+import xarray as xr
+
+import xnemogcm
+from xnemogcm.metrics import compute_missing_metrics
+
+from . import synthetic
+
+# ORCA2-like run, with a mesh mask split over 8 processors
+_shape = {"nx": 180, "ny": 148, "nz": 10}
+_tiles = (4, 2)
+_n_times = 8
+
+
+def _write_run(version):
+    synthetic.write_mesh_mask(
+        f"domcfg_{version}", **_shape, tiles=_tiles, version=version
+    )
+    synthetic.write_nemo_files(
+        f"nemo_{version}", **_shape, n_times=_n_times, version=version
+    )
+
+
+class Pipeline:
+    """
+    Time and peak memory of each step of the opening of a run, for the file layout
+    of each nemo version
+    """
+
+    params: ClassVar = synthetic.versions
+    param_names: ClassVar = ["version"]
+    timeout = 600
+
+    def setup_cache(self):
+        for version in self.params:
+            _write_run(version)
+
+    def setup(self, version):
+        self.domcfg = xnemogcm.open_domain_cfg(datadir=f"domcfg_{version}")
+        self.nemo_ds = xnemogcm.open_nemo(domcfg=self.domcfg, datadir=f"nemo_{version}")
+        self.ds = xnemogcm._merge_nemo_and_domain_cfg(self.nemo_ds, self.domcfg)
+
+    def _open_domain_cfg(self, version):
+        xnemogcm.open_domain_cfg(datadir=f"domcfg_{version}").load()
+
+    def time_open_domain_cfg(self, version):
+        self._open_domain_cfg(version)
+
+    def peakmem_open_domain_cfg(self, version):
+        self._open_domain_cfg(version)
+
+    def _open_nemo(self, version):
+        xnemogcm.open_nemo(domcfg=self.domcfg, datadir=f"nemo_{version}")
+
+    def time_open_nemo(self, version):
+        self._open_nemo(version)
+
+    def peakmem_open_nemo(self, version):
+        self._open_nemo(version)
+
+    def _merge(self):
+        xnemogcm._merge_nemo_and_domain_cfg(self.nemo_ds, self.domcfg)
+
+    def time_merge_nemo_and_domain_cfg(self, version):
+        self._merge()
+
+    def peakmem_merge_nemo_and_domain_cfg(self, version):
+        self._merge()
+
+    def _compute_missing_metrics(self):
+        ds = compute_missing_metrics(self.ds.copy(), engine="numpy")
+        xr.Dataset({i: ds[i] for i in ["e3f", "e3uw", "e3vw", "e3fw"]}).compute()
+
+    def time_compute_missing_metrics(self, version):
+        self._compute_missing_metrics()
+
+    def peakmem_compute_missing_metrics(self, version):
+        self._compute_missing_metrics()
+
+
+class ProcessNemo:
+    """
+    Time and peak memory of process_nemo on already opened datasets,
+    serial or in a process pool
+    """
+
+    params: ClassVar = (synthetic.versions, [False, True])
+    param_names: ClassVar = ["version", "parallel"]
+    timeout = 600
+
+    def setup_cache(self):
+        for version in self.params[0]:
+            _write_run(version)
+
+    def setup(self, version, parallel):
+        self.domcfg = xnemogcm.open_domain_cfg(datadir=f"domcfg_{version}")
+        files = sorted(Path(f"nemo_{version}").glob("*grid_*.nc"))
+        self.positions = [(xr.open_dataset(f, chunks={}), None) for f in files]
+
+    def teardown(self, version, parallel):
+        for ds, _ in self.positions:
+            ds.close()
+
+    def time_process_nemo(self, version, parallel):
+        xnemogcm.process_nemo(self.positions, self.domcfg, parallel=parallel)
+
+    def peakmem_process_nemo(self, version, parallel):
+        xnemogcm.process_nemo(self.positions, self.domcfg, parallel=parallel)
@@ -0,0 +1,254 @@
+"""
+Generators of synthetic NEMO-like files, used by the benchmarks.
+
+The files follow the layout of the NEMO versions of the test data ('3.6', '4.0',
+'4.2.0' and '5.0'): dimension and variable names, periodicity variable or attributes,
+and per-processor tiles of the mesh masks.
+"""
+
+from functools import partial
+from itertools import pairwise
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from xnemogcm.tools import get_domcfg_points
+
+versions = ["3.6", "4.0", "4.2.0", "5.0"]
+
+_depth_names = {"T": "deptht", "U": "depthu", "V": "depthv", "W": "depthw"}
+_3d_domcfg_variables = [
+    *["tmask", "umask", "vmask", "fmask", "gdept_0", "gdepw_0"],
+    *["e3t_0", "e3u_0", "e3v_0", "e3f_0", "e3w_0", "e3uw_0", "e3vw_0"],
+]
+# variables of the mesh masks that did not exist in nemo 3.6
+_new_domcfg_variables = [
+    *["e3t_0", "e3u_0", "e3v_0", "e3f_0", "e3w_0", "e3uw_0", "e3vw_0"],
+    *["gdept_0", "gdepw_0", "jperio", "ln_zco", "ln_zps", "ln_sco", "ln_isfcav"],
+]
+_variables = {
+    "T": ["toce", "soce", "e3t"],
+    "U": ["uoce", "e3u"],
+    "V": ["voce", "e3v"],
+    "W": ["woce", "e3w"],
+}
+_periodicity_attrs = {"Iperio": 0, "Jperio": 0, "NFold": 0, "NFtype": "-"}
+
+
+def _horizontal_dims(point_type, version, inner=False):
+    """
+    Return the names of the (y, x) dimensions of the nemo files
+    """
+    if version != "5.0":
+        return ("y", "x")
+    suffix = f"_grid_{point_type}" + ("_3D_inner" if inner else "")
+    return ("y" + suffix, "x" + suffix)
+
+
+def nemo_dataset(point_type, nx, ny, nz, nt, t0=0, version="4.0", lazy=False):
+    """
+    Return a dataset laid out as a raw NEMO output file of the given point type
+
+    The variables include the time varying scale factor of the point (e.g. 'e3t').
+    For nemo 5.0, the dimensions are suffixed by the grid (e.g. 'x_grid_T'), and
+    the scale factor is on the '3D_inner' dimensions.
+    If *lazy*, the horizontal variables are dask arrays (one chunk per time step),
+    which allows ORCA-size datasets that are never computed.
+    """
+    depth = _depth_names[point_type]
+    time = (t0 + np.arange(nt)) * 86400.0
+    if lazy:
+        import dask.array as da
+
+        rng = da.random.default_rng(0)
+        zeros = partial(da.zeros, chunks=-1)
+        chunks = {"chunks": (1, -1, -1, -1)}
+    else:
+        rng = np.random.default_rng(0)
+        zeros = np.zeros
+        chunks = {}
+    ds = xr.Dataset(
+        coords={
+            depth: (
+                depth,
+                np.arange(nz, dtype="float32"),
+                {"long_name": "Vertical levels"},
+            ),
+            "time_counter": (
+                "time_counter",
+                time,
+                {"bounds": "time_counter_bounds", "units": "seconds since 1900-01-01"},
+            ),
+        },
+        attrs={"description": f"ocean {point_type} grid variables"},
+    )
+    for inner in [False, True] if version == "5.0" else [False]:
+        y, x = _horizontal_dims(point_type, version, inner)
+        suffix = x[1:]
+        ds.coords["nav_lon" + suffix] = ((y, x), zeros((ny, nx), dtype="float32"))
+        ds.coords["nav_lat" + suffix] = ((y, x), zeros((ny, nx), dtype="float32"))
+    if version == "5.0":
+        inner_depth = f"grid_{point_type}_3D_inner"
+        ds.coords[inner_depth] = (
+            inner_depth,
+            np.arange(nz, dtype="float32"),
+            {"long_name": f"Vertical {point_type} levels"},
+        )
+    for v in _variables[point_type]:
+        dims = ("time_counter", depth, *_horizontal_dims(point_type, version))
+        if v.startswith("e3") and version == "5.0":
+            dims = (
+                "time_counter",
+                inner_depth,
+                *_horizontal_dims(point_type, version, True),
+            )
+        ds[v] = (dims, rng.random((nt, nz, ny, nx), dtype="float32", **chunks))
+    ds["time_counter_bounds"] = (
+        ("time_counter", "axis_nbounds"),
+        np.stack([time - 43200.0, time + 43200.0], axis=-1),
+    )
+    return ds
+
+
+def write_nemo_files(
+    path, nx=32, ny=22, nz=4, nt=1, n_times=1, points="TUVW", version="4.0"
+):
+    """
+    Write *n_times* files of *nt* time steps for each point type in *path*
+
+    Returns the list of written files.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i in range(n_times):
+        for point_type in points:
+            f = path / f"RUN_1d_{i:05d}_grid_{point_type}.nc"
+            nemo_dataset(
+                point_type, nx, ny, nz, nt, t0=i * nt, version=version
+            ).to_netcdf(f, unlimited_dims=["time_counter"])
+            files.append(f)
+    return files
+
+
+def domcfg_dataset(nx, ny, nz, version="4.0"):
+    """
+    Return a dataset laid out as a NEMO mesh_mask file, with all the known variables
+    of the given nemo version
+    """
+    time, depth = ("t", "z") if version == "3.6" else ("time_counter", "nav_lev")
+    ds = xr.Dataset(coords={"nav_lev": (depth, np.arange(nz, dtype="float32"))})
+    rng = np.random.default_rng(0)
+    for name, point_type in get_domcfg_points().items():
+        if version == "3.6" and name in _new_domcfg_variables:
+            continue
+        if version in ["4.2.0", "5.0"] and point_type is None:
+            # replaced by global attributes
+            continue
+        if point_type is None:
+            ds[name] = ((), np.int32(0))
+        elif name.endswith("_1d"):
+            ds[name] = ((time, depth), rng.random((1, nz)))
+        elif name in _3d_domcfg_variables:
+            ds[name] = ((time, depth, "y", "x"), rng.random((1, nz, ny, nx)))
+        else:
+            ds[name] = ((time, "y", "x"), rng.random((1, ny, nx)))
+    if version in ["4.2.0", "5.0"]:
+        ds["x"] = (("y", "x"), np.zeros((ny, nx), dtype="float32"))
+        ds["y"] = (("y", "x"), np.zeros((ny, nx), dtype="float32"))
+        ds.attrs.update(_periodicity_attrs)
+    return ds
+
+
+def _tiles(nx, ny, tiles):
+    """
+    Return the (x, y) slices of the processor tiles of a (nx, ny) domain split
+    in *tiles* = (n_tiles_x, n_tiles_y)
+    """
+    bounds_x = np.linspace(0, nx, tiles[0] + 1).astype(int)
+    bounds_y = np.linspace(0, ny, tiles[1] + 1).astype(int)
+    return [
+        (slice(x0, x1), slice(y0, y1))
+        for y0, y1 in pairwise(bounds_y)
+        for x0, x1 in pairwise(bounds_x)
+    ]
+
+
+def _domain_attrs(nx, ny, tiles, i, sx, sy):
+    """
+    Return the DOMAIN_* attributes written by NEMO in the file of the tile *i*
+    """
+    return {
+        "DOMAIN_number_total": np.int32(tiles[0] * tiles[1]),
+        "DOMAIN_number": np.int32(i),
+        "DOMAIN_dimensions_ids": np.array([1, 2], dtype="int32"),
+        "DOMAIN_size_global": np.array([nx, ny], dtype="int32"),
+        "DOMAIN_size_local": np.array(
+            [sx.stop - sx.start, sy.stop - sy.start], dtype="int32"
+        ),
+        "DOMAIN_position_first": np.array([sx.start + 1, sy.start + 1], dtype="int32"),
+        "DOMAIN_position_last": np.array([sx.stop, sy.stop], dtype="int32"),
+        "DOMAIN_halo_size_start": np.array([0, 0], dtype="int32"),
+        "DOMAIN_halo_size_end": np.array([0, 0], dtype="int32"),
+        "DOMAIN_type": "BOX",
+    }
+
+
+def _write_header(f, ds, sizes, attrs):
+    """
+    Write the file *f* with the dimensions and variables of *ds* (with the dimension
+    *sizes*), without writing the data: the variables read as fill values.
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(f, "w") as nc:
+        for dim, size in sizes.items():
+            nc.createDimension(dim, size)
+        for name, var in ds.variables.items():
+            nc_var = nc.createVariable(name, var.dtype, var.dims)
+            if name == "nav_lev":
+                nc_var[:] = np.arange(sizes[var.dims[0]])
+        nc.setncatts(attrs)
+
+
+def write_mesh_mask(
+    path, nx=32, ny=22, nz=4, header_only=False, tiles=(1, 1), version="4.0"
+):
+    """
+    Write a mesh_mask in *path* and return the list of its files
+
+    The mesh_mask is a single 'mesh_mask.nc' file if *tiles* is (1, 1), else one
+    'mesh_mask_XXXX.nc' file per processor tile with the DOMAIN_* attributes.
+    If *header_only*, the variables are defined but never written (they read as
+    fill values), which allows ORCA-size files that are created instantly.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    time, depth = ("t", "z") if version == "3.6" else ("time_counter", "nav_lev")
+    if header_only:
+        ds = domcfg_dataset(1, 1, 1, version)
+    else:
+        ds = domcfg_dataset(nx, ny, nz, version)
+    files = []
+    for i, (sx, sy) in enumerate(_tiles(nx, ny, tiles)):
+        if tiles == (1, 1):
+            f = path / "mesh_mask.nc"
+            attrs = dict(ds.attrs)
+        else:
+            f = path / f"mesh_mask_{i:04d}.nc"
+            attrs = {**_domain_attrs(nx, ny, tiles, i, sx, sy), **ds.attrs}
+        if header_only:
+            sizes = {
+                time: 1,
+                depth: nz,
+                "y": sy.stop - sy.start,
+                "x": sx.stop - sx.start,
+            }
+            _write_header(f, ds, sizes, attrs)
+        else:
+            tile = ds.isel(x=sx, y=sy)
+            tile.attrs = attrs
+            tile.to_netcdf(f)
+        files.append(f)
+    return files
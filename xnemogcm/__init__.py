@@ -3,7 +3,13 @@ __version__ = "0.6.0"
 # ruff: noqa: F401
 
 from .domcfg import open_domain_cfg
+from .recombine import recombine_domain_cfg, recombine_nemo
 from .nemo import open_nemo, process_nemo
 from .merge import _merge_nemo_and_domain_cfg, open_nemo_and_domain_cfg
+from .instrument import instrument
+from .export import to_zarr
 from .metrics import get_metrics
+from .masks import compute_missing_masks
+from .accessor import NemoAccessor
 from .namelist import open_namelist
+from .watch import NemoRunWatcher
@@ -0,0 +1,116 @@
+import xarray as xr
+
+from . import compact
+from .masks import _is_mask, _mask_name, compute_missing_masks
+
+
+@xr.register_dataset_accessor("xnemogcm")
+class NemoAccessor:
+    """
+    Accessor of the datasets opened by xnemogcm, available as ds.xnemogcm after
+    importing xnemogcm, e.g. ds.xnemogcm.mask() or ds.xnemogcm.get_mask('umask').
+
+    The ocean points can also be stored in a compact layout, without the land points,
+    with ds.xnemogcm.compress(), and scattered back to the grid with
+    ds.xnemogcm.decompress(compact).
+
+    The masks missing from the dataset are computed once per dataset
+    (see compute_missing_masks).
+    """
+
+    def __init__(self, ds):
+        self._ds = ds
+        self._masks = {}
+
+    def get_mask(self, name):
+        """
+        Return the boolean mask *name* of the dataset (e.g. 'tmask', 'fmaskutil'),
+        computed from the tmask (or from 'top_level' and 'bottom_level') if missing
+
+        Returns
+        -------
+        mask : xarray.DataArray
+        """
+        if name not in self._masks:
+            if name in self._ds.variables:
+                mask = self._ds[name].astype(bool, copy=False)
+            else:
+                mask = compute_missing_masks(self._ds, [name])[name]
+            self._masks[name] = mask
+        return self._masks[name]
+
+    def mask(self, variables=None, other=None):
+        """
+        Mask the land points of the variables with the mask of their grid point
+        (e.g. 'umask' for a variable on ('t', 'z_c', 'y_c', 'x_f'), 'tmaskutil' for
+        a variable on ('t', 'y_c', 'x_c')).
+
+        The masks are applied as booleans with DataArray.where: the masks are never
+        converted to float, and the masking is lazy for dask variables.
+
+        Parameters
+        ----------
+        variables : str, list or None
+            Name(s) of the variables to mask. If None, all the data variables on a
+            horizontal grid point, except the masks themselves.
+        other : scalar or None
+            Value of the land points, if None NaN (or the missing value of the dtype)
+
+        Returns
+        -------
+        The masked DataArray if *variables* is a str, else the dataset with the
+        masked variables
+        """
+        ds = self._ds
+        names = [variables] if isinstance(variables, str) else variables
+        if names is None:
+            names = [
+                name
+                for name, da in ds.data_vars.items()
+                if not _is_mask(name) and _mask_name(da.dims) is not None
+            ]
+        masked = {}
+        for name in names:
+            mask_name = _mask_name(ds[name].dims)
+            if mask_name is None:
+                raise ValueError(
+                    f"The variable {name} is not on a horizontal grid point, we got the dimensions {ds[name].dims}"
+                )
+            mask = self.get_mask(mask_name).variable
+            if other is None:
+                masked[name] = ds[name].where(mask)
+            else:
+                masked[name] = ds[name].where(mask, other)
+        if isinstance(variables, str):
+            return masked[variables]
+        return ds.assign(masked)
+
+    def compress(self, variables=None, point_type="T", surface=False):
+        """
+        Return the variables on their ocean points only, along the 'ocean' dimension,
+        see xnemogcm.compact.compress
+        """
+        return compact.compress(self._ds, variables, point_type, surface)
+
+    def decompress(self, compact_ds, variables=None):
+        """
+        Scatter the variables of *compact_ds* (returned by compress) back to the grid
+        of the dataset, see xnemogcm.compact.decompress
+        """
+        return compact.decompress(compact_ds, self._ds, variables)
+
+    def integral(self, variables=None):
+        """
+        Return the integral of the variables over the ocean points, weighted by the
+        volume (or area) of the cells, for a dataset on the grid or compressed.
+        See xnemogcm.compact.integral
+        """
+        return compact.integral(self._ds, variables)
+
+    def mean(self, variables=None):
+        """
+        Return the mean of the variables over the ocean points, weighted by the
+        volume (or area) of the cells, for a dataset on the grid or compressed.
+        See xnemogcm.compact.mean
+        """
+        return compact.mean(self._ds, variables)
@@ -1,44 +1,102 @@
+from types import MappingProxyType
+from typing import ClassVar
+
 # Needs to start with variables that have 2 letters for regex
 ALL_POINTS = ["UW", "VW", "FW", "T", "U", "V", "F", "W"]
 
+# (x, y, z) dimensions of each point type
+# x_c / y_c / z_c: center of the cell, x_f / y_f / z_f: face of the cell
+DIMS = MappingProxyType(
+    {
+        "T": ("x_c", "y_c", "z_c"),
+        "U": ("x_f", "y_c", "z_c"),
+        "V": ("x_c", "y_f", "z_c"),
+        "F": ("x_f", "y_f", "z_c"),
+        "W": ("x_c", "y_c", "z_f"),
+        "UW": ("x_f", "y_c", "z_f"),
+        "VW": ("x_c", "y_f", "z_f"),
+        "FW": ("x_f", "y_f", "z_f"),
+    }
+)
+
 
 class Point:
     """
     Class that represents the Arakawa points (i.e. center point, face, edge, etc).
+
+    Instances are immutable and cached: Point('T') always returns the same object.
     """
 
-    def __init__(self, point_type):
+    __slots__ = ("point_type", "x", "y", "z")
+    _instances: ClassVar[dict] = {}
+
+    def __new__(cls, point_type):
         """
         point_type : 'T', 'U', 'V', 'F', 'W', 'UW', 'VW', 'FW'
         """
+        try:
+            return cls._instances[point_type]
+        except (KeyError, TypeError):
+            pass
         if point_type not in ALL_POINTS:
             raise (
                 ValueError(
                     f"*point_type* must be in ['T', 'U', 'V', 'F', 'W', 'UW', 'VW', 'FW'] \n   We got point_type={point_type}"
                 )
             )
-        self.point_type = point_type
-        self.get_x()
-        self.get_y()
-        self.get_z()
+        self = super().__new__(cls)
+        x, y, z = DIMS[point_type]
+        for name, value in [("point_type", point_type), ("x", x), ("y", y), ("z", z)]:
+            object.__setattr__(self, name, value)
+        cls._instances[point_type] = self
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Point objects are immutable")
+
+    def __reduce__(self):
+        return (Point, (self.point_type,))
+
+    def __repr__(self):
+        return f"Point('{self.point_type}')"
 
     def get_x(self):
-        if self.point_type in ["T", "V", "W", "VW"]:
-            # Center of the cell
-            self.x = "x_c"
-        elif self.point_type in ["U", "F", "UW", "FW"]:
-            # Face of the cell
-            self.x = "x_f"
+        return self.x
 
     def get_y(self):
-        if self.point_type in ["T", "U", "W", "UW"]:
-            # Center of the cell
-            self.y = "y_c"
-        elif self.point_type in ["V", "F", "VW", "FW"]:
-            self.y = "y_f"
+        return self.y
 
     def get_z(self):
-        if self.point_type in ["T", "U", "V", "F"]:
-            self.z = "z_c"
-        elif self.point_type in ["W", "UW", "VW", "FW"]:
-            self.z = "z_f"
+        return self.z
+
+
+def get_dims(point_types):
+    """
+    Return the (x, y, z) dimensions of each point type of *point_types*
+    """
+    return [DIMS[point_type] for point_type in point_types]
+
+
+def get_rename_dims(points, old_dims=("x", "y", "nav_lev")):
+    """
+    Return how to rename the dimensions of many variables at once
+
+    Parameters
+    ----------
+    points : dict
+        {variable: point_type}, e.g. as returned by xnemogcm.tools.get_domcfg_points.
+        Variables with a None point type are skipped
+    old_dims : tuple
+        The names of the (x, y, z) dimensions in the raw NEMO files
+
+    Returns
+    -------
+    rename : dict
+        {variable: {old_x: new_x, old_y: new_y, old_z: new_z}}
+        e.g. {'e1u': {'x': 'x_f', 'y': 'y_c', 'nav_lev': 'z_c'}, ...}
+    """
+    return {
+        var: dict(zip(old_dims, DIMS[point_type]))
+        for var, point_type in points.items()
+        if point_type is not None
+    }
@@ -0,0 +1,179 @@
+import numpy as np
+import xarray as xr
+
+from . import arakawa_points as akp
+
+# jperio (NEMO <= 4.0): (cyclic east-west, cyclic north-south, north fold pivot)
+# jperio = 2 (symmetric across the equator) is treated as closed
+_jperio = {
+    0: (False, False, None),
+    1: (True, False, None),
+    2: (False, False, None),
+    3: (False, False, "T"),
+    4: (True, False, "T"),
+    5: (False, False, "F"),
+    6: (True, False, "F"),
+    7: (True, True, None),
+}
+
+
+def get_periodicity(ds):
+    """
+    Return the lateral boundary conditions of the NEMO grid of *ds*
+
+    They are read from the 'jperio' variable (NEMO <= 4.0) or from the 'Iperio', 'Jperio',
+    'NFold' and 'NFtype' attributes (NEMO >= 4.2). If none are found, the domain is closed.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        domcfg dataset, or merged nemo and domcfg dataset
+
+    Returns
+    -------
+    periodicity : tuple
+        (cyclic_x, cyclic_y, fold), with fold None (no north fold) or the pivot 'T' or 'F'
+    """
+    if "Iperio" in ds.attrs:
+        fold = None
+        if int(ds.attrs.get("NFold", 0)) == 1:
+            fold = str(ds.attrs["NFtype"])
+        return (
+            int(ds.attrs["Iperio"]) == 1,
+            int(ds.attrs.get("Jperio", 0)) == 1,
+            fold,
+        )
+    if "jperio" in ds:
+        jperio = int(ds["jperio"].values)
+        if jperio not in _jperio:
+            raise ValueError(f"Unknown jperio value, we got jperio={jperio}")
+        return _jperio[jperio]
+    return (False, False, None)
+
+
+def _north_fold_ops(point_type, fold, n):
+    """
+    Return the copies made by NEMO on the last rows for the north fold (lbc_nfd),
+    in the order of the NEMO loops.
+
+    Returns
+    -------
+    ops : list of tuples
+        [(row, source_row, columns, source_columns), ...] with python (0 based) indices,
+        the rows being counted from the end (-1 is the last row)
+    """
+    if point_type in ["W", "UW", "VW", "FW"]:
+        point_type = {"W": "T", "UW": "U", "VW": "V", "FW": "F"}[point_type]
+    i = np.arange(n)
+    half = n // 2
+    if fold == "T":
+        if point_type == "T":
+            return [
+                (-1, -3, i[1:], n - i[1:]),
+                (-1, -3, [0], [2]),
+                (-2, -2, i[half:], n - i[half:]),
+            ]
+        if point_type == "U":
+            return [
+                (-1, -3, i[:-1], n - 1 - i[:-1]),
+                (-1, -3, [0, n - 1], [1, n - 2]),
+                (-2, -2, i[half - 1 : -1], n - 1 - i[half - 1 : -1]),
+            ]
+        if point_type == "V":
+            return [
+                (-2, -3, i[1:], n - i[1:]),
+                (-1, -4, i[1:], n - i[1:]),
+                (-1, -4, [0], [2]),
+            ]
+        if point_type == "F":
+            return [
+                (-2, -3, i[:-1], n - 1 - i[:-1]),
+                (-1, -4, i[:-1], n - 1 - i[:-1]),
+                (-1, -4, [0, n - 1], [1, n - 2]),
+            ]
+    if fold == "F":
+        if point_type == "T":
+            return [(-1, -2, i, n - 1 - i)]
+        if point_type == "U":
+            return [
+                (-1, -2, i[:-1], n - 2 - i[:-1]),
+                (-1, -2, [n - 1], [0]),
+            ]
+        if point_type == "V":
+            return [
+                (-1, -3, i, n - 1 - i),
+                (-2, -2, i[half:], n - 1 - i[half:]),
+            ]
+        if point_type == "F":
+            return [
+                (-1, -3, i[:-1], n - 2 - i[:-1]),
+                (-1, -3, [n - 1], [0]),
+                (-2, -2, i[half:-1], n - 2 - i[half:-1]),
+            ]
+    raise ValueError(
+        f"Unknown north fold, we got fold={fold} and point_type={point_type}"
+    )
+
+
+def _north_fold(var, x, y, point_type, fold):
+    """
+    Set the last rows of the variable *var* (with dimensions *x* and *y*) as NEMO does
+    for the north fold.
+
+    The copies are applied on integer indices first, in the order of the NEMO loops
+    (a copy may read a value written by a previous one), and the data is then gathered at once.
+    """
+    n = var.sizes[x]
+    n_rows = 4
+    # position of each value of the last rows, in the concatenation of the original rows
+    gather = {row: row * n + np.arange(n) for row in range(-n_rows, 0)}
+    for row, source_row, columns, source_columns in _north_fold_ops(
+        point_type, fold, n
+    ):
+        for i, j in zip(columns, source_columns):
+            gather[row][i] = gather[source_row][j]
+    rows = xr.Variable.concat([var.isel({y: row}) for row in range(-n_rows, 0)], dim=x)
+    # indices in the concatenation are counted from its start
+    rows = xr.Variable.concat(
+        [rows.isel({x: gather[row] + n_rows * n}) for row in range(-n_rows, 0)],
+        dim=y,
+    ).transpose(*var.dims)
+    return xr.Variable.concat([var.isel({y: slice(None, -n_rows)}), rows], dim=y)
+
+
+def lbc_lnk(var, point_type, periodicity):
+    """
+    Apply the lateral boundary conditions of NEMO on the variable *var*
+
+    The NEMO halos are supposed to be in the data, as in the NEMO output files:
+    for a cyclic east-west domain the first and last columns are copies of the columns
+    -2 and 1 (e.g. 182 columns for ORCA2), and the last rows are set by the north fold.
+
+    Parameters
+    ----------
+    var : xarray.Variable or xarray.DataArray
+        The variable, on its grid point (e.g. with dimensions 'x_f' and 'y_c' for a U point)
+    point_type : str
+        'T', 'U', 'V', 'F', 'W', 'UW', 'VW' or 'FW'
+    periodicity : tuple
+        As returned by get_periodicity
+
+    Returns
+    -------
+    var : the variable with its halos set
+    """
+    cyclic_x, cyclic_y, fold = periodicity
+    x, y, _ = akp.DIMS[point_type]
+    # the coordinates of a DataArray are kept
+    variable = var.variable if isinstance(var, xr.DataArray) else var
+    if cyclic_x and x in variable.dims:
+        n = variable.sizes[x]
+        variable = variable.isel({x: np.r_[n - 2, 1 : n - 1, 1]})
+    if cyclic_y and y in variable.dims:
+        n = variable.sizes[y]
+        variable = variable.isel({y: np.r_[n - 2, 1 : n - 1, 1]})
+    if fold is not None and x in variable.dims and y in variable.dims:
+        variable = _north_fold(variable, x, y, point_type, fold)
+    if isinstance(var, xr.DataArray):
+        return var.copy(data=variable.data)
+    return variable
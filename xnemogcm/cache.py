@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+
+def _file_fingerprint(f):
+    """
+    Return (path, size, mtime) describing the state of the file *f* on disk
+    """
+    f = Path(f).expanduser().resolve()
+    stat = f.stat()
+    return (str(f), stat.st_size, stat.st_mtime_ns)
+
+
+def _fingerprint(files):
+    """
+    Return a list of (path, size, mtime) describing the state of *files* on disk
+    """
+    return sorted(_file_fingerprint(f) for f in files)
+
+
+def _cache_key(files, options):
+    """
+    Return the name of the cache entry for *files* opened with *options*.
+
+    The key depends on the path, size and modification time of each file,
+    on the options given to the opening function and on the xnemogcm version,
+    so that any change in one of those invalidates the entry.
+    """
+    from . import __version__
+
+    content = json.dumps(
+        {
+            "version": __version__,
+            "files": _fingerprint(files),
+            "options": options,
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _arrays_files(entry):
+    """
+    Return the .npy files of the arrays stored with the cache *entry* (see cached_arrays)
+    """
+    return list(entry.parent.glob(f"{entry.stem}.*.npy"))
+
+
+def _evict(cache_dir, max_size, keep=()):
+    """
+    Remove the least recently used entries of *cache_dir* until its size is below *max_size* bytes.
+
+    The entries in *keep* are never removed. The arrays stored with an entry are
+    removed with it.
+    """
+    if max_size is None:
+        return
+    entries = [
+        (f, f.stat(), [(i, i.stat().st_size) for i in _arrays_files(f)])
+        for f in Path(cache_dir).glob("*.nc")
+    ]
+    sizes = [stat.st_size + sum(i for _, i in arrays) for _, stat, arrays in entries]
+    total = sum(sizes)
+    # oldest access first
+    for (f, stat, arrays), size in sorted(
+        zip(entries, sizes), key=lambda i: i[0][1].st_mtime_ns
+    ):
+        if total <= max_size:
+            break
+        if f.name in keep:
+            continue
+        f.unlink(missing_ok=True)
+        for i, _ in arrays:
+            i.unlink(missing_ok=True)
+        total -= size
+
+
+def open_cached(cache_dir, files, options, build, max_size=None, chunks=None):
+    """
+    Return the dataset built by *build()* from *files*, using an on-disk cache.
+
+    If an entry matching *files* and *options* exists in *cache_dir*, it is
+    opened lazily and returned. Otherwise, the dataset is built, stored as a
+    netcdf file in *cache_dir* and reopened from there.
+
+    Parameters
+    ----------
+    cache_dir : string or pathlib.Path
+        The directory containing the cache entries. Created if needed.
+    files : list
+        The source files of the dataset, used to invalidate the entry
+    options : dict
+        The options used to build the dataset, part of the cache key
+    build : callable
+        Function without arguments returning the dataset
+    max_size : int or None
+        Maximum size in bytes of *cache_dir*. The least recently used entries
+        are removed when the limit is exceeded. If None, no entry is removed.
+    chunks : int, dict or None
+        The chunks used to reopen the entry, see xarray.open_dataset.
+        If None, the entry is opened with its storage chunks.
+
+    Returns
+    -------
+    ds : xarray.Dataset
+    """
+    cache_dir = Path(cache_dir).expanduser()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{_cache_key(files, options)}.nc"
+    if not path.exists():
+        ds = build()
+        # write into a temporary file first so that concurrent jobs never read a partial entry
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            ds.to_netcdf(tmp)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+    else:
+        # mark the entry as recently used
+        os.utime(path)
+    _evict(cache_dir, max_size, keep=(path.name,))
+    return xr.open_dataset(path, chunks={} if chunks is None else chunks)
+
+
+def cached_arrays(cache_dir, files, options, arrays):
+    """
+    Return the *arrays* computed once and stored as .npy files in *cache_dir*,
+    memory-mapped (read-only) so that their pages are shared by all the processes
+    using them.
+
+    The arrays are stored with the entry of *files* and *options* (see open_cached),
+    and removed with it. They are computed with a single dask.compute, only the
+    ones not yet stored being computed.
+
+    Parameters
+    ----------
+    cache_dir : string or pathlib.Path
+        The directory containing the cache entries
+    files : list
+        The source files of the arrays, used to invalidate them
+    options : dict
+        The options used to build the arrays, part of the cache key
+    arrays : dict
+        {name: dask or numpy array}
+
+    Returns
+    -------
+    arrays : dict
+        {name: numpy.memmap}
+    """
+    import dask
+
+    cache_dir = Path(cache_dir).expanduser()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = _cache_key(files, options)
+    # the dtype is part of the name, e.g. for the masks opened as int8 or as booleans
+    paths = {
+        name: cache_dir / f"{key}.{name}.{np.dtype(array.dtype)}.npy"
+        for name, array in arrays.items()
+    }
+    missing = [name for name, path in paths.items() if not path.exists()]
+    for name, value in zip(missing, dask.compute(*[arrays[i] for i in missing])):
+        # write into a temporary file first so that concurrent jobs never read a partial array
+        tmp = paths[name].with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, np.asarray(value))
+            os.replace(tmp, paths[name])
+        finally:
+            tmp.unlink(missing_ok=True)
+    return {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
@@ -0,0 +1,220 @@
+import numpy as np
+import xarray as xr
+
+from . import arakawa_points as akp
+from .masks import _MASK_NAMES, _MASKUTIL_NAMES, _is_mask, _mask_name
+
+# dimension of the ocean points in the compact layout
+OCEAN_DIM = "ocean"
+
+
+def _point_dims(point_type, surface):
+    """Return the (z, y, x) dimensions of *point_type*, (y, x) if *surface*"""
+    point = akp.Point(point_type)
+    return (point.y, point.x) if surface else (point.z, point.y, point.x)
+
+
+def _on_point(da, dims):
+    """
+    Whether the DataArray *da* is on the grid point of *dims* (see _point_dims), e.g.
+    a 3D variable is not on the surface points
+    """
+    vertical = {"z_c", "z_f"} & set(da.dims) - set(dims)
+    return set(dims) <= set(da.dims) and not vertical
+
+
+def _positions(mask):
+    """
+    Return the positions of the True points of the numpy *mask*, along each of its axes,
+    in the C order. The first axis is processed slice by slice to limit the memory used
+    by the int64 indices of numpy.nonzero.
+    """
+    if mask.ndim == 2:
+        return tuple(i.astype(np.int32) for i in np.nonzero(mask))
+    positions = [[], [], []]
+    for k, level in enumerate(mask):
+        j, i = np.nonzero(level)
+        positions[0].append(np.full(j.size, k, dtype=np.int32))
+        positions[1].append(j.astype(np.int32))
+        positions[2].append(i.astype(np.int32))
+    return tuple(np.concatenate(i) for i in positions)
+
+
+def _cell_measure(ds, point_type, surface):
+    """
+    Return the horizontal area (e1 * e2) or the volume (e1 * e2 * e3) of the cells of
+    *point_type*, the time varying e3 being used if in *ds* (else e3x_0)
+    """
+    horizontal = point_type.removesuffix("W").lower() or "t"
+    measure = ds[f"e1{horizontal}"] * ds[f"e2{horizontal}"]
+    if not surface:
+        e3 = f"e3{point_type.lower()}"
+        measure = measure * ds[e3 if e3 in ds else e3 + "_0"]
+    return measure.reset_coords(drop=True)
+
+
+def compress(ds, variables=None, point_type="T", surface=False):
+    """
+    Return the variables of *ds* on their ocean points only, along the 'ocean' dimension.
+
+    The ocean points are the ones of the mask of *point_type* (e.g. the tmask, computed
+    if missing, see compute_missing_masks), in the order of the grid (z, then y, then x).
+    The coordinates of the points ('x_c', 'y_c', 'z_c', 'glamt', 'gdept_0', etc) are
+    kept along 'ocean', and the 'volume' (or 'area' if *surface*) coordinate is added,
+    the cell measure used by integral and mean.
+    The variables are gathered lazily if they are dask arrays, see decompress to scatter
+    them back to the grid.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        merged nemo and domcfg dataset (e.g. opened with open_nemo_and_domain_cfg)
+    variables : list or None
+        The variables to compress. If None, all the data variables on the grid
+        point (3D, or 2D if *surface*), except the masks.
+    point_type : str
+        'T', 'U', 'V', 'F', 'W', 'UW', 'VW' or 'FW'
+    surface : bool, default False
+        If True, compress the 2D variables on the surface ocean points
+        (e.g. 'tmaskutil'), with the 'area' coordinate.
+
+    Returns
+    -------
+    compact : xarray.Dataset
+    """
+    if surface and point_type not in _MASKUTIL_NAMES:
+        raise ValueError(
+            f"*point_type* must be in {list(_MASKUTIL_NAMES)} with surface=True, we got point_type={point_type}"
+        )
+    dims = _point_dims(point_type, surface)
+    if variables is None:
+        variables = [
+            name
+            for name, da in ds.data_vars.items()
+            if not _is_mask(name) and _on_point(da, dims)
+        ]
+    for name in variables:
+        if not _on_point(ds[name], dims):
+            raise ValueError(
+                f"The variable {name} is not on the {'surface ' if surface else ''}{point_type} points, we got the dimensions {ds[name].dims}"
+            )
+    mask_name = (_MASKUTIL_NAMES if surface else _MASK_NAMES)[point_type]
+    mask = ds.xnemogcm.get_mask(mask_name).transpose(*dims)
+    indexers = {
+        dim: xr.DataArray(positions, dims=OCEAN_DIM)
+        for dim, positions in zip(dims, _positions(mask.values))
+    }
+    measure = _cell_measure(ds, point_type, surface)
+    compact = ds[variables].assign_coords({"area" if surface else "volume": measure})
+    return compact.isel(indexers)
+
+
+def decompress(compact, ds, variables=None):
+    """
+    Scatter the variables of the *compact* dataset back to the grid of *ds*, the
+    land points being NaN.
+
+    Parameters
+    ----------
+    compact : xarray.Dataset
+        dataset returned by compress
+    ds : xarray.Dataset
+        dataset whose grid was compressed (e.g. the one given to compress)
+    variables : list or None
+        The variables to scatter, if None all the data variables of *compact*
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        The variables on the grid of *ds*, with the coordinates of *ds*
+    """
+    if variables is None:
+        variables = list(compact.data_vars)
+    dims = [dim for dim in ["z_c", "z_f", "y_c", "y_f", "x_c", "x_f"] if dim in compact]
+    # position of each grid point in 'ocean', the land points being after the last one
+    n = compact.sizes[OCEAN_DIM]
+    shape = [ds.sizes[dim] for dim in dims]
+    inverse = np.full(shape, n, dtype=np.int64)
+    positions = [ds.indexes[dim].get_indexer(compact[dim].values) for dim in dims]
+    inverse[tuple(positions)] = np.arange(n)
+    inverse = xr.DataArray(inverse, dims=dims)
+    dense = {}
+    for name in variables:
+        var = compact[name].reset_coords(drop=True).pad({OCEAN_DIM: (0, 1)})
+        dense[name] = var.isel({OCEAN_DIM: inverse})
+    dense = xr.Dataset(dense)
+    coords = {
+        name: coord
+        for name, coord in ds.coords.items()
+        if set(coord.dims) <= set(dense.dims)
+    }
+    return dense.assign_coords(coords)
+
+
+def _measure(ds, name):
+    """
+    Return the cell measure of the variable *name* and the dimensions to reduce:
+    the 'volume' or 'area' coordinate of a compact dataset, or computed from the scale
+    factors (and masked) for a variable on the grid
+    """
+    da = ds[name]
+    if OCEAN_DIM in da.dims:
+        measure = "volume" if "volume" in ds.coords else "area"
+        return ds[measure], [OCEAN_DIM]
+    mask_name = _mask_name(da.dims)
+    if mask_name is None:
+        raise ValueError(
+            f"The variable {name} is not on a horizontal grid point nor compressed, we got the dimensions {da.dims}"
+        )
+    surface = mask_name.endswith("util")
+    names = _MASKUTIL_NAMES if surface else _MASK_NAMES
+    point_type = {name: p for p, name in names.items()}[mask_name]
+    dims = _point_dims(point_type, surface)
+    mask = ds.xnemogcm.get_mask(mask_name)
+    return _cell_measure(ds, point_type, surface).where(mask, 0), list(dims)
+
+
+def _reduced_variables(ds):
+    """
+    Return the variables of *ds* that can be integrated: the compressed variables of a
+    compact dataset, or the variables on a horizontal grid point (except the masks)
+    """
+    if OCEAN_DIM in ds.dims:
+        return [name for name, da in ds.data_vars.items() if OCEAN_DIM in da.dims]
+    return [
+        name
+        for name, da in ds.data_vars.items()
+        if not _is_mask(name) and _mask_name(da.dims) is not None
+    ]
+
+
+def integral(ds, variables=None):
+    """
+    Return the integral of the variables over their ocean points, weighted by the
+    volume of the cells (e1 * e2 * e3, or the area e1 * e2 for 2D variables).
+
+    The variables are either on the grid (masked with the mask of their grid point)
+    or compressed (along the 'ocean' dimension, see compress).
+    """
+    if variables is None:
+        variables = _reduced_variables(ds)
+    integrals = {}
+    for name in variables:
+        measure, dims = _measure(ds, name)
+        integrals[name] = (ds[name] * measure).sum(dims)
+    return xr.Dataset(integrals)
+
+
+def mean(ds, variables=None):
+    """
+    Return the mean of the variables over their ocean points, weighted by the
+    volume of the cells, see integral
+    """
+    if variables is None:
+        variables = _reduced_variables(ds)
+    means = {}
+    for name in variables:
+        measure, dims = _measure(ds, name)
+        valid = measure.where(ds[name].notnull(), 0)
+        means[name] = (ds[name] * measure).sum(dims) / valid.sum(dims)
+    return xr.Dataset(means)
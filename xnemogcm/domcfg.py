@@ -2,7 +2,15 @@ import numpy as np
 import xarray as xr
 
 from . import arakawa_points as akp
-from .tools import get_domcfg_points, _dir_or_files_to_files
+from .instrument import _files_size, _graph_size, _stage
+from .masks import _bool_masks
+from .region import _region_files, _select_region
+from .tools import (
+    get_domcfg_points,
+    _dir_or_files_to_files,
+    _read_header,
+    _tile_stem,
+)
 
 
 def _add_cf(domcfg):
@@ -53,20 +61,34 @@ def domcfg_preprocess(ds):
     return ds
 
 
-def open_file_multi(files):
+# global attributes specific to each processor tile
+_TILE_ATTRS = [
+    "DOMAIN_position_first",
+    "DOMAIN_position_last",
+    "DOMAIN_number",
+    "DOMAIN_number_total",
+    "DOMAIN_size_local",
+]
+
+
+def open_file_multi(files, chunks=None, drop_variables=()):
     """
     Open and merge netcdf file created on each processor by NEMO (e.g. domain_cfg of mesh_mask).
     If only one file is present, open and return it without any process.
 
     2 methods are accepted: 1) give a directory *pathdir* and a file prefix (e.g. 'domain_cfg')
     *file_prefix*, 2) give a list of file names *files*.
+
+    *chunks* is given to xarray.open_mfdataset, and applies to each file.
+    The variables *drop_variables* are not opened.
     """
     ds = xr.open_mfdataset(
         files,
+        chunks=chunks,
         preprocess=domcfg_preprocess,
         combine_attrs="drop_conflicts",
         data_vars="minimal",
-        drop_variables=["x", "y"],
+        drop_variables=["x", "y", *drop_variables],
     )
     # data_vars='minimal' necessary to not add x and y dimensions into dimensionless variables
     # see https://github.com/pydata/xarray/issues/2064
@@ -75,43 +97,240 @@ def open_file_multi(files):
     for i in ["time_counter", "t"]:
         if i in ds.dims:
             ds = ds.squeeze(i)
-    for i in [
-        "DOMAIN_position_first",
-        "DOMAIN_position_last",
-        "DOMAIN_number",
-        "DOMAIN_number_total",
-        "DOMAIN_size_local",
-    ]:
+    for i in _TILE_ATTRS:
         ds.attrs.pop(i, None)
 
     return ds
 
 
+# the lat/lon/depth variables, set as coordinates
+_COORDINATES = [
+    "glamt",
+    "glamu",
+    "glamv",
+    "glamf",
+    "gphit",
+    "gphiu",
+    "gphiv",
+    "gphif",
+    "gdept_0",
+    "gdepw_0",
+    "gdept_1d",
+    "gdepw_1d",
+]
+
+
 def _add_coordinates(domcfg):
     """
     If existing in the domcfg dataset, adds the lat/lon/depth variables as coordinates
     """
-    coordinates = [
-        "glamt",
-        "glamu",
-        "glamv",
-        "glamf",
-        "gphit",
-        "gphiu",
-        "gphiv",
-        "gphif",
-        "gdept_0",
-        "gdepw_0",
-        "gdept_1d",
-        "gdepw_1d",
-    ]
-    for coord in coordinates:
+    for coord in _COORDINATES:
         if coord in domcfg:
             domcfg.coords[coord] = domcfg[coord]
     return domcfg
 
 
-def open_domain_cfg(datadir=None, files=None, add_coordinates=True):
+# (dimension in the files, dimension in the domcfg dataset)
+_FILE_DIMS = [
+    ("x", "x_c"),
+    ("x", "x_f"),
+    ("y", "y_c"),
+    ("y", "y_f"),
+    ("nav_lev", "z_c"),
+    ("nav_lev", "z_f"),
+    ("z", "z_c"),  # nemo 3.6
+    ("z", "z_f"),
+]
+
+
+def _drop_variables(files, variables, add_coordinates):
+    """
+    Return the variables of the domcfg *files* to drop to keep only the *variables*,
+    the coordinates (if *add_coordinates*) and the variables named as a dimension.
+
+    Only the header of the first file of each processor tiles (or of each file
+    if they are not tiles) is read.
+    """
+    keep = {*variables, "nav_lev", *(_COORDINATES if add_coordinates else [])}
+    drop = set()
+    for f in {_tile_stem(f): f for f in files}.values():
+        header = _read_header(f)
+        if header is None:
+            continue
+        drop.update(
+            name
+            for name in header["variables"]
+            if name not in keep and name not in header["dims"]
+        )
+    return sorted(drop)
+
+
+# memory budget of load_coords='auto', in bytes
+_LOAD_COORDS_BYTES = 2**30
+
+
+def _load_budget(load_coords):
+    """
+    Return the memory budget in bytes given by *load_coords*, None if unlimited
+    """
+    if load_coords is True:
+        return None
+    if load_coords == "auto":
+        return _LOAD_COORDS_BYTES
+    if isinstance(load_coords, (int, float)) and not isinstance(load_coords, bool):
+        return load_coords
+    raise ValueError(
+        "*load_coords* must be a bool, 'auto' or a number of bytes, "
+        f"we got load_coords={load_coords}"
+    )
+
+
+def _load_coords(domcfg, load_coords, files, cache_dir=None, options=None):
+    """
+    Load into memory the lazy variables of domcfg with at most 2 dimensions
+    (e.g. 'glamt', 'e1t', 'tmaskutil', 'gdept_1d') within the memory budget *load_coords*.
+
+    The coordinates are loaded first, then the other variables from the smallest.
+    All the variables are computed at once, reading the files in parallel.
+    If *cache_dir* is given, the arrays are stored in the cache and memory-mapped.
+    """
+    budget = _load_budget(load_coords)
+    candidates = [
+        name
+        for name, var in domcfg.variables.items()
+        if name not in domcfg.indexes and var.ndim <= 2 and var.chunks is not None
+    ]
+    names = []
+    total = 0
+    for name in sorted(
+        candidates, key=lambda i: (i not in domcfg.coords, domcfg.variables[i].nbytes)
+    ):
+        nbytes = domcfg.variables[name].nbytes
+        if budget is None or total + nbytes <= budget:
+            names.append(name)
+            total += nbytes
+    with _stage("load_coords", n_variables=len(names), loaded_bytes=total):
+        arrays = {name: domcfg.variables[name].data for name in names}
+        if cache_dir is not None:
+            from .cache import cached_arrays
+
+            arrays = cached_arrays(cache_dir, files, options, arrays)
+        else:
+            import dask
+
+            arrays = dict(zip(names, dask.compute(*arrays.values())))
+    variables = {
+        name: domcfg.variables[name].copy(deep=False, data=arrays[name])
+        for name in names
+    }
+    return domcfg.assign_coords(
+        {i: v for i, v in variables.items() if i in domcfg.coords}
+    ).assign({i: v for i, v in variables.items() if i not in domcfg.coords})
+
+
+def _file_chunks(chunks):
+    """
+    Translate *chunks* given in the dimensions of the domcfg dataset (x_c, y_f, etc)
+    into the dimensions of the files (x, y, nav_lev), used when opening them
+    """
+    if not isinstance(chunks, dict):
+        return chunks
+    file_chunks = {}
+    for file_dim, dim in _FILE_DIMS:
+        if dim in chunks:
+            file_chunks.setdefault(file_dim, chunks[dim])
+    return file_chunks
+
+
+def _auto_chunks(files):
+    """
+    Return the chunks of the 'auto' policy, in the dimensions of the domcfg dataset.
+
+    The vertical dimension is never split. The horizontal chunks are multiples of the
+    storage chunks of the files (or of the processor tiles for a multi-files domcfg),
+    so that a 3D variable has chunks of about the dask 'array.chunk-size' configuration.
+    """
+    import netCDF4
+    from dask.array.core import normalize_chunks
+
+    with netCDF4.Dataset(files[0]) as nc:
+        sizes = {name: len(dim) for name, dim in nc.dimensions.items()}
+        nx, ny = nc.__dict__.get("DOMAIN_size_global", (sizes["x"], sizes["y"]))
+        nz = sizes.get("nav_lev", sizes.get("z", 1))
+        # storage chunks, within the processor tile
+        previous = [sizes["y"], sizes["x"]]
+        for var in nc.variables.values():
+            chunking = var.chunking()
+            if var.dimensions[-2:] == ("y", "x") and isinstance(chunking, list):
+                previous = [min(i, j) for i, j in zip(previous, chunking[-2:])]
+                break
+    _, (cy, *_), (cx, *_) = normalize_chunks(
+        (-1, "auto", "auto"),
+        shape=(nz, int(ny), int(nx)),
+        dtype="float64",
+        previous_chunks=(nz, *previous),
+    )
+    return {"x_c": cx, "x_f": cx, "y_c": cy, "y_f": cy, "z_c": -1, "z_f": -1}
+
+
+def _domcfg_to_xgcm(ds):
+    """
+    Put the variables of the raw domcfg dataset *ds* on their grid point (x_c, x_f, etc)
+
+    The new dimensions of each variable are planned first, and the output dataset
+    is then built at once from the variables of *ds*, without any intermediate dataset.
+    The coordinates that are not used by any variable are removed.
+    """
+    # This part is used to put the vars on the right point of the grid (e.g. T, U, V points)
+    rename_dims = akp.get_rename_dims(get_domcfg_points())
+    data_vars = {}
+    for name, da in ds.data_vars.items():
+        rename = {
+            old: new
+            for old, new in rename_dims.get(name, {}).items()
+            if old in da.dims and old in ds.coords
+        }
+        var = da.variable
+        if rename:
+            var = var.copy(deep=False)
+            var.dims = [rename.get(dim, dim) for dim in var.dims]
+        data_vars[name] = var
+    used_dims = {dim for var in data_vars.values() for dim in var.dims}
+
+    x_c = ds["x"].data
+    y_c = ds["y"].data
+    z_c = np.arange(ds.sizes["nav_lev"])
+    coords = {
+        "x_f": (["x_f"], x_c + 0.5, {"axis": "X", "c_grid_axis_shift": 0.5}),  # right
+        "y_f": (["y_f"], y_c + 0.5, {"axis": "Y", "c_grid_axis_shift": 0.5}),  # right
+        "z_f": (["z_f"], z_c - 0.5, {"axis": "Z", "c_grid_axis_shift": -0.5}),  # left
+        "x_c": (["x_c"], x_c, {"axis": "X"}),  # center point
+        "y_c": (["y_c"], y_c, {"axis": "Y"}),  # center point
+        "z_c": (["z_c"], z_c, {"axis": "Z"}),  # center point
+    }
+    # dimensions of the raw file still used by some variables (e.g. unknown variables)
+    coords.update(
+        {name: ds.coords[name].variable for name in ds.dims if name in ds.coords}
+    )
+    # Cleaning unused coordinates
+    coords = {name: coord for name, coord in coords.items() if name in used_dims}
+    domcfg = xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
+    domcfg.encoding = ds.encoding
+    return domcfg
+
+
+def open_domain_cfg(
+    datadir=None,
+    files=None,
+    add_coordinates=True,
+    chunks=None,
+    cache_dir=None,
+    cache_max_size=None,
+    region=None,
+    variables=None,
+    load_coords=False,
+    bool_masks=False,
+):
     """
     Return a dataset containing all dataarrays of the domain_cfg*.nc / mesh_mask files.
 
@@ -129,98 +348,148 @@ def open_domain_cfg(datadir=None, files=None, add_coordinates=True):
         'something_my_domcfg_00.nc' and 'something_my_domcfg_01.nc'
     add_coordinates : bool
         Whether to add the 'glamt', 'gphit', etc as coordinates of the dataset
+    chunks : int, dict, 'auto' or None
+        The dask chunks of the dataset, in its dimensions (x_c, x_f, y_c, y_f, z_c, z_f),
+        e.g. {'x_c': 500, 'x_f': 500, 'y_c': 500, 'y_f': 500}.
+        The files are opened with the corresponding chunks, and the processor tiles of
+        a multi-files domcfg are then rechunked into this global layout.
+        If 'auto', the vertical dimension is not split and the horizontal chunks
+        are multiples of the storage chunks (or of the processor tiles), with a size of
+        about the dask 'array.chunk-size' configuration.
+        If None, each file is opened with its storage chunks.
+    cache_dir : string or pathlib.Path or None
+        If given, the processed dataset is stored as a netcdf file in this directory,
+        and reopened lazily from there by the next calls with the same files and options.
+        The cache entry is invalidated when any of the files is modified.
+    cache_max_size : int or None
+        Maximum size in bytes of *cache_dir*. When exceeded, the least recently used
+        entries are removed. If None, the cache can grow without limit.
+    region : dict or None
+        If given, only open this region of the domain, either with index bounds
+        {'x': slice(i0, i1), 'y': slice(j0, j1)} (0-based global indices of the T points,
+        the stop being excluded) or with longitude / latitude bounds
+        {'lon': (lon0, lon1), 'lat': (lat0, lat1)}, resolved into the smallest index box
+        containing the T points within the bounds (from the 'glamt' and 'gphit' variables).
+        If lon0 > lon1, the region crosses the date line. A ValueError is raised if the
+        points within the bounds are on both sides of the seam of the grid (e.g. its
+        east-west periodicity), as they are not in a single index box.
+        The processor tiles of a multi-files domcfg outside of the region are not opened,
+        and only the region is read from the other files.
+        The faces on the right of the selected centers are kept (e.g. x_f = x_c + 0.5).
+    variables : list or None
+        If given, only open these variables (e.g. ['e1t', 'e2t', 'tmask']), with the
+        coordinates 'glamt', 'gdept_0', etc if *add_coordinates*.
+        The other variables are dropped when opening the files.
+    load_coords : bool, 'auto' or int, default False
+        Whether to load into memory the variables with at most 2 dimensions (the
+        horizontal coordinates and scale factors, 'tmaskutil', 'gdept_1d', etc),
+        the 3D variables staying lazy. They are read at once, in parallel, and the
+        datasets built on this domcfg (e.g. by open_nemo) share the loaded arrays.
+        If True, all of them are loaded. If an int, only the ones fitting in this
+        number of bytes are loaded, the coordinates first and then the smallest ones.
+        'auto' is a budget of 1 GiB.
+        If *cache_dir* is given, the loaded arrays are stored in the cache as .npy
+        files and memory-mapped, so that they are shared by all the processes.
 
     Returns
     -------
     domcfg : xarray.Dataset
         The domain configuration dataset, can be read by xgcm.
     """
-    # TODO see dask arrays (chunk argument in xr.open_dataset)
-    files = _dir_or_files_to_files(
-        datadir, files, patterns=["*domain_cfg*.nc", "*mesh_mask*.nc"]
-    )
-    #
-    if not files:
-        raise FileNotFoundError("No 'domain_cfg' or 'mesh_mask' files are provided")
-    #
-    domcfg = open_file_multi(files=files)
-    #
-    # This part is used to put the vars on the right point of the grid (e.g. T, U, V points)
-    domcfg_points = get_domcfg_points()
-    # Replacing the name of the coordinates
-    for i in domcfg.keys():
-        if i not in domcfg_points.keys():
-            continue
-        if domcfg_points[i] is not None:
-            point = akp.Point(domcfg_points[i])
-            if "x" in domcfg[i].coords:
-                domcfg[i] = domcfg[i].rename({"x": point.x})
-            if "y" in domcfg[i].coords:
-                domcfg[i] = domcfg[i].rename({"y": point.y})
-            if "nav_lev" in domcfg[i].coords:
-                domcfg[i] = domcfg[i].rename({"nav_lev": point.z})
-    #
-    domcfg["x_f"] = domcfg["x_c"] + 0.5
-    domcfg["y_f"] = domcfg["y_c"] + 0.5
-    domcfg = domcfg.assign_coords(z_c=np.arange(len(domcfg["z_c"])))
-    domcfg["z_f"] = domcfg["z_c"] - 0.5
-    #
-    domcfg.coords["x_c"] = (
-        [
-            "x_c",
-        ],
-        domcfg.coords["x_c"].data,
-        {"axis": "X"},
-    )  # center point
-    domcfg.coords["x_f"] = (
-        [
-            "x_f",
-        ],
-        domcfg.coords["x_f"].data,
-        {"axis": "X", "c_grid_axis_shift": 0.5},
-    )  # right  point
-    domcfg.coords["y_c"] = (
-        [
-            "y_c",
-        ],
-        domcfg.coords["y_c"].data,
-        {"axis": "Y"},
-    )  # center point
-    domcfg.coords["y_f"] = (
-        [
-            "y_f",
-        ],
-        domcfg.coords["y_f"].data,
-        {"axis": "Y", "c_grid_axis_shift": 0.5},
-    )  # right  point
-    #
-    domcfg.coords["z_c"] = (
-        [
-            "z_c",
-        ],
-        domcfg.coords["z_c"].data,
-        {"axis": "Z"},
-    )  # center point
-    domcfg.coords["z_f"] = (
-        [
-            "z_f",
-        ],
-        domcfg.coords["z_f"].data,
-        {"axis": "Z", "c_grid_axis_shift": -0.5},
-    )  # left   point
-    # Cleaning unused coordinates
-    coordinates = [
-        key for key in domcfg.coords.keys()
-    ]  # all coordinates, including unused ones
-    for var in domcfg.data_vars:
-        for coord in domcfg[var].dims:
-            if coord in coordinates:
-                coordinates.pop(coordinates.index(coord))
-    # coordinates now contains unused coordinates
-    for coord in coordinates:
-        domcfg = domcfg.drop_dims(coord, errors="ignore").drop_vars(
-            coord, errors="ignore"
+    with _stage(
+        "open_domain_cfg",
+        n_files=lambda: len(files),
+        cached=cache_dir is not None,
+        graph_size=lambda: _graph_size(domcfg),
+    ):
+        files = _dir_or_files_to_files(
+            datadir, files, patterns=["*domain_cfg*.nc", "*mesh_mask*.nc"]
+        )
+
+        if not files:
+            raise FileNotFoundError("No 'domain_cfg' or 'mesh_mask' files are provided")
+        domcfg = _open_domain_cfg(
+            files, add_coordinates, chunks, cache_dir, cache_max_size, region, variables
+        )
+        if bool_masks:
+            domcfg = _bool_masks(domcfg)
+        if load_coords is not False:
+            domcfg = _load_coords(
+                domcfg,
+                load_coords,
+                files,
+                cache_dir,
+                _cache_options(add_coordinates, region, variables),
+            )
+    return domcfg
+
+
+def _cache_options(add_coordinates, region, variables):
+    """
+    Return the options of open_domain_cfg that are part of the cache key
+    """
+    return {
+        "add_coordinates": add_coordinates,
+        "region": region,
+        "variables": variables,
+    }
+
+
+def _open_domain_cfg(
+    files,
+    add_coordinates,
+    chunks,
+    cache_dir,
+    cache_max_size,
+    region=None,
+    variables=None,
+):
+    """
+    Open the domcfg *files*, see open_domain_cfg
+    """
+    auto_chunks = chunks == "auto"
+    if auto_chunks:
+        chunks = _auto_chunks(files)
+
+    if cache_dir is not None:
+        from .cache import open_cached
+
+        return open_cached(
+            cache_dir,
+            files,
+            options=_cache_options(add_coordinates, region, variables),
+            build=lambda: open_domain_cfg(
+                files=files,
+                add_coordinates=add_coordinates,
+                region=region,
+                variables=variables,
+            ),
+            max_size=cache_max_size,
+            chunks=chunks,
+        )
+
+    with _stage(
+        "domcfg",
+        n_files=len(files),
+        file_bytes=lambda: _files_size(files),
+        graph_size=lambda: _graph_size(domcfg),
+    ):
+        if region is not None:
+            files, bounds = _region_files(files, region)
+        drop_variables = ()
+        if variables is not None:
+            drop_variables = _drop_variables(files, variables, add_coordinates)
+        domcfg = open_file_multi(
+            files=files, chunks=_file_chunks(chunks), drop_variables=drop_variables
         )
+        if region is not None:
+            domcfg = _select_region(domcfg, bounds)
+        domcfg = _domcfg_to_xgcm(domcfg)
+    if auto_chunks:
+        chunks = {dim: chunk for dim, chunk in chunks.items() if dim in domcfg.dims}
+    if chunks is not None:
+        # merge the processor tiles, no-op for the dimensions already chunked when opening
+        domcfg = domcfg.chunk(chunks)
     # adding variables as coordinates
     if add_coordinates:
         domcfg = _add_coordinates(domcfg)
@@ -0,0 +1,166 @@
+import xarray as xr
+
+from .instrument import _stage
+
+# storage chunks of each profile, for the (t, z, y, x) axes, -1 being the full axis
+_PROFILES = {
+    # maps or sections at a given time
+    "space": (1, -1, "auto", "auto"),
+    # time series at a given point
+    "time": (-1, 1, "auto", "auto"),
+}
+# (axis, dimensions of the processed datasets on this axis)
+_AXES = [
+    ("t", ("t",)),
+    ("z", ("z_c", "z_f")),
+    ("y", ("y_c", "y_f")),
+    ("x", ("x_c", "x_f")),
+]
+# encodings kept when writing, the other ones (e.g. the netcdf storage) are dropped
+_KEPT_ENCODING = [
+    "units",
+    "calendar",
+    "dtype",
+    "_FillValue",
+    "scale_factor",
+    "add_offset",
+]
+
+
+def zarr_chunks(ds, profile="space"):
+    """
+    Return the storage chunks of the dataset *ds* for the given *profile*.
+
+    The dimensions of the centers and faces of an axis (e.g. 'x_c' and 'x_f') have the
+    same chunks, so that the variables of all the grid points have aligned chunks.
+    The chunks set to 'auto' are chosen so that a chunk of a 4D float32 variable is of
+    about the dask 'array.chunk-size' configuration.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        a dataset opened by xnemogcm (e.g. with open_nemo_and_domain_cfg)
+    profile : {'space', 'time'}
+        'space': one time step and all the levels per chunk, fast to read maps and sections.
+        'time': all the time steps and one level per chunk, fast to read time series.
+
+    Returns
+    -------
+    chunks : dict
+        {dim: chunk} for the dimensions of *ds*
+    """
+    from dask.array.core import normalize_chunks
+
+    if profile not in _PROFILES:
+        raise ValueError(
+            f"*profile* must be in {list(_PROFILES)}, we got profile={profile}"
+        )
+    shape = [
+        max([ds.sizes[dim] for dim in dims if dim in ds.dims], default=1)
+        for _, dims in _AXES
+    ]
+    axis_chunks = normalize_chunks(_PROFILES[profile], shape=shape, dtype="float32")
+    chunks = {dim: -1 for dim in ds.dims}
+    for (_, dims), (chunk, *_) in zip(_AXES, axis_chunks):
+        chunks.update({dim: chunk for dim in dims if dim in ds.dims})
+    return chunks
+
+
+def _clear_encoding(ds):
+    """
+    Return *ds* without the encodings of the files it was opened from (storage chunks,
+    compression, etc), that can not be used by zarr
+    """
+    ds = ds.copy()
+    for var in ds.variables.values():
+        var.encoding = {i: v for i, v in var.encoding.items() if i in _KEPT_ENCODING}
+    ds.encoding = {}
+    return ds
+
+
+def _append_chunks(store, ds, storage_kwargs):
+    """
+    Return the chunks of *ds* to append it along 't' to the zarr *store*: the storage chunks
+    of the store, the first chunk along 't' completing the last chunk of the store
+    """
+    existing = xr.open_zarr(store, **storage_kwargs)
+    chunks = {}
+    for var in existing.variables.values():
+        chunks.update(zip(var.dims, var.encoding.get("chunks", ())))
+    chunks = {dim: chunk for dim, chunk in chunks.items() if dim in ds.dims}
+    if "t" in chunks:
+        size, chunk = existing.sizes["t"], chunks["t"]
+        first = min(chunk - size % chunk, ds.sizes["t"])
+        rest = ds.sizes["t"] - first
+        chunks["t"] = [first] + [chunk] * (rest // chunk)
+        if rest % chunk:
+            chunks["t"].append(rest % chunk)
+    existing.close()
+    return chunks
+
+
+def to_zarr(
+    ds,
+    store,
+    profile="space",
+    chunks=None,
+    append=False,
+    parallel=True,
+    **kwargs_zarr,
+):
+    """
+    Write a dataset opened by xnemogcm into a zarr store, with chunks tuned for the analysis.
+
+    All the variables (including the coordinates such as 'glamt' or 'gdept_0') are rechunked
+    with the same chunks per axis (see zarr_chunks), the encodings of the netcdf files are
+    dropped, and the chunks are written in parallel.
+    The store is read back with xarray.open_zarr(store), giving the same dataset (variables,
+    coordinates and the attributes needed by xgcm).
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        a dataset opened by xnemogcm (e.g. with open_nemo_and_domain_cfg)
+    store : string, pathlib.Path or zarr store
+    profile : {'space', 'time'}
+        The chunks profile, see zarr_chunks
+    chunks : dict or None
+        Chunks replacing the ones of the profile, e.g. {'t': 10}
+    append : bool, default False
+        If True, append the time steps of *ds* to the existing *store*. Only the variables
+        with the 't' dimension are written, the others (e.g. the coordinates and the
+        domcfg variables) having been written once with the first time steps.
+        The chunks of the store are used.
+    parallel : bool or int, default True
+        If True, write the chunks with the dask threaded scheduler, with one thread per CPU,
+        if an int, the number of threads. If False, write them sequentially.
+    kwargs_zarr :
+        any other argument given to xarray.Dataset.to_zarr, e.g. mode='w' to overwrite
+        the store
+    """
+    import dask
+
+    ds = _clear_encoding(ds)
+    if append:
+        ds = ds.drop_vars(
+            [name for name, var in ds.variables.items() if "t" not in var.dims]
+        )
+        storage_kwargs = {
+            i: kwargs_zarr[i]
+            for i in ["storage_options", "zarr_format"]
+            if i in kwargs_zarr
+        }
+        ds = ds.chunk({**_append_chunks(store, ds, storage_kwargs), **(chunks or {})})
+        kwargs_zarr["append_dim"] = "t"
+    else:
+        ds = ds.chunk({**zarr_chunks(ds, profile), **(chunks or {})})
+    if parallel is False:
+        config = {"scheduler": "synchronous"}
+    else:
+        config = {"scheduler": "threads"}
+        if parallel is not True:
+            config["num_workers"] = int(parallel)
+    with _stage("to_zarr", append=append, n_variables=len(ds.variables)):
+        delayed = ds.to_zarr(store, compute=False, **kwargs_zarr)
+        with dask.config.set(config):
+            dask.compute(delayed)
@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger("xnemogcm")
+
+# Report of the current instrument() block, if any
+_report = ContextVar("xnemogcm_report", default=None)
+# nesting level of the running stages
+_depth = ContextVar("xnemogcm_depth", default=0)
+
+
+class Report:
+    """
+    Events recorded by xnemogcm.instrument, one per stage of the loading pipeline.
+
+    Each event is a dict with the keys:
+    'stage' (e.g. 'glob', 'scan', 'open', 'preprocess', 'combine', 'merge', 'domcfg'),
+    'time' (wall time in seconds), 'start' (in seconds since the start of the instrument block),
+    'depth' (nesting level of the stage, e.g. 'open' runs within 'open_nemo'),
+    and depending on the stage 'n_files', 'file_bytes' (size of the files on disk,
+    not the number of bytes actually read from them), 'loaded_bytes' (size of the
+    arrays loaded in memory) and 'graph_size' (number of tasks of the dask graph of the output).
+    """
+
+    def __init__(self, callback=None):
+        self.events = []
+        self._callback = callback
+        self._start = time.perf_counter()
+
+    def _emit(self, event):
+        self.events.append(event)
+        if self._callback is not None:
+            self._callback(event)
+
+    def summary(self):
+        """
+        Return the events aggregated by stage
+
+        Returns
+        -------
+        summary : dict
+            {stage: {'calls': ..., 'time': ..., 'n_files': ..., 'file_bytes': ..., 'graph_size': ...}},
+            the times, numbers of files and sizes being summed over the calls
+            and the graph size being the largest one
+        """
+        summary = {}
+        for event in self.events:
+            stage = summary.setdefault(event["stage"], {"calls": 0, "time": 0.0})
+            stage["calls"] += 1
+            stage["time"] += event["time"]
+            for key in ["n_files", "file_bytes", "loaded_bytes"]:
+                if key in event:
+                    stage[key] = stage.get(key, 0) + event[key]
+            if "graph_size" in event:
+                stage["graph_size"] = max(
+                    stage.get("graph_size", 0), event["graph_size"]
+                )
+        return summary
+
+    def __repr__(self):
+        lines = [
+            f"{'stage':<26}{'calls':>6}{'time (s)':>10}{'files':>7}{'file MB':>10}{'tasks':>8}"
+        ]
+        for name, stage in self.summary().items():
+            n_files = stage.get("n_files", "")
+            size = f"{stage['file_bytes'] / 1e6:.1f}" if "file_bytes" in stage else ""
+            tasks = stage.get("graph_size", "")
+            lines.append(
+                f"{name:<26}{stage['calls']:>6}{stage['time']:>10.3f}{n_files:>7}{size:>10}{tasks:>8}"
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def instrument(callback=None):
+    """
+    Record the stages of the xnemogcm functions called within the block
+
+    Instrumentation is opt-in, and costs nothing outside of this block.
+    The events are also emitted as debug messages of the 'xnemogcm' logger
+    (with the event in the *xnemogcm_event* attribute of the log record), which
+    can be enabled without this block with logging.getLogger('xnemogcm').setLevel(logging.DEBUG).
+
+    Parameters
+    ----------
+    callback : callable or None
+        Called with each event (a dict, see xnemogcm.instrument.Report) when its stage ends
+
+    Yields
+    ------
+    report : xnemogcm.instrument.Report
+        The recorded events, and their summary by stage (report.summary())
+
+    Examples
+    --------
+    >>> with xnemogcm.instrument() as report:
+    ...     ds = xnemogcm.open_nemo_and_domain_cfg(nemo_files=path, domcfg_files=path)
+    >>> print(report)
+    """
+    report = Report(callback)
+    token = _report.set(report)
+    try:
+        yield report
+    finally:
+        _report.reset(token)
+
+
+@contextmanager
+def _stage(name, **info):
+    """
+    Record the stage *name* of the pipeline, if instrument is active or the logger
+    emits debug messages.
+
+    The values of *info* that are callables are called at the end of the stage
+    (only if recorded), e.g. graph_size=lambda: _graph_size(ds).
+    """
+    report = _report.get()
+    if report is None and not logger.isEnabledFor(logging.DEBUG):
+        yield
+        return
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        _depth.reset(token)
+        event = {"stage": name, "time": time.perf_counter() - start}
+        if failed:
+            # the outputs needed by the callables may not exist
+            event.update({k: v for k, v in info.items() if not callable(v)})
+            event["failed"] = True
+        else:
+            event.update({k: v() if callable(v) else v for k, v in info.items()})
+        event["depth"] = depth
+        if report is not None:
+            event["start"] = start - report._start
+            report._emit(event)
+        logger.debug(
+            "%s: %.3f s %s",
+            name,
+            event["time"],
+            {k: v for k, v in event.items() if k not in ["stage", "time", "start"]},
+            extra={"xnemogcm_event": event},
+        )
+
+
+def _files_size(files):
+    """Total size in bytes of the files on disk"""
+    return sum(os.path.getsize(f) for f in files if os.path.isfile(f))
+
+
+def _graph_size(ds):
+    """Number of tasks of the dask graph of the dataset *ds*"""
+    graph = ds.__dask_graph__()
+    return 0 if graph is None else len(graph)
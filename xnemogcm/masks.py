@@ -0,0 +1,175 @@
+import numpy as np
+import xarray as xr
+
+from . import arakawa_points as akp
+from .boundaries import get_periodicity, lbc_lnk
+from .metrics import _axes, _rename_dims
+
+# 3D mask of each point type
+_MASK_NAMES = {
+    "T": "tmask",
+    "U": "umask",
+    "V": "vmask",
+    "F": "fmask",
+    "W": "wmask",
+    "UW": "uwmask",
+    "VW": "vwmask",
+    "FW": "fwmask",
+}
+# 2D (surface) mask of each horizontal point type
+_MASKUTIL_NAMES = {p: _MASK_NAMES[p] + "util" for p in ["T", "U", "V", "F"]}
+# mask each mask is derived from, and the axes along which the neighbours are combined
+_recipes = {
+    "umask": ("tmask", ["X"]),
+    "vmask": ("tmask", ["Y"]),
+    "fmask": ("tmask", ["X", "Y"]),
+    "wmask": ("tmask", ["Z"]),
+    "uwmask": ("umask", ["Z"]),
+    "vwmask": ("vmask", ["Z"]),
+    "fwmask": ("fmask", ["Z"]),
+}
+
+all_masks = [
+    "tmask",
+    "umask",
+    "vmask",
+    "fmask",
+    "wmask",
+    "tmaskutil",
+    "umaskutil",
+    "vmaskutil",
+    "fmaskutil",
+]
+
+
+def _is_mask(name):
+    """Whether the variable *name* is a mask of the domcfg (e.g. 'tmask', 'umaskutil')"""
+    return name in _MASK_NAMES.values() or name in _MASKUTIL_NAMES.values()
+
+
+def _bool_masks(ds):
+    """
+    Return *ds* with its masks ('tmask', 'umaskutil', etc) stored as booleans
+
+    The masks of the files are int8 (or float32 for 'fmask' with nemo >= 5.0) and are
+    promoted to float when multiplied with a float variable. As booleans, they take
+    1 byte per point and are used with DataArray.where, without any float copy.
+    The conversion is lazy if the masks are dask arrays.
+    """
+    return ds.assign(
+        {
+            name: ds[name].astype(bool)
+            for name in ds.variables
+            if _is_mask(name) and ds[name].dtype != bool
+        }
+    )
+
+
+def _tmask_from_levels(top_level, bottom_level, nz):
+    """
+    Return the tmask of the levels from *top_level* to *bottom_level* (1-based, included),
+    the land points having a 0 bottom level
+    """
+    level = xr.Variable("z_c", np.arange(1, nz + 1))
+    return (level >= top_level) & (level <= bottom_level)
+
+
+def _neighbour_and(mask, axis):
+    """
+    Return *mask* on the face of *axis* where both of its neighbouring centers are True,
+    the points outside of the domain being land for X and Y, and ocean for Z (surface)
+    """
+    center, face, side = _axes[axis]
+    outside = axis == "Z"
+    if side == "right":
+        padded = mask.pad({center: (0, 1)}, constant_values=outside)
+        neighbour = padded.isel({center: slice(1, None)})
+    else:
+        padded = mask.pad({center: (1, 0)}, constant_values=outside)
+        neighbour = padded.isel({center: slice(None, -1)})
+    both = mask & neighbour
+    if mask.chunks is not None:
+        # the padding shifts the chunks of the neighbour
+        both = both.chunk(dict(zip(mask.dims, mask.chunks)))
+    return _rename_dims(both, {center: face})
+
+
+def compute_missing_masks(ds, masks=all_masks):
+    """
+    Return the dataset *ds* with the missing masks computed from the tmask, as booleans.
+
+    If 'tmask' itself is missing, it is computed from the 'top_level' and 'bottom_level'
+    variables of the domain_cfg. The masks are computed as in NEMO: a U, V, F or W point
+    is in the ocean if all its neighbouring T points are (e.g. umask = tmask(i) * tmask(i+1)),
+    the halos being set with the east-west periodicity and the north fold
+    (see boundaries.lbc_lnk). The surface masks ('tmaskutil', etc) are True where at
+    least one level is in the ocean. The fmask is the one of a free-slip condition.
+
+    The masks are lazy if the tmask (or 'top_level') is a dask array.
+    *ds* is not modified.
+
+    Parameters
+    ----------
+    ds : xarray.Dataset
+        domcfg dataset, or merged nemo and domcfg dataset
+    masks : list
+        list of the masks to compute (nothing is done for the masks already present in *ds*)
+        Must be a sublist of: ['tmask', 'umask', 'vmask', 'fmask', 'wmask', 'uwmask',
+        'vwmask', 'fwmask', 'tmaskutil', 'umaskutil', 'vmaskutil', 'fmaskutil']
+
+    Returns
+    -------
+    the new dataset with the masks added
+    """
+    unknown = [name for name in masks if not _is_mask(name)]
+    if unknown:
+        raise ValueError(
+            f"*masks* must be a sublist of {list(_MASK_NAMES.values()) + list(_MASKUTIL_NAMES.values())}, we got {unknown}"
+        )
+    variables = ds.variables
+    periodicity = get_periodicity(ds)
+    point_types = {name: p for p, name in _MASK_NAMES.items()}
+    memo = {}
+
+    def get(name):
+        if name in variables:
+            var = variables[name]
+            return var if var.dtype == bool else var.astype(bool)
+        if name in memo:
+            return memo[name]
+        if name.endswith("util"):
+            mask = get(name.removesuffix("util")).any("z_c")
+        elif name == "tmask":
+            if "top_level" not in variables or "bottom_level" not in variables:
+                raise ValueError(
+                    "None of tmask or top_level and bottom_level are found in the dataset, but it is mandatory to have at least one of them."
+                )
+            mask = _tmask_from_levels(
+                variables["top_level"], variables["bottom_level"], ds.sizes["z_c"]
+            )
+        else:
+            source, axes = _recipes[name]
+            mask = get(source)
+            for axis in axes:
+                mask = _neighbour_and(mask, axis)
+            mask = lbc_lnk(mask, point_types[name], periodicity)
+        memo[name] = mask
+        return mask
+
+    return ds.assign({name: get(name) for name in masks if name not in variables})
+
+
+def _mask_name(dims):
+    """
+    Return the name of the mask of a variable with dimensions *dims*, e.g. 'umask' for
+    ('t', 'z_c', 'y_c', 'x_f') and 'tmaskutil' for ('t', 'y_c', 'x_c').
+    None if the variable is not on a horizontal grid point.
+    """
+    vertical = any(dim in dims for dim in ["z_c", "z_f"])
+    for point_type, (x, y, z) in akp.DIMS.items():
+        if x in dims and y in dims:
+            if vertical and z in dims:
+                return _MASK_NAMES[point_type]
+            if not vertical:
+                return _MASKUTIL_NAMES[point_type]
+    return None
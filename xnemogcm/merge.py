@@ -5,6 +5,28 @@ import xarray as xr
 from .arakawa_points import ALL_POINTS
 from .nemo import open_nemo
 from .domcfg import open_domain_cfg
+from .instrument import _graph_size, _stage
+from .tools import _same_data, get_domcfg_points
+
+
+def _is_aligned(nemo_ds, domcfg):
+    """
+    Whether *nemo_ds* can be merged with *domcfg* without aligning or comparing them.
+
+    This is the case when the indexes of their common dimensions are equal, and their
+    other common variables are the same arrays, i.e. the coordinates assigned from
+    domcfg by nemo_preprocess (e.g. 'glamt', 'gdept_0').
+    """
+    for name, var in nemo_ds.variables.items():
+        if name not in domcfg.variables:
+            continue
+        if name in nemo_ds.indexes:
+            a, b = nemo_ds.indexes[name], domcfg.indexes.get(name)
+            if b is None or not (a is b or a.equals(b)):
+                return False
+        elif not _same_data(var, domcfg.variables[name]):
+            return False
+    return True
 
 
 def _merge_nemo_and_domain_cfg(nemo_ds, domcfg, linear_free_surface=False):
@@ -19,6 +41,10 @@ def _merge_nemo_and_domain_cfg(nemo_ds, domcfg, linear_free_surface=False):
     scale factors, both in linear free surface and in non-linear free surface
     (thickness weighted values needed in nemo_ds).
 
+    When nemo_ds has the indexes of domcfg and the coordinates assigned from it (as
+    done by open_nemo), the datasets are merged without aligning or comparing them.
+    Otherwise, they are aligned with an outer join and their common variables are compared.
+
     Parameters
     ----------
     nemo_ds : xarray.DataSet
@@ -31,8 +57,14 @@ def _merge_nemo_and_domain_cfg(nemo_ds, domcfg, linear_free_surface=False):
     ds : xarray.DataSet
         merged dataset containing both information of nemo_ds and domcfg
     """
-    ds = xr.merge([nemo_ds, domcfg])
-    attrs = domcfg.attrs
+    aligned = _is_aligned(nemo_ds, domcfg)
+    with _stage("merge", aligned=aligned, graph_size=lambda: _graph_size(ds)):
+        if aligned:
+            # nothing to align nor to compare, the common variables are taken from nemo_ds
+            ds = xr.merge([nemo_ds, domcfg], join="exact", compat="override")
+        else:
+            ds = xr.merge([nemo_ds, domcfg], join="outer", compat="no_conflicts")
+    attrs = dict(domcfg.attrs)
     attrs.update(nemo_ds.attrs)
     ds.attrs.update(attrs)
     if linear_free_surface:
@@ -54,6 +86,7 @@ def open_nemo_and_domain_cfg(
     nemo_kwargs=None,
     domcfg_kwargs=None,
     linear_free_surface=False,
+    variables=None,
 ):
     """
     Open nemo_ds and domcfg with open_nemo and open_domain_cfg and merge them with _merge_nemo_and_domain_cfg.
@@ -83,6 +116,9 @@ def open_nemo_and_domain_cfg(
         Can contain the files and/or datadir arguments of the open_domain_cfg function
     linear_free_surface : bool
         True if linear free surface is used. Used by xnemogcm._merge_nemo_and_domain_cfg function
+    variables : list, optional
+        The names of the variables to open, given to open_nemo and open_domain_cfg.
+        The scale factors of the domcfg (e1t, e3t_0, etc) are always kept, for the xgcm metrics.
     """
     # Necessary to avoid mutable default arguments
     # e.g. https://nikos7am.com/posts/mutable-default-arguments/
@@ -101,7 +137,14 @@ def open_nemo_and_domain_cfg(
     elif isinstance(nemo_files, (str, Path)):
         nemo_kwargs["datadir"] = nemo_files
 
-    domcfg = open_domain_cfg(**domcfg_kwargs)
-    nemo_kwargs["domcfg"] = domcfg
-    nemo_ds = open_nemo(**nemo_kwargs)
-    return _merge_nemo_and_domain_cfg(nemo_ds, domcfg, linear_free_surface)
+    if variables is not None:
+        nemo_kwargs.setdefault("variables", variables)
+        scale_factors = [i for i in get_domcfg_points() if i[:2] in ["e1", "e2", "e3"]]
+        domcfg_kwargs.setdefault("variables", [*variables, *scale_factors])
+
+    with _stage("open_nemo_and_domain_cfg", graph_size=lambda: _graph_size(ds)):
+        domcfg = open_domain_cfg(**domcfg_kwargs)
+        nemo_kwargs["domcfg"] = domcfg
+        nemo_ds = open_nemo(**nemo_kwargs)
+        ds = _merge_nemo_and_domain_cfg(nemo_ds, domcfg, linear_free_surface)
+    return ds
@@ -1,5 +1,13 @@
 from collections import OrderedDict
+from functools import cache
+import dask.array as dsa
+import numpy as np
+import xarray as xr
 from packaging import version
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+from . import arakawa_points as akp
 
 
 all_scale_factors = ["e3t", "e3u", "e3v", "e3f", "e3w", "e3uw", "e3vw", "e3fw"]
@@ -23,7 +31,393 @@ dep_graph = OrderedDict(
 )
 
 
-def compute_missing_metrics(ds, all_scale_factors=all_scale_factors, time_varying=True):
+# center and face dimensions of each axis, and side of the face
+_axes = {
+    "X": ("x_c", "x_f", "right"),
+    "Y": ("y_c", "y_f", "right"),
+    "Z": ("z_c", "z_f", "left"),
+}
+
+
+@cache
+def _xgcm_new_api():
+    """
+    Return whether xgcm >= 0.8.0, that uses the *padding* argument instead of *periodic* and *boundary*
+    """
+    import xgcm
+
+    return version.parse(xgcm.__version__) >= version.parse("0.8.0")
+
+
+def _average_padded(block, axis, side):
+    """
+    Average each point of *block* with its neighbour on *side* ('left' or 'right') along *axis*.
+
+    *block* is padded with one point on both sides along *axis*, that are removed.
+    """
+    slices = [[slice(None)] * block.ndim for _ in range(3)]
+    for s, sl in zip(slices, [slice(None, -2), slice(1, -1), slice(2, None)]):
+        s[axis] = sl
+    left, center, right = (block[tuple(s)] for s in slices)
+    if side == "right":
+        return (center + right) / 2
+    return (left + center) / 2
+
+
+def _interp_extend(var, axis):
+    """
+    Interpolate the variable *var* from the center to the face of *axis* ('X', 'Y' or 'Z'),
+    extending the boundary values, as xgcm.Grid.interp with padding='extend'.
+
+    Dask arrays are processed with a single task per chunk, numpy arrays directly.
+    """
+    center, face, side = _axes[axis]
+    i = var.dims.index(center)
+    data = var.data
+    if isinstance(data, dsa.Array):
+        data = dsa.map_overlap(
+            _average_padded,
+            data,
+            depth={i: 1},
+            boundary={i: "nearest"},
+            trim=False,
+            chunks=data.chunks,
+            dtype=data.dtype,
+            axis=i,
+            side=side,
+        )
+    else:
+        pad = [(0, 0)] * data.ndim
+        pad[i] = (1, 1)
+        data = _average_padded(np.pad(data, pad, mode="edge"), i, side)
+    dims = list(var.dims)
+    dims[i] = face
+    return xr.Variable(dims, data, attrs=var.attrs)
+
+
+def _numpy_interp(ds, memo):
+    """
+    Return a function interpolating a variable of *ds* along several axes.
+
+    The intermediate results are stored in *memo*, so that e.g. the interpolation of e3t
+    along X is computed once and used for both e3u and e3f.
+    """
+
+    def interp(name, axes):
+        key = (name, tuple(axes))
+        if key not in memo:
+            if len(axes) == 1:
+                memo[key] = _interp_extend(ds.variables[name], axes[0])
+            else:
+                memo[key] = _interp_extend(interp(name, axes[:-1]), axes[-1])
+        return memo[key]
+
+    return interp
+
+
+class _LazyScaleFactor(BackendArray):
+    """
+    Scale factor interpolated from the variable *source* along *axes*, as with the numpy engine.
+
+    Only the region that is read is computed, from the corresponding region of *source*
+    extended by one point along the interpolated axes. If *cache*, the scale factor is
+    kept in memory once it has been read entirely, so that the next reads
+    (e.g. by xgcm.Grid.integrate) do not compute it again.
+    """
+
+    def __init__(self, source, axes, cache=True):
+        self.source = source
+        self.axes = axes
+        self.shape = source.shape
+        self.dtype = source.dtype
+        self.cache = cache
+        self._data = None
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.BASIC, self._getitem
+        )
+
+    def _getitem(self, key):
+        if self._data is not None:
+            return self._data[key]
+        # region (with unit step) containing the key, and key within this region
+        region = []
+        local = []
+        for k, n in zip(key, self.shape):
+            index = range(n)[k]
+            if isinstance(index, int):
+                region.append(slice(index, index + 1))
+                local.append(0)
+            elif not index:
+                region.append(slice(0, 0))
+                local.append(slice(None))
+            else:
+                start, stop = min(index[0], index[-1]), max(index[0], index[-1]) + 1
+                region.append(slice(start, stop))
+                last = index[-1] - start + (1 if index.step > 0 else -1)
+                local.append(
+                    slice(index[0] - start, last if last >= 0 else None, index.step)
+                )
+        data = self._compute(region)
+        if self.cache and all(r == slice(0, n) for r, n in zip(region, self.shape)):
+            self._data = data
+        return data[tuple(local)]
+
+    def _compute(self, region):
+        """
+        Return the scale factor on *region* (list of slices with unit step)
+        """
+        window = list(region)
+        pad = [(0, 0)] * len(region)
+        for axis in self.axes:
+            center, _, side = _axes[axis]
+            i = self.source.dims.index(center)
+            start, stop = window[i].start, window[i].stop
+            n = self.shape[i]
+            if start == stop:
+                return np.empty([r.stop - r.start for r in region], dtype=self.dtype)
+            if side == "right":
+                stop += 1
+            else:
+                start -= 1
+            # outside of the domain, the boundary values are extended
+            pad[i] = (max(0, -start), max(0, stop - n))
+            window[i] = slice(max(0, start), min(stop, n))
+        data = np.pad(self.source[tuple(window)].values, pad, mode="edge")
+        for axis in self.axes:
+            i = self.source.dims.index(_axes[axis][0])
+            first = [slice(None)] * data.ndim
+            first[i] = slice(None, -1)
+            second = [slice(None)] * data.ndim
+            second[i] = slice(1, None)
+            data = (data[tuple(first)] + data[tuple(second)]) / 2
+        return data
+
+
+def _lazy_interp(ds, memo, cache=True):
+    """
+    Return a function returning a lazy variable of the interpolation of a variable of *ds*
+
+    As with _numpy_interp, the intermediate lazy variables are stored in *memo*, e.g. e3f
+    is interpolated from the lazy e3u, and reuses it once it is in memory (see *cache*).
+    """
+
+    def interp(name, axes):
+        key = (name, tuple(axes))
+        if key not in memo:
+            source = ds.variables[name] if len(axes) == 1 else interp(name, axes[:-1])
+            dims = list(source.dims)
+            center, face, _ = _axes[axes[-1]]
+            dims[dims.index(center)] = face
+            data = _LazyScaleFactor(source, (axes[-1],), cache)
+            memo[key] = xr.Variable(
+                dims, indexing.LazilyIndexedArray(data), attrs=source.attrs
+            )
+        return memo[key]
+
+    return interp
+
+
+_point_types = {
+    "e3t": "T",
+    "e3u": "U",
+    "e3v": "V",
+    "e3f": "F",
+    "e3w": "W",
+    "e3uw": "UW",
+    "e3vw": "VW",
+    "e3fw": "FW",
+}
+
+
+def _rename_dims(var, rename):
+    var = var.copy(deep=False)
+    var.dims = [rename.get(dim, dim) for dim in var.dims]
+    return var
+
+
+def _pair(var, axis):
+    """
+    Return the variable *var* (on the center of *axis*) and its neighbour on the side
+    of the face, both on the face dimension. The boundary values are extended.
+    """
+    center, face, side = _axes[axis]
+    if center not in var.dims:
+        return var, var
+    if side == "right":
+        padded = var.pad({center: (0, 1)}, mode="edge")
+        neighbour = padded.isel({center: slice(1, None)})
+    else:
+        padded = var.pad({center: (1, 0)}, mode="edge")
+        neighbour = padded.isel({center: slice(None, -1)})
+    return _rename_dims(var, {center: face}), _rename_dims(neighbour, {center: face})
+
+
+def _pair_sum(var, axis):
+    here, neighbour = _pair(var, axis)
+    return here + neighbour
+
+
+def _nemo_scale_factors(ds, names, time_varying, scheme, e3t_0):
+    """
+    Return the scale factors *names* of *ds*, computed with the formulas of NEMO,
+    see compute_missing_metrics(engine='nemo').
+
+    *e3t_0* is the reference e3t_0 variable.
+    """
+    from .boundaries import get_periodicity, lbc_lnk
+
+    variables = ds.variables
+    zps = "ln_zps" in variables and int(variables["ln_zps"].values) == 1
+    periodicity = get_periodicity(ds)
+
+    def mask(name):
+        return variables[name] if name in variables else xr.Variable((), 1)
+
+    e1e2 = {p: variables[f"e1{p}"] * variables[f"e2{p}"] for p in "tuvf"}
+    tmask, umask, vmask = mask("tmask"), mask("umask"), mask("vmask")
+    # mask of the F points used by NEMO for the scale factors
+    umask_here, umask_north = _pair(umask, "Y")
+    fmask = umask_here * umask_north
+    masks = {"T": tmask, "U": umask, "V": vmask, "F": fmask}
+
+    def horizontal(name, axis, weights):
+        here, neighbour = _pair(get(name), axis)
+        if zps:
+            # partial steps: minimum of the neighbouring scale factors
+            return here.where(here <= neighbour, neighbour)
+        w_here, w_neighbour = _pair(weights, axis)
+        return (w_here * here + w_neighbour * neighbour) / (w_here + w_neighbour)
+
+    def e3w_0():
+        if "gdept_0" not in variables or "gdepw_0" not in variables:
+            here, previous = _pair(get("e3t_0"), "Z")
+            e3w_0 = 0.5 * (here + previous)
+            if "e3t_1d" in variables and "e3w_1d" in variables:
+                # e3w_1d between levels that are not modified (z-coordinates)
+                here_1d, previous_1d = _pair(variables["e3t_1d"], "Z")
+                z_levels = (here == here_1d) & (previous == previous_1d)
+                e3w_0 = e3w_0.where(~z_levels, variables["e3w_1d"])
+            return e3w_0
+        # distance between the T points, and twice the first half level at the surface
+        here, previous = _pair(variables["gdept_0"], "Z")
+        surface = xr.Variable("z_f", np.arange(ds.sizes["z_f"]) == 0)
+        return (here - previous).where(~surface, 2 * (here - variables["gdepw_0"]))
+
+    static = {
+        "e3t_0": lambda: e3t_0,
+        "e3u_0": lambda: horizontal("e3t_0", "X", e1e2["t"]),
+        "e3v_0": lambda: horizontal("e3t_0", "Y", e1e2["t"]),
+        "e3w_0": e3w_0,
+        "e3uw_0": lambda: horizontal("e3w_0", "X", e1e2["t"]),
+        "e3vw_0": lambda: horizontal("e3w_0", "Y", e1e2["t"]),
+    }
+    if zps:
+        static["e3f_0"] = lambda: horizontal("e3v_0", "X", None)
+        static["e3fw_0"] = lambda: horizontal("e3vw_0", "X", None)
+    else:
+        static["e3f_0"] = lambda: horizontal("e3u_0", "Y", e1e2["u"])
+        static["e3fw_0"] = lambda: horizontal("e3uw_0", "Y", e1e2["u"])
+
+    def anomaly(name):
+        return get(name) - get(name + "_0")
+
+    def vertical(name, point_type):
+        # the W point k is between the levels k-1 and k
+        here, previous = _pair(anomaly(name), "Z")
+        wmask = _rename_dims(masks[point_type], {"z_c": "z_f"})
+        w_name = {"T": "e3w", "U": "e3uw", "V": "e3vw", "F": "e3fw"}[point_type]
+        return get(w_name + "_0") + (1 - 0.5 * wmask) * previous + 0.5 * wmask * here
+
+    def vvl():
+        return {
+            "e3u": lambda: (
+                get("e3u_0")
+                + 0.5 * umask / e1e2["u"] * _pair_sum(e1e2["t"] * anomaly("e3t"), "X")
+            ),
+            "e3v": lambda: (
+                get("e3v_0")
+                + 0.5 * vmask / e1e2["v"] * _pair_sum(e1e2["t"] * anomaly("e3t"), "Y")
+            ),
+            "e3f": lambda: (
+                get("e3f_0")
+                + 0.5 * fmask / e1e2["f"] * _pair_sum(e1e2["u"] * anomaly("e3u"), "Y")
+            ),
+            "e3w": lambda: vertical("e3t", "T"),
+            "e3uw": lambda: vertical("e3u", "U"),
+            "e3vw": lambda: vertical("e3v", "V"),
+            "e3fw": lambda: vertical("e3f", "F"),
+        }
+
+    def r3(point_type):
+        """Ratio of the sea surface height to the depth of the ocean, NEMO qco"""
+        if point_type not in memo_r3:
+            ssh = (tmask * anomaly("e3t")).sum("z_c")
+            if point_type == "T":
+                num, e1e2_h = ssh, 1
+            elif point_type == "U":
+                num, e1e2_h = 0.5 * _pair_sum(e1e2["t"] * ssh, "X"), e1e2["u"]
+            elif point_type == "V":
+                num, e1e2_h = 0.5 * _pair_sum(e1e2["t"] * ssh, "Y"), e1e2["v"]
+            else:
+                num = 0.25 * _pair_sum(_pair_sum(e1e2["t"] * ssh, "X"), "Y")
+                e1e2_h = e1e2["f"]
+            name = {"T": "e3t_0", "U": "e3u_0", "V": "e3v_0", "F": "e3f_0"}
+            h_0 = (get(name[point_type]) * masks[point_type]).sum("z_c")
+            memo_r3[point_type] = (num / (e1e2_h * h_0.where(h_0 > 0, 1))).where(
+                h_0 > 0, 0
+            )
+        return memo_r3[point_type]
+
+    def qco():
+        recipes = {}
+        for name, point_type in _point_types.items():
+            horizontal_type = point_type.rstrip("W") or "T"
+            # as in NEMO, only e3t, e3u and e3v are masked
+            point_mask = masks[point_type] if point_type in ["T", "U", "V"] else 1
+            recipes[name] = lambda name=name, h=horizontal_type, m=point_mask: (
+                get(name + "_0") * (1 + r3(h) * m)
+            )
+        return recipes
+
+    memo = {}
+    memo_r3 = {}
+    recipes = dict(static)
+    if time_varying:
+        recipes.update(vvl() if scheme == "vvl" else qco())
+        recipes.pop("e3t", None)
+
+    def get(name):
+        if name in variables and name != "e3t_0":
+            return variables[name]
+        if name not in memo:
+            # the halos are set as soon as computed, as in NEMO
+            point_type = _point_types[name.removesuffix("_0")]
+            memo[name] = lbc_lnk(recipes[name](), point_type, periodicity)
+        return memo[name]
+
+    reference = variables["e3t" if time_varying else "e3t_0"]
+    scale_factors = {}
+    for name in names:
+        point_type = _point_types[name.removesuffix("_0")]
+        x, y, z = akp.DIMS[point_type]
+        dims = [dim for dim in reference.dims if dim not in akp.DIMS["T"]] + [z, y, x]
+        var = get(name).set_dims({dim: ds.sizes[dim] for dim in dims})
+        var.attrs = dict(reference.attrs)
+        scale_factors[name] = var
+    return scale_factors
+
+
+def compute_missing_metrics(
+    ds,
+    all_scale_factors=all_scale_factors,
+    time_varying=True,
+    engine=None,
+    lazy=False,
+    scheme=None,
+    cache_lazy=True,
+):
     """
     Add all possible scale factors to the dataset.
 
@@ -32,7 +426,8 @@ def compute_missing_metrics(ds, all_scale_factors=all_scale_factors, time_varyin
     If e3t_0 is not found (e.g. for nemo 3.6), it will raise a warning and use e3t_1d
     (this will lead to wrong results if terrain-following coordinates are used).
 
-    May have some boundary issues, and only non-periodic boundaries are implemented.
+    May have some boundary issues, and only non-periodic boundaries are implemented
+    (except with engine='nemo').
 
     Will add the metrics to the given dataset. To avoid this, use a ds.copy()
 
@@ -46,29 +441,83 @@ def compute_missing_metrics(ds, all_scale_factors=all_scale_factors, time_varyin
         Must be a sublist of: ['e3t', 'e3u', 'e3v', 'e3f', 'e3w', 'e3uw', 'e3vw', 'e3fw']
     time_varying : bool
         Whether to use the time varying scale factors (True) of the constant ones (False, 'e3x_0')
+    engine : {'xgcm', 'numpy', 'nemo'} or None
+        'xgcm': interpolate with xgcm.Grid.interp (needs xgcm).
+        'numpy': same results without xgcm, the interpolations are vectorized with a single
+        task per dask chunk, and the intermediate interpolations are reused
+        (e.g. e3t interpolated along X is used for both e3u and e3f).
+        'nemo': use the formulas of NEMO, giving its scale factors up to the rounding errors.
+        The reference scale factors (e3x_0) are the mean of their neighbours weighted by the
+        cell areas (minimum of the neighbours for partial steps, 'ln_zps'), and e3w_0 is
+        computed from gdept_0 when available. The time varying scale factors are computed
+        from the anomaly e3t - e3t_0, see *scheme*. The east-west periodicity and
+        the north fold are read from 'jperio' (or from the 'Iperio', 'Jperio', 'NFold'
+        and 'NFtype' attributes for nemo >= 4.2), the halos being those of the NEMO files.
+        If None, 'numpy' if *lazy* else 'xgcm'.
+    lazy : bool, default False
+        If True, the scale factors are added as lazy variables (as a netcdf file opened
+        without chunks), computed with the numpy engine only when they are read:
+        reading a region only computes this region. Nothing is added to the dask graph,
+        and use ds.chunk() to process them by chunks.
+        Once a scale factor has been read entirely, it is kept in memory (see *cache_lazy*).
+    scheme : {'vvl', 'qco'} or None
+        Vertical coordinate of NEMO used with engine='nemo' and time_varying=True:
+        'vvl' for the variable volume layers (nemo <= 4.0, or key_qco not defined),
+        'qco' for the quasi-eulerian coordinates (nemo >= 4.2 with key_qco).
+        If None, 'qco' if *ds* has the 'Iperio' attribute (nemo >= 4.2), else 'vvl'.
+    cache_lazy : bool, default True
+        With lazy=True, whether to keep each scale factor in memory once it has been
+        read entirely, so that the next reads (e.g. by xgcm.Grid.integrate or
+        xgcm.Grid.average) do not compute it again. If False, nothing is kept in memory
+        and each read computes its region again.
 
     Returns
     -------
     the new dataset with the scale factors added
     """
-    try:
-        import xgcm
-    except ModuleNotFoundError:
-        raise ModuleNotFoundError(
-            "xgcm is not installed, you need xgcm for this function"
+    if engine is None:
+        engine = "numpy" if lazy else "xgcm"
+    if lazy and engine != "numpy":
+        raise ValueError(
+            f"*lazy* is only available with engine='numpy', we got {engine}"
         )
+    if engine == "xgcm":
+        try:
+            import xgcm
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError(
+                "xgcm is not installed, you need xgcm for this function"
+            )
+    elif engine not in ["numpy", "nemo"]:
+        raise ValueError(
+            f"*engine* must be 'xgcm', 'numpy' or 'nemo', we got engine={engine}"
+        )
+    if scheme is None:
+        scheme = "qco" if "Iperio" in ds.attrs else "vvl"
+    if scheme not in ["vvl", "qco"]:
+        raise ValueError(f"*scheme* must be 'vvl' or 'qco', we got scheme={scheme}")
     from warnings import warn
 
     warn(
         "This function is in pre-phase. Do not expect a high precision, but a good estimate. Some boundary issues may arise."
     )
 
-    # Handle API changes in xgcm >= 0.8.0
-    if version.parse(xgcm.__version__) >= version.parse("0.8.0"):
-        # Use new padding parameter (periodic argument removed)
-        grid = xgcm.Grid(ds, padding=None)
-    else:
-        grid = xgcm.Grid(ds, periodic=False)
+    if lazy:
+        interp = _lazy_interp(ds, memo={}, cache=cache_lazy)
+    elif engine == "numpy":
+        interp = _numpy_interp(ds, memo={})
+    elif engine == "xgcm":
+        # Handle API changes in xgcm >= 0.8.0
+        if _xgcm_new_api():
+            # Use new padding parameter (periodic argument removed)
+            grid = xgcm.Grid(ds, padding=None)
+            kwargs = {"padding": "extend"}
+        else:
+            grid = xgcm.Grid(ds, periodic=False)
+            kwargs = {"boundary": "extend"}
+
+        def interp(name, axes):
+            return grid.interp(ds[name], axes, **kwargs)
 
     if time_varying:
         e3t = "e3t"
@@ -89,6 +538,26 @@ def compute_missing_metrics(ds, all_scale_factors=all_scale_factors, time_varyin
     if not time_varying:
         all_scale_factors = [i + "_0" for i in all_scale_factors]
 
+    if engine == "nemo":
+        e3t_0 = ds.variables.get("e3t_0")
+        if e3t_0 is None:
+            if "e3t_1d" not in ds:
+                raise ValueError(
+                    "None of e3t_0 or e3t_1d are found in the dataset, but it is mandatory to have at least one of them."
+                )
+            warn(
+                "e3t_0 scale factor not found in the dataset, we will use e3t_1d. This will lead to errors if you use terrain-following coordinates."
+            )
+            e3t_0 = (
+                ds["e3t_1d"]
+                .broadcast_like(ds["x_c"])
+                .broadcast_like(ds["y_c"])
+                .variable
+            )
+        missing = [i for i in all_scale_factors if i not in ds.variables]
+        ds.update(_nemo_scale_factors(ds, missing, time_varying, scheme, e3t_0))
+        return ds
+
     for i in all_scale_factors:
         if i not in ds.variables:
             if time_varying:
@@ -102,11 +571,7 @@ def compute_missing_metrics(ds, all_scale_factors=all_scale_factors, time_varyin
                     e3_nme = e3 + "_0"
                 if e3_nme in ds.variables:
                     # we stop at the first one matching
-                    # Handle API changes in xgcm >= 0.8.0
-                    if version.parse(xgcm.__version__) >= version.parse("0.8.0"):
-                        ds[i] = grid.interp(ds[e3_nme], vertex[e3], padding="extend")
-                    else:
-                        ds[i] = grid.interp(ds[e3_nme], vertex[e3], boundary="extend")
+                    ds[i] = interp(e3_nme, vertex[e3])
     return ds
 
 
@@ -1,24 +1,47 @@
 import re
+import warnings
 import xarray as xr
 
 from . import arakawa_points as akp
-from .tools import _dir_or_files_to_files
+from .instrument import _files_size, _graph_size, _stage
+from .recombine import _combine_tile_datasets, _is_tile
+from .region import (
+    _check_region,
+    _in_region,
+    _isel_region,
+    _resolve_region,
+    _select_region,
+)
+from .tools import (
+    _dir_or_files_to_files,
+    _is_x_dim,
+    _is_y_dim,
+    _parallel_map,
+    _read_header,
+    _same_data,
+)
+
+
+def _named_point_type(f):
+    """
+    Return the point type given by the name of the file *f* (grid_X), None if not found
+    """
+    a = "|".join(akp.ALL_POINTS)
+    m = re.search(f"grid_({a})", str(f))
+    return m.groups()[0] if m else None
 
 
 def _get_point_type(filename, description):
     """
     Infers point type from filename and/or description
     """
-    point_type_fn = None
     point_type_desc = None
 
     # Try with filename
-    a = "|".join(akp.ALL_POINTS)
-    m = re.search(f"grid_({a})", filename)
-    if m:
-        point_type_fn = m.groups()[0]
+    point_type_fn = _named_point_type(filename)
 
     # try with description
+    a = "|".join(akp.ALL_POINTS)
     m = re.search(f"ocean ({a}) grid", description)
     if m:
         point_type_desc = m.groups()[0]
@@ -50,7 +73,33 @@ def _is_depth_dim(i, attrs):
     return attrs["long_name"][:8] == "Vertical" and attrs["long_name"][-6:] == "levels"
 
 
-def nemo_preprocess(ds, domcfg, point_type=None):
+def _domcfg_coords(domcfg, dims):
+    """
+    Return the names of the coordinates of domcfg (e.g. 'glamt', 'gdept_0', 'gdept_1d')
+    defined on the dimensions *dims*, apart from the dimensions themselves
+    """
+    return [
+        name
+        for name, coord in domcfg.coords.items()
+        if name not in domcfg.dims and set(coord.dims) <= set(dims)
+    ]
+
+
+def _attach_coords(nemo_ds, domcfg, datasets):
+    """
+    Assign to *nemo_ds*, combined from the *datasets* preprocessed with attach_coords=False,
+    the coordinates of domcfg that nemo_preprocess attaches to each of them.
+
+    The variables of domcfg are shared (not copied): if they are loaded in domcfg,
+    they are loaded in *nemo_ds*.
+    """
+    names = {}
+    for ds in datasets:
+        names.update(dict.fromkeys(_domcfg_coords(domcfg, ds.dims)))
+    return nemo_ds.assign_coords({i: domcfg.variables[i] for i in names})
+
+
+def nemo_preprocess(ds, domcfg, point_type=None, attach_coords=True):
     """
     Preprocess function for the nemo files.
 
@@ -68,6 +117,11 @@ def nemo_preprocess(ds, domcfg, point_type=None):
         a dataset containing the domcfg data
     point_type: None or str in ['T', 'U', 'V', 'W', 'UW', 'VW', 'FW']
         The point type. If None, will be inferred from either filename or attribute
+    attach_coords : bool, default True
+        Whether to assign the coordinates of domcfg defined on the dimensions of the point
+        (e.g. 'glamt', 'gphit', 'gdept_0' for a T point). If False, only the dimensions
+        (e.g. 'x_c', 'y_c', 'z_c') are assigned, and the coordinates can be attached
+        once to the combined dataset, as done by process_nemo.
 
     Returns
     -------
@@ -95,9 +149,9 @@ def nemo_preprocess(ds, domcfg, point_type=None):
         z_nme = None
 
     # get the name of the dimension along i e.g. x, x_grid_U, x_grid_U_inner etc
-    x_nme = [i for i in ds.dims if "x_grid" in i or i == "x"]
+    x_nme = [i for i in ds.dims if _is_x_dim(i)]
     # get the name of the dimension along j e.g. y, y_grid_U, y_grid_U_inner etc
-    y_nme = [i for i in ds.dims if "y_grid" in i or i == "y"]
+    y_nme = [i for i in ds.dims if _is_y_dim(i)]
 
     for x in x_nme:
         to_rename.update({x: point.x})
@@ -128,37 +182,489 @@ def nemo_preprocess(ds, domcfg, point_type=None):
     if time_b and "t_bounds" in ds:
         ds["t"].attrs["bounds"] = "t_bounds"
     # setting z_c/z_f/x_c/etc to be the same as in domcfg
-    ds = ds.assign_coords({i: domcfg[i] for i in points})
-    # Assign the proper coordinates
-    # 1st case: horizontal
-    if z_nme:
-        p = set(points[:2])
-    else:
-        p = set(points)
-    coords = [i for i in domcfg.coords if set(domcfg.coords[i].dims) == p]
-    ds = ds.assign_coords({i: domcfg[i] for i in coords})
-    # 2nd case vertical
-    if z_nme:
-        p = set(points)
-        coords = [i for i in domcfg.coords if set(domcfg.coords[i].dims) == p]
-        ds = ds.assign_coords({i: domcfg[i] for i in coords})
+    ds = ds.assign_coords({i: domcfg.variables[i] for i in points})
+    # Assign the proper coordinates, horizontal (e.g. glamt) and vertical (e.g. gdept_0)
+    if attach_coords:
+        ds = ds.assign_coords(
+            {i: domcfg.variables[i] for i in _domcfg_coords(domcfg, points)}
+        )
     return ds
 
 
-def _check_position(ds, position, parallel=False):
+def _check_position(ds, position):
     if position is not None:
         return position
-    else:
-        if parallel:
-            from dask import delayed
+    return _get_point_type(filename="", description=ds.attrs.get("description", ""))
+
+
+def _scan_nemo_file(f):
+    """
+    Read the header of a nemo file and infer its point type, without opening it with xarray
+
+    Returns
+    -------
+    scan : dict or None
+        {'point_type': 'X', 'dims': {name: size}, 'variables': {name: [dims]},
+        'depth_dims': [dims], 'chunking': {name: storage chunks},
+        'tile': [first, last] or None}
+        with first and last the 1-based global indices spanned by a processor tile.
+        None if the file header can not be read
+    """
+    header = _read_header(f)
+    if header is None:
+        return None
+    point_type = _get_point_type(
+        filename=str(f), description=header["attrs"].get("description", "")
+    )
+    return {
+        "point_type": point_type,
+        "dims": header["dims"],
+        "variables": {i: list(dims) for i, dims in header["variables"].items()},
+        "depth_dims": [
+            i for i in header["dims"] if _is_depth_dim(i, header["coords"].get(i, {}))
+        ],
+        "chunking": header["chunking"],
+        "tile": [
+            [int(i) for i in header["attrs"][name]]
+            for name in ["DOMAIN_position_first", "DOMAIN_position_last"]
+        ]
+        if "DOMAIN_position_last" in header["attrs"]
+        else None,
+    }
+
+
+# dimensions of the processed datasets, that can be used to give the chunks to open_nemo
+_NEW_DIMS = ("t", "x_c", "x_f", "y_c", "y_f", "z_c", "z_f")
+
+
+def _is_new_chunks(chunks):
+    """
+    Return whether the chunks are given with the dimensions of the processed datasets (t, x_c, etc)
+    """
+    if not isinstance(chunks, dict) or not chunks:
+        return False
+    new = [i in _NEW_DIMS for i in chunks]
+    if any(new) and not all(new):
+        raise ValueError(
+            f"*chunks* must be given either with the dimensions {_NEW_DIMS} or with the "
+            f"dimensions of the files (e.g. 'time_counter', 'x'), we got chunks={chunks}"
+        )
+    return all(new)
+
+
+def _new_dims(point_type, dims, depth_dims):
+    """
+    Return {dim: new_dim}, the dimensions of a nemo file renamed as in nemo_preprocess
+    """
+    point = akp.Point(point_type)
+    new_dims = {}
+    for i in dims:
+        if _is_x_dim(i):
+            new_dims[i] = point.x
+        elif _is_y_dim(i):
+            new_dims[i] = point.y
+        elif i in depth_dims:
+            new_dims[i] = point.z
+        elif i == "time_counter":
+            new_dims[i] = "t"
+    return new_dims
+
+
+def _file_chunks(chunks, new_dims):
+    """
+    Translate *chunks* given with the new dimensions into the dimensions of a file
+    """
+    return {i: chunks[new] for i, new in new_dims.items() if new in chunks}
+
+
+def _warn_storage_chunks(files_chunks, scans, point_types):
+    """
+    Warn if the chunks of the files split their storage chunks.
+
+    A storage chunk is split when the dask chunks are not a multiple of it,
+    it is then read (and decompressed) by several tasks.
+    The dimensions are reported with their new names (t, x_c, etc).
+    """
+    split = set()
+    for chunks, scan, point_type in zip(files_chunks, scans, point_types):
+        if not isinstance(chunks, dict) or scan is None:
+            continue
+        new_dims = _new_dims(point_type, scan["dims"], scan["depth_dims"])
+        for name, storage in scan["chunking"].items():
+            if storage is None:
+                continue
+            for dim, size in zip(scan["variables"][name], storage):
+                chunk = chunks.get(dim)
+                if (
+                    isinstance(chunk, int)
+                    and 0 < chunk < scan["dims"][dim]
+                    and chunk % size
+                ):
+                    split.add((new_dims.get(dim, dim), chunk, size))
+    if split:
+        details = ", ".join(
+            f"'{dim}': {chunk} (storage chunks of {size})"
+            for dim, chunk, size in sorted(split)
+        )
+        warnings.warn(
+            f"The chunks split the storage chunks of the files: {details}. "
+            "Each storage chunk is read by several tasks, which could degrade performance. "
+            "Consider using multiples of the storage chunks.",
+            UserWarning,
+            stacklevel=4,
+        )
+
+
+def _scan_nemo_files(files, parallel=False, headers=True):
+    """
+    Group the nemo files by point type and variables, reading only their headers.
+
+    If *headers* is False, the headers of the files whose point type is given by
+    their name (grid_X) are not read, these files are in the (None, None) group.
+
+    Returns
+    -------
+    groups : dict
+        {(point_type, variables): [(file1, scan1), (file2, scan2), ...]}
+        with scan the output of _scan_nemo_file.
+        The files whose header can not be read are in the (None, None) group,
+        their point type is inferred when they are opened.
+    """
+    scanned = [f for f in files if headers or _named_point_type(f) is None]
+    with _stage("scan", n_files=len(scanned)):
+        scans = _parallel_map(_scan_nemo_file, scanned, parallel=parallel)
+    scans = dict(zip(scanned, scans))
+    groups = {}
+    for f in files:
+        scan = scans.get(f)
+        if scan is None:
+            key = (None, None)
+        else:
+            key = (scan["point_type"], tuple(sorted(scan["variables"])))
+        groups.setdefault(key, []).append((f, scan))
+    return groups
+
+
+def _drop_variables(variables, depth_dims, keep):
+    """
+    Return the variables of a nemo file to drop to keep only the variables *keep*,
+    None if the file contains none of them.
+
+    *variables* is {name: dims} and *depth_dims* the vertical dimensions of the file.
+    The time variables, and the depth variables and bounds of the vertical dimensions
+    used by the kept variables are not dropped. The other variables with horizontal
+    dimensions (e.g. 'nav_lat') or with an unused vertical dimension are dropped.
+    """
+    found = [i for i in keep if i in variables]
+    if not found:
+        return None
+    used_dims = {dim for i in found for dim in variables[i]}
+    drop = []
+    for name, var_dims in variables.items():
+        if name in found:
+            continue
+        if any(_is_x_dim(i) or _is_y_dim(i) for i in var_dims) or any(
+            i in depth_dims and i not in used_dims for i in var_dims
+        ):
+            drop.append(name)
+    return drop
+
+
+def _open_nemo_file(f, point_type, chunks, drop_variables, kwargs_open):
+    """
+    Open a nemo file, inferring its point type if not given
+    """
+    if drop_variables:
+        user_drop = kwargs_open.get("drop_variables") or []
+        if isinstance(user_drop, str):
+            user_drop = [user_drop]
+        kwargs_open = {**kwargs_open, "drop_variables": [*user_drop, *drop_variables]}
+    with warnings.catch_warnings():
+        # the chunks are checked against the storage chunks by _warn_storage_chunks
+        warnings.filterwarnings(
+            "ignore", message="The specified chunks separate the stored chunks"
+        )
+        ds = xr.open_dataset(f, chunks=chunks or {}, **kwargs_open)
+    if point_type is None:
+        point_type = _get_point_type(
+            filename=str(f), description=ds.attrs.get("description", "")
+        )
+    return ds, point_type
+
+
+def _grid_coords(domcfg):
+    """
+    Return the dimension coordinates of domcfg (x_c, x_f, ..., z_f), which are all that
+    nemo_preprocess(attach_coords=False) needs, sent to the worker processes instead of
+    the full domcfg
+    """
+    return xr.Dataset(coords={name: domcfg.variables[name] for name in domcfg.indexes})
+
+
+def _open_and_preprocess(
+    f, point_type, chunks, drop_variables, unscanned, kwargs_open, bounds, grid
+):
+    """
+    Open a nemo file and preprocess it with nemo_preprocess(attach_coords=False).
+
+    *unscanned* is None for the files whose header was read, else (chunks, variables):
+    the chunks given with the new dimensions and the variables to keep, applied once
+    the file is opened. The processor tiles are not preprocessed, as they are first
+    placed on the global grid with the other tiles of their file.
+
+    Returns
+    -------
+    (ds, point_type, preprocessed), or None if the file contains none of the variables
+    """
+    ds, point_type = _open_nemo_file(f, point_type, chunks, drop_variables, kwargs_open)
+    if unscanned is not None:
+        new_chunks, variables = unscanned
+        depth_dims = [i for i in ds.dims if _is_depth_dim(i, ds[i].attrs)]
+        if new_chunks is not None:
+            new_dims = _new_dims(point_type, ds.dims, depth_dims)
+            ds = ds.chunk(_file_chunks(new_chunks, new_dims))
+        if variables is not None:
+            drop = _drop_variables(
+                {name: var.dims for name, var in ds.variables.items()},
+                depth_dims,
+                variables,
+            )
+            if drop is None:
+                ds.close()
+                return None
+            ds = ds.drop_vars(drop)
+    if _is_tile(ds.attrs):
+        return ds, point_type, False
+    if bounds is not None:
+        ds = _isel_region(ds, bounds)
+    return nemo_preprocess(ds, grid, point_type, attach_coords=False), point_type, True
+
+
+def _open_nemo_files(files, point_types, chunks, drops, unscanned, parallel, **kwargs):
+    """
+    Open and preprocess the nemo files, sequentially or in a pool of processes.
+
+    The files are lazily opened and preprocessed in the workers, and the datasets are
+    sent back to the main process, where the data are read from disk only when needed.
+    *chunks*, *drops* and *unscanned* are the lists of the chunks, of the variables
+    to drop and of the options of the files without header, for each file.
+    *kwargs* are given to _open_and_preprocess.
+
+    Returns
+    -------
+    opened : list
+        The outputs of _open_and_preprocess for each file
+    """
+    with _stage("open", n_files=len(files), file_bytes=lambda: _files_size(files)):
+        return _parallel_map(
+            _open_and_preprocess,
+            files,
+            point_types,
+            chunks,
+            drops,
+            unscanned,
+            parallel=parallel,
+            **kwargs,
+        )
+
+
+def _scan_and_open_nemo_files(
+    files, domcfg, chunks, parallel, kwargs_open, bounds=None, variables=None
+):
+    """
+    Read the headers of the nemo files to find their point types, open them and
+    preprocess them with nemo_preprocess(attach_coords=False)
 
-            get_point_type = delayed(_get_point_type)
+    If the chunks are given with the new dimensions (t, x_c, etc), they are translated
+    into the dimensions of each file, so that the files are directly read with the final chunks.
+    If the index *bounds* of a region are given, the processor tiles outside of the region
+    are not opened, and the region is selected in the datasets.
+    If *variables* are given, the files containing none of them are not opened, and
+    the other variables are dropped when opening the files (see _drop_variables).
+
+    Returns
+    -------
+    positions : list of tuples
+        [(ds1, 'X'), (ds2, 'Y'), ...] the preprocessed datasets and their point type
+    """
+    # the headers are only needed to select the files and variables, to translate
+    # or check the chunks
+    headers = (
+        bounds is not None
+        or variables is not None
+        or (isinstance(chunks, dict) and bool(chunks))
+    )
+    groups = _scan_nemo_files(files, parallel, headers)
+    if bounds is not None:
+        groups = {
+            key: [
+                (f, scan)
+                for f, scan in group
+                if (scan or {}).get("tile") is None or _in_region(*scan["tile"], bounds)
+            ]
+            for key, group in groups.items()
+        }
+    files = [f for group in groups.values() for f, _ in group]
+    scans = [scan for group in groups.values() for _, scan in group]
+    point_types = [key[0] for key, group in groups.items() for _ in group]
+    drops = [None] * len(files)
+    if variables is not None:
+        drops = [
+            None
+            if scan is None
+            else _drop_variables(scan["variables"], scan["depth_dims"], variables)
+            for scan in scans
+        ]
+        kept = [scan is None or drop is not None for scan, drop in zip(scans, drops)]
+        files, scans, point_types, drops = (
+            [i for i, k in zip(items, kept) if k]
+            for items in (files, scans, point_types, drops)
+        )
+        if not files:
+            raise FileNotFoundError(
+                f"None of the output files contains the variables {variables}"
+            )
+    new_chunks = _is_new_chunks(chunks)
+    if new_chunks:
+        files_chunks = [
+            None
+            if scan is None
+            else _file_chunks(
+                chunks, _new_dims(point_type, scan["dims"], scan["depth_dims"])
+            )
+            for scan, point_type in zip(scans, point_types)
+        ]
+    else:
+        files_chunks = [chunks] * len(files)
+    _warn_storage_chunks(files_chunks, scans, point_types)
+    # the options of the files without header, applied once they are opened
+    unscanned = [
+        None if scan is not None else (chunks if new_chunks else None, variables)
+        for scan in scans
+    ]
+    opened = _open_nemo_files(
+        files,
+        point_types,
+        files_chunks,
+        drops,
+        unscanned,
+        parallel,
+        kwargs_open=kwargs_open,
+        bounds=bounds,
+        grid=_grid_coords(domcfg),
+    )
+    positions, tiles, tile_files = [], [], []
+    for f, item in zip(files, opened):
+        if item is None:
+            continue
+        ds, point_type, preprocessed = item
+        if preprocessed:
+            positions.append((ds, point_type))
         else:
-            get_point_type = _get_point_type
-        return get_point_type(filename="", description=ds.attrs.get("description", ""))
+            tiles.append((ds, point_type))
+            tile_files.append(f)
+    with _stage("preprocess", n_files=len(tiles)):
+        # per-processor files (XIOS 'multiple_file' mode) are placed on the global grid
+        for ds, point_type in _combine_tile_datasets(tiles, tile_files):
+            if bounds is not None:
+                ds = _isel_region(ds, bounds)
+            ds = nemo_preprocess(ds, domcfg, point_type, attach_coords=False)
+            positions.append((ds, point_type))
+    return positions
+
+
+def _concat_time(datasets):
+    """
+    Sort datasets by their first time value and concatenate them along 't',
+    without comparing the other coordinates.
+    """
+    if len(datasets) == 1:
+        return datasets[0]
+    datasets = sorted(datasets, key=lambda ds: ds.indexes["t"][0])
+    return xr.concat(
+        datasets,
+        dim="t",
+        data_vars="minimal",
+        coords="minimal",
+        compat="override",
+        join="override",
+        combine_attrs="drop_conflicts",
+    )
+
+
+def _concat_by_point(datasets, point_types):
+    """
+    Group preprocessed nemo datasets by point type and variables, and concatenate each group along time.
+
+    Returns
+    -------
+    groups : dict or None
+        {(point_type, variables): ds}
+        None if the datasets of a group differ by more than time, and can not be concatenated
+    """
+    groups = {}
+    for ds, point_type in zip(datasets, point_types):
+        groups.setdefault((point_type, tuple(sorted(ds.data_vars))), []).append(ds)
+    for key, group in groups.items():
+        sizes = {
+            tuple(sorted((d, n) for d, n in ds.sizes.items() if d != "t"))
+            for ds in group
+        }
+        if len(sizes) > 1 or any("t" not in ds.dims for ds in group):
+            return None
+        groups[key] = _concat_time(group)
+    return groups
+
+
+def _merge_groups(datasets):
+    """
+    Merge datasets of different point types
+
+    The variables of several datasets holding the same data (e.g. the coordinates
+    assigned from domcfg) are taken from the first one, instead of being compared
+    and combined, so that the merged dataset keeps the arrays of domcfg.
+    """
+    first = {}
+    unique = []
+    for ds in datasets:
+        drop = [
+            name
+            for name, var in ds.variables.items()
+            if name not in ds.indexes and name in first and _same_data(var, first[name])
+        ]
+        first.update({i: v for i, v in ds.variables.items() if i not in first})
+        unique.append(ds.drop_vars(drop))
+    return xr.merge(
+        unique, compat="no_conflicts", join="outer", combine_attrs="drop_conflicts"
+    )
+
+
+def _combine_by_point(datasets, point_types):
+    """
+    Combine preprocessed nemo datasets, using their known layout instead of their coordinates.
+
+    The datasets are grouped by point type and variables, each group is sorted by its first
+    time value and concatenated along 't' without comparing the other coordinates,
+    and the groups are finally merged together.
+    Falls back to xarray.combine_by_coords if the datasets of a group differ by more than time.
+    """
+    groups = _concat_by_point(datasets, point_types)
+    if groups is None:
+        return xr.combine_by_coords(datasets, combine_attrs="drop_conflicts")
+    return _merge_groups(groups.values())
+
+
+def _add_attributes(nemo_ds):
+    """
+    Add the global attributes of a processed nemo dataset
+    """
+    nemo_ds.attrs["name"] = "NEMO dataset"
+    nemo_ds.attrs["description"] = "Ocean grid variables, set on the proper positions"
+    nemo_ds.attrs["title"] = "Ocean grid variables"
+    return nemo_ds
 
 
-def process_nemo(positions, domcfg, parallel=False):
+def process_nemo(positions, domcfg, parallel=False, combine="by_point"):
     """
     Process datasets from NEMO outputs and set coordinates and attributes.
 
@@ -174,8 +680,19 @@ def process_nemo(positions, domcfg, parallel=False):
         'ocean X grid variables' with X in ['T', 'U', ...]
     domcfg : xarray.Dataset
         the domcfg dataset
-    parallel : bool, default False
-        whether to use dask.delayed to process tasks in parallel
+    parallel : bool or int, default False
+        whether to preprocess the datasets in parallel, in a pool of worker processes
+        (the same as open_nemo), the datasets being sent to the workers and back.
+        If an int is given, it is the number of processes, otherwise one process per CPU
+        is used. open_nemo(parallel=...) opens and preprocesses each file in the workers,
+        without sending the datasets to them.
+    combine : {'by_point', 'by_coords'}, default 'by_point'
+        How to combine the datasets.
+        'by_point': the datasets of the same point type and variables are sorted by time and
+        concatenated along 't' without checking the other coordinates, then all point types are merged.
+        Variables without time dimension are taken from the first dataset of each group.
+        'by_coords': use xarray.combine_by_coords, which infers the order of the datasets
+        from the values of all their coordinates (slower).
 
     Returns
     -------
@@ -183,40 +700,58 @@ def process_nemo(positions, domcfg, parallel=False):
         Dataset containing all outputted variables, set on the proper
         grid points (center, face, etc).
     """
-    if parallel:
-        import dask
+    if combine not in ["by_point", "by_coords"]:
+        raise ValueError(
+            f"*combine* must be 'by_point' or 'by_coords', we got combine={combine}"
+        )
+    with _stage("preprocess", n_files=len(positions)):
+        point_types = [_check_position(ds, X) for (ds, X) in positions]
+        # the coordinates of domcfg are attached once, after combining the datasets
+        datasets = _parallel_map(
+            _preprocess,
+            [ds for ds, _ in positions],
+            point_types,
+            parallel=parallel,
+            domcfg=_grid_coords(domcfg) if parallel else domcfg,
+        )
+    return _combine_nemo(datasets, point_types, domcfg, combine)
 
-        # wrap preprocess with delayed
-        preprocess = dask.delayed(nemo_preprocess)
-    else:
-        preprocess = nemo_preprocess
+
+def _preprocess(ds, point_type, domcfg):
+    """nemo_preprocess without attaching the coordinates, mapped by process_nemo"""
+    return nemo_preprocess(ds, domcfg, point_type, attach_coords=False)
+
+
+def _combine_nemo(datasets, point_types, domcfg, combine):
     """
-    list_ds = []
-    for X in positions.keys():
-        for ds in positions[X]:
-            list_ds.append((ds, X))
+    Combine the nemo *datasets* preprocessed with attach_coords=False, and attach the
+    coordinates of domcfg, see process_nemo
     """
-    # Don't use kwargs inside preprocess, otherwise arguments are swapped, bug(?) in dask versions after 2024
-    datasets = [
-        preprocess(ds, domcfg, _check_position(ds, X, parallel))
-        for (ds, X) in positions
-    ]
-    if parallel:
-        # netcdf4 is not thread safe
-        # https://github.com/pydata/xarray/issues/7079#issuecomment-1267477522
-        with dask.config.set(scheduler="single-threaded"):
-            (datasets,) = dask.compute(datasets)
-
-    nemo_ds = xr.combine_by_coords(datasets, combine_attrs="drop_conflicts")
+    with _stage(
+        "combine",
+        n_files=len(datasets),
+        combine=combine,
+        graph_size=lambda: _graph_size(nemo_ds),
+    ):
+        if combine == "by_point":
+            nemo_ds = _combine_by_point(datasets, point_types)
+        else:
+            nemo_ds = xr.combine_by_coords(datasets, combine_attrs="drop_conflicts")
+        nemo_ds = _attach_coords(nemo_ds, domcfg, datasets)
     # adding attributes
-    nemo_ds.attrs["name"] = "NEMO dataset"
-    nemo_ds.attrs["description"] = "Ocean grid variables, set on the proper positions"
-    nemo_ds.attrs["title"] = "Ocean grid variables"
-    return nemo_ds
+    return _add_attributes(nemo_ds)
 
 
 def open_nemo(
-    domcfg, datadir=None, files=None, chunks=None, parallel=False, **kwargs_open
+    domcfg,
+    datadir=None,
+    files=None,
+    chunks=None,
+    parallel=False,
+    combine="by_point",
+    region=None,
+    variables=None,
+    **kwargs_open,
 ):
     """
     Open nemo dataset, and rename the coordinates to be conform to xgcm.Grid
@@ -227,6 +762,12 @@ def open_nemo(
     the global attribute 'description' of each individual file must
     be 'ocean X grid variables' with X in ['T', 'U', ...]
 
+    The per-processor files written by XIOS in 'multiple_file' mode (e.g. 'GYRE_grid_T_0000.nc')
+    are recognized by their DOMAIN_* attributes, and the tiles of each file are placed on the
+    global grid with their DOMAIN_position_first attribute (lazily, one chunk per tile).
+    The points of the tiles removed by NEMO (land processors) are filled with NaN.
+    See xnemogcm.recombine.recombine_nemo to recombine them into one file per grid.
+
     Parameters
     ----------
     datadir : string or pathlib.Path
@@ -236,11 +777,33 @@ def open_nemo(
     files : list, optional
         List of the files to open
     chunks : dict
-        The chunks to use when opening the files,
-        e.g. chunks={'time_counter':10}
-        /! chunks need to be provided with the old names of dimensions
-        i.e. 'time_counter', 'x', etc
-        For more complex chunking, you may want to open without any chunks and set them up afterward.
+        The chunks to use when opening the files, given with the dimensions of the
+        returned dataset, e.g. chunks={'t': 10, 'x_c': 100, 'x_f': 100},
+        with the keys in ['t', 'x_c', 'x_f', 'y_c', 'y_f', 'z_c', 'z_f'].
+        They are translated into the dimensions of each file (e.g. 'time_counter', 'x', 'depthu'),
+        so that the files are directly read with the final chunks.
+        A warning is raised if the chunks split the storage chunks of the files.
+        The chunks can also be given with the old names of dimensions of the files,
+        i.e. 'time_counter', 'x', etc, they are then used as is for every file.
+    parallel : bool or int, default False
+        whether to open the files in parallel, in a pool of worker processes.
+        If an int is given, it is the number of processes, otherwise one process per CPU is used.
+    combine : {'by_point', 'by_coords'}, default 'by_point'
+        How to combine the files, see xnemogcm.process_nemo
+    region : dict, optional
+        If given, only open this region of the domain, with index bounds
+        {'x': slice(i0, i1), 'y': slice(j0, j1)} or longitude / latitude bounds
+        {'lon': (lon0, lon1), 'lat': (lat0, lat1)}, see xnemogcm.open_domain_cfg.
+        The lon/lat bounds are resolved with the 'glamt' and 'gphit' variables of *domcfg*,
+        which can be the full domcfg or the one opened with the same region.
+        The processor tiles outside of the region are not opened, and only the region
+        is read from the other files.
+    variables : list, optional
+        The names of the variables to open, as in the files (e.g. ['toce', 'uoce']).
+        The files containing none of them are not opened (their header is read
+        to find their variables), and the other variables are dropped when
+        opening the files, except the time variables and the depth variables
+        and bounds of the kept variables.
     kwargs_open : any other argument given to the xarray.open_dataset function
 
     Returns
@@ -249,41 +812,35 @@ def open_nemo(
         Dataset containing all outputted variables, set on the proper
         grid points (center, face, etc).
     """
-    files = _dir_or_files_to_files(datadir, files, patterns=["*grid_*.nc"])
-    if not files:
-        raise FileNotFoundError("No output files are provided")
-    #
-    if parallel:
-        from dask import delayed
-
-        open_dataset = delayed(xr.open_dataset)
-        get_point_type = delayed(_get_point_type)
-    else:
-        open_dataset = xr.open_dataset
-        get_point_type = _get_point_type
-    datasets = [
-        open_dataset(
-            f,
-            chunks=chunks or {},
-            **kwargs_open,
-        )
-        for f in files
-    ]
-    positions = [
-        (
-            ds,
-            get_point_type(
-                filename=str(f), description=ds.attrs.get("description", "")
-            ),
+    with _stage(
+        "open_nemo",
+        n_files=lambda: len(files),
+        graph_size=lambda: _graph_size(out),
+    ):
+        files = _dir_or_files_to_files(datadir, files, patterns=["*grid_*.nc"])
+        if not files:
+            raise FileNotFoundError("No output files are provided")
+
+        bounds = None
+        if region is not None:
+            bounds = _resolve_region(
+                _check_region(region), domcfg["glamt"], domcfg["gphit"]
+            )
+            domcfg = _select_region(domcfg, bounds)
+        if combine not in ["by_point", "by_coords"]:
+            raise ValueError(
+                f"*combine* must be 'by_point' or 'by_coords', we got combine={combine}"
+            )
+        positions = _scan_and_open_nemo_files(
+            files, domcfg, chunks, parallel, kwargs_open, bounds, variables
         )
-        for ds, f in zip(datasets, files)
-    ]
-
-    # Follow xarray's handling of open_mfdatasets
-    try:
-        out = process_nemo(positions=positions, domcfg=domcfg, parallel=parallel)
-    except ValueError:
-        for ds in datasets:
-            ds.close()
-        raise
+        datasets = [ds for ds, _ in positions]
+
+        # Follow xarray's handling of open_mfdatasets
+        try:
+            out = _combine_nemo(datasets, [X for _, X in positions], domcfg, combine)
+        except ValueError:
+            for ds in datasets:
+                ds.close()
+            raise
     return out
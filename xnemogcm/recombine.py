@@ -0,0 +1,465 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from .domcfg import _TILE_ATTRS
+from .instrument import _files_size, _stage
+from .tools import (
+    _dir_or_files_to_files,
+    _is_x_dim,
+    _is_y_dim,
+    _parallel_imap,
+    _parallel_map,
+    _tile_stem,
+)
+
+# Maximum size in bytes of the band of rows read at once by a process
+_BAND_BYTES = 256 * 2**20
+
+
+def _is_tile(attrs):
+    """Whether the global attributes *attrs* are the ones of a processor tile"""
+    return "DOMAIN_position_first" in attrs
+
+
+def _is_tile_file(file):
+    """Whether the netcdf *file* is a processor tile"""
+    import netCDF4
+
+    with netCDF4.Dataset(file) as nc:
+        return _is_tile(nc.ncattrs())
+
+
+def _is_horizontal(dims):
+    """Whether the last dimensions *dims* of a variable are the (y, x) dimensions"""
+    return len(dims) >= 2 and _is_y_dim(dims[-2]) and _is_x_dim(dims[-1])
+
+
+def _fill_value(var):
+    """Value of the points of *var* not covered by any tile (land processors removed by NEMO)"""
+    if "_FillValue" in var.ncattrs():
+        return var.getncattr("_FillValue")
+    return np.nan if var.dtype.kind == "f" else 0
+
+
+def _tile_position(file):
+    """
+    Return the 0-based (x0, y0) position and the (nx, ny) size of the processor tile *file*
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(file) as nc:
+        attrs = nc.__dict__
+        if not _is_tile(attrs):
+            raise ValueError(f"{file} is not a processor tile (no DOMAIN_* attributes)")
+        x0, y0 = (int(i) - 1 for i in attrs["DOMAIN_position_first"])
+        nx, ny = (int(i) for i in attrs["DOMAIN_size_local"])
+        return x0, y0, nx, ny
+
+
+def _read_band(files, x0s, names, y_size, index, nx):
+    """
+    Read the variables *names* of the tiles *files* of a band of rows, and return them
+    as {name: array} of the global width *nx*.
+
+    *index* is a slice along the first dimension of the variables, or None.
+    """
+    import netCDF4
+
+    band = {}
+    for file, x0 in zip(files, x0s):
+        with netCDF4.Dataset(file) as nc:
+            nc.set_auto_maskandscale(False)
+            for name in names:
+                var = nc[name]
+                data = var[...] if index is None else var[index]
+                if name not in band:
+                    band[name] = np.full(
+                        (*data.shape[:-2], y_size, nx), _fill_value(var), var.dtype
+                    )
+                band[name][..., : data.shape[-2], x0 : x0 + data.shape[-1]] = data
+    return band
+
+
+def _create_variables(nc, tile, nx, ny, chunks, complevel, drop_attrs):
+    """
+    Define in *nc* the dimensions, variables and attributes of the processor *tile*,
+    with the global size (*nx*, *ny*), and copy the variables without horizontal dimensions.
+
+    Returns the names of the variables with horizontal dimensions.
+    """
+    nc.setncatts({i: tile.getncattr(i) for i in tile.ncattrs() if i not in drop_attrs})
+    sizes = {}
+    for name, dim in tile.dimensions.items():
+        sizes[name] = nx if _is_x_dim(name) else ny if _is_y_dim(name) else len(dim)
+        nc.createDimension(name, None if dim.isunlimited() else sizes[name])
+    names = []
+    for name, var in tile.variables.items():
+        attrs = {i: var.getncattr(i) for i in var.ncattrs() if i != "_FillValue"}
+        if not _is_horizontal(var.dimensions):
+            out = nc.createVariable(
+                name,
+                var.dtype,
+                var.dimensions,
+                fill_value=var.__dict__.get("_FillValue"),
+            )
+            out.setncatts(attrs)
+            out.set_auto_maskandscale(False)
+            if var.ndim == 0:
+                out.assignValue(var.getValue())
+            else:
+                out[tuple(slice(0, i) for i in var.shape)] = var[...]
+            continue
+        names.append(name)
+        out = nc.createVariable(
+            name,
+            var.dtype,
+            var.dimensions,
+            compression="zlib" if complevel else None,
+            complevel=complevel,
+            shuffle=bool(complevel),
+            chunksizes=[
+                max(1, min(chunks.get(dim, 1), sizes[dim])) for dim in var.dimensions
+            ],
+            fill_value=var.__dict__.get("_FillValue", False),
+        )
+        out.setncatts(attrs)
+        out.set_auto_maskandscale(False)
+    return names
+
+
+def _batches(tile, names, y_size, nx):
+    """
+    Split *names* in batches of variables whose band of rows is smaller than _BAND_BYTES.
+
+    Returns [(names, index), ...], with *index* a slice along the first dimension for the
+    variables whose band alone is too large (e.g. many time steps), None otherwise.
+    """
+    batches = [([], None)]
+    size = 0
+    for name in names:
+        var = tile[name]
+        step = np.prod(var.shape[1:-2], dtype=int) * y_size * nx * var.dtype.itemsize
+        var_size = step * (var.shape[0] if var.ndim > 2 else 1)
+        if var.ndim > 2 and var_size > _BAND_BYTES:
+            n = max(1, _BAND_BYTES // step)
+            batches += [
+                ([name], slice(i, min(i + n, var.shape[0])))
+                for i in range(0, var.shape[0], n)
+            ]
+            continue
+        if batches[-1][0] and size + var_size > _BAND_BYTES:
+            batches.append(([], None))
+            size = 0
+        batches[-1][0].append(name)
+        size += var_size
+    return [batch for batch in batches if batch[0]]
+
+
+def _recombine_files(
+    files, out_path, parallel=False, complevel=1, chunks=None, drop_attrs=_TILE_ATTRS
+):
+    """
+    Recombine the processor tiles *files* into the file *out_path*, see recombine_domain_cfg.
+
+    *drop_attrs* are the global attributes of the tiles not written in the output file.
+    """
+    import netCDF4
+
+    files = sorted(files)
+    positions = _parallel_map(_tile_position, files, parallel=parallel)
+    # bands of rows of tiles, from south to north
+    bands = {}
+    for file, (x0, y0, tile_nx, tile_ny) in zip(files, positions):
+        band = bands.setdefault(y0, {"files": [], "x0s": [], "ny": 0})
+        band["files"].append(file)
+        band["x0s"].append(x0)
+        band["ny"] = max(band["ny"], tile_ny)
+    bands = dict(sorted(bands.items()))
+
+    with netCDF4.Dataset(files[0]) as tile, netCDF4.Dataset(out_path, "w") as nc:
+        nx, ny = (int(i) for i in tile.getncattr("DOMAIN_size_global"))
+        # by default a chunk is a level of a band of tiles, written at once
+        band_ny = next(iter(bands.values()))["ny"]
+        chunks = {
+            dim: (chunks or {}).get(
+                dim, nx if _is_x_dim(dim) else band_ny if _is_y_dim(dim) else 1
+            )
+            for dim in tile.dimensions
+        }
+        names = _create_variables(nc, tile, nx, ny, chunks, complevel, drop_attrs)
+        tasks = [
+            (band["files"], band["x0s"], batch, min(band["ny"], ny - y0), index, y0)
+            for y0, band in bands.items()
+            for batch, index in _batches(tile, names, band["ny"], nx)
+        ]
+        results = _parallel_imap(
+            _read_band, *list(zip(*tasks))[:5], parallel=parallel, nx=nx
+        )
+        # netcdf4 is not parallel safe: only this process writes
+        for (*_, y_size, index, y0), band in zip(tasks, results):
+            for name, data in band.items():
+                leading = [slice(0, i) for i in data.shape[:-2]]
+                if index is not None:
+                    leading[0] = index
+                nc[name][(*leading, slice(y0, y0 + y_size))] = data
+    return Path(out_path)
+
+
+def _combine_tiles(datasets):
+    """
+    Place the processor tiles *datasets* of a same output file on the global grid.
+
+    The tiles are placed with their DOMAIN_position_first attribute, without comparing
+    any coordinate, and combined lazily with dask.array.block: no data is read, and
+    a chunk never spans two tiles. The points not covered by any tile (land processors
+    removed by NEMO) are filled with NaN (0 for integer variables).
+    The variables without horizontal dimensions are taken from the first tile,
+    and the DOMAIN_* attributes are removed.
+    """
+    import dask.array as da
+    import xarray as xr
+
+    first = datasets[0]
+    nx, ny = (int(i) for i in first.attrs["DOMAIN_size_global"])
+    tiles = {
+        tuple(int(i) - 1 for i in ds.attrs["DOMAIN_position_first"]): ds
+        for ds in datasets
+    }
+    # the edges of the blocks are the borders of the tiles, the gaps between them
+    # being tiles removed by NEMO (land processors) or skipped outside of a region
+    x_edges, y_edges = {0, nx}, {0, ny}
+    for (x0, y0), ds in tiles.items():
+        width, height = (int(i) for i in ds.attrs["DOMAIN_size_local"])
+        x_edges.update([x0, x0 + width])
+        y_edges.update([y0, y0 + height])
+    x0s, widths = sorted(x_edges)[:-1], np.diff(sorted(x_edges))
+    y0s, heights = sorted(y_edges)[:-1], np.diff(sorted(y_edges))
+    variables = {}
+    for name, var in first.variables.items():
+        if not _is_horizontal(var.dims):
+            variables[name] = var
+            continue
+        fill = np.nan if var.dtype.kind == "f" else 0
+        blocks = []
+        for y0, height in zip(y0s, heights):
+            row = []
+            for x0, width in zip(x0s, widths):
+                shape = (*var.shape[:-2], height, width)
+                if (x0, y0) not in tiles:
+                    row.append(da.full(shape, fill, dtype=var.dtype))
+                    continue
+                data = tiles[(x0, y0)][name].data
+                if data.shape != shape:
+                    raise ValueError(
+                        f"The tile at the position {(x0 + 1, y0 + 1)} has the shape "
+                        f"{data.shape[-2:]} instead of {shape[-2:]}: the tiles do not "
+                        "form a regular decomposition of the domain"
+                    )
+                row.append(da.asarray(data))
+            blocks.append(row)
+        encoding = {
+            i: v
+            for i, v in var.encoding.items()
+            if i not in ["chunksizes", "preferred_chunks", "original_shape"]
+        }
+        variables[name] = xr.Variable(var.dims, da.block(blocks), var.attrs, encoding)
+    ds = xr.Dataset(
+        {name: var for name, var in variables.items() if name not in first.coords},
+        coords={name: var for name, var in variables.items() if name in first.coords},
+        attrs={i: v for i, v in first.attrs.items() if not i.startswith("DOMAIN_")},
+    )
+    ds.encoding = first.encoding
+    return ds
+
+
+def _combine_tile_datasets(positions, files):
+    """
+    Combine the datasets of *positions* = [(ds, point_type), ...] opened from the processor
+    tiles *files*, grouped by output file (the file name without processor number).
+
+    The datasets that are not processor tiles are returned unchanged.
+    """
+    out = []
+    groups = {}
+    for (ds, point_type), f in zip(positions, files):
+        if _is_tile(ds.attrs):
+            groups.setdefault((point_type, _tile_stem(f)), []).append(ds)
+        else:
+            out.append((ds, point_type))
+    if not groups:
+        return positions
+    with _stage("tiles", n_files=len(positions) - len(out)):
+        for (point_type, _), datasets in groups.items():
+            out.append((_combine_tiles(datasets), point_type))
+    return out
+
+
+def recombine_domain_cfg(
+    out_path, datadir=None, files=None, parallel=False, complevel=1, chunks=None
+):
+    """
+    Recombine the processor tiles of a domain_cfg / mesh_mask into a single netcdf file.
+
+    The tiles are placed with their DOMAIN_position_first attribute, and the points not
+    covered by any tile (land processors removed by NEMO) are filled with the fill value
+    of the variables, or NaN (floats) and 0 (integers) if they have none.
+    The tiles are read by bands of rows, so that the global grid is never held in memory,
+    and written to a compressed and chunked netcdf4 file.
+    The output file can be opened with xnemogcm.open_domain_cfg(files=[out_path]), and gives
+    the same dataset as the tiles.
+
+    Parameters
+    ----------
+    out_path : string or pathlib.Path
+        The recombined netcdf file to write
+    datadir : string or pathlib.Path or None
+        The directory containing the 'domain_cfg' or 'mesh_mask' tiles
+    files : list or iterator or None
+        The tiles, see xnemogcm.open_domain_cfg
+    parallel : bool or int
+        If True, read the tiles in a pool of one process per CPU, if an int, the number of processes.
+        The file is always written by the calling process.
+    complevel : int
+        zlib compression level of the variables with horizontal dimensions, 0 to not compress
+    chunks : dict or None
+        The storage chunks, in the dimensions of the files, e.g. {'x': 500, 'y': 500, 'nav_lev': 75}.
+        By default, a chunk is a level of a row of tiles.
+
+    Returns
+    -------
+    out_path : pathlib.Path
+    """
+    files = _dir_or_files_to_files(
+        datadir, files, patterns=["*domain_cfg*.nc", "*mesh_mask*.nc"]
+    )
+    if not files:
+        raise FileNotFoundError("No 'domain_cfg' or 'mesh_mask' files are provided")
+    with _stage("recombine", n_files=len(files), file_bytes=lambda: _files_size(files)):
+        return _recombine_files(files, out_path, parallel, complevel, chunks)
+
+
+def _recombine_nemo_file(files, out_path, parallel=False, complevel=1, chunks=None):
+    """
+    Recombine the tiles *files* of one output file, without any DOMAIN_* attribute
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(files[0]) as nc:
+        drop_attrs = [i for i in nc.ncattrs() if i.startswith("DOMAIN_")]
+    return _recombine_files(files, out_path, parallel, complevel, chunks, drop_attrs)
+
+
+def recombine_nemo(
+    out_dir, datadir=None, files=None, parallel=False, complevel=1, chunks=None
+):
+    """
+    Recombine the per-processor output files of NEMO (XIOS 'multiple_file' mode,
+    e.g. 'GYRE_1y_grid_T_0000.nc', 'GYRE_1y_grid_T_0001.nc', ...) into one file per grid.
+
+    The tiles of each output file are placed with their DOMAIN_position_first attribute,
+    and written to *out_dir* / 'GYRE_1y_grid_T.nc' as a compressed and chunked netcdf4 file,
+    as the 'one_file' mode of XIOS would have written it (see recombine_domain_cfg).
+    The files that are not processor tiles are ignored.
+
+    Parameters
+    ----------
+    out_dir : string or pathlib.Path
+        The directory of the recombined files, created if needed
+    datadir : string or pathlib.Path or None
+        The directory containing the tiles, the files matching '*grid_*.nc' are recombined
+    files : list or iterator or None
+        The tiles, see xnemogcm.open_nemo
+    parallel : bool or int
+        If True, use a pool of one process per CPU, if an int, the number of processes.
+        The output files are written in parallel, or if there is only one output file,
+        its tiles are read in parallel.
+    complevel, chunks :
+        see recombine_domain_cfg, the chunks being given in the dimensions of the nemo files
+        (e.g. {'time_counter': 1, 'deptht': 75})
+
+    Returns
+    -------
+    out_files : list of pathlib.Path
+    """
+    files = _dir_or_files_to_files(datadir, files, patterns=["*grid_*.nc"])
+    if not files:
+        raise FileNotFoundError("No output files are provided")
+    out_dir = Path(out_dir).expanduser()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with _stage("recombine", n_files=len(files), file_bytes=lambda: _files_size(files)):
+        groups = {}
+        for f in files:
+            if _is_tile_file(f):
+                groups.setdefault(_tile_stem(f), []).append(f)
+        out_files = [out_dir / f"{stem}.nc" for stem in groups]
+        if len(groups) == 1:
+            (tiles,) = groups.values()
+            _recombine_nemo_file(tiles, out_files[0], parallel, complevel, chunks)
+        else:
+            # each file is written by one process
+            _parallel_map(
+                _recombine_nemo_file,
+                groups.values(),
+                out_files,
+                parallel=parallel,
+                complevel=complevel,
+                chunks=chunks,
+            )
+    return out_files
+
+
+def main(argv=None):
+    """
+    Command line interface of recombine_domain_cfg and recombine_nemo,
+    installed as 'xnemogcm-recombine'
+    """
+    parser = argparse.ArgumentParser(
+        prog="xnemogcm-recombine",
+        description="Recombine the processor tiles of a NEMO domain_cfg / mesh_mask into "
+        "a single netcdf file, or of NEMO output files into one file per grid.",
+    )
+    parser.add_argument(
+        "out_path",
+        help="the recombined netcdf file to write, or its directory with --nemo",
+    )
+    parser.add_argument("files", nargs="+", help="the processor tiles")
+    parser.add_argument(
+        "--nemo",
+        action="store_true",
+        help="the tiles are output files (e.g. '*_grid_T_0000.nc'), recombined per grid",
+    )
+    parser.add_argument(
+        "-j",
+        "--processes",
+        type=int,
+        default=0,
+        help="number of processes (default: run serially)",
+    )
+    parser.add_argument(
+        "--complevel",
+        type=int,
+        default=1,
+        help="zlib compression level, 0 to not compress (default: 1)",
+    )
+    parser.add_argument(
+        "--chunks",
+        default=None,
+        help="storage chunks, e.g. 'x=500,y=500,nav_lev=75' (default: a level of a row of tiles)",
+    )
+    args = parser.parse_args(argv)
+    chunks = None
+    if args.chunks:
+        chunks = {
+            dim: int(size)
+            for dim, size in (i.split("=") for i in args.chunks.split(","))
+        }
+    recombine = recombine_nemo if args.nemo else recombine_domain_cfg
+    recombine(
+        args.out_path,
+        files=args.files,
+        parallel=args.processes or False,
+        complevel=args.complevel,
+        chunks=chunks,
+    )
@@ -0,0 +1,275 @@
+import numpy as np
+
+from .tools import _is_x_dim, _is_y_dim
+
+# keys of a region given with index bounds, and with lon/lat bounds
+_INDEX_KEYS = ("x", "y")
+_LONLAT_KEYS = ("lon", "lat")
+
+
+def _bounds(value, key):
+    """
+    Return the (start, stop) bounds given as a slice or a 2-tuple for the *key* of a region
+    """
+    if isinstance(value, slice):
+        if value.step not in (None, 1):
+            raise ValueError(
+                f"The slice of region['{key}'] can not have a step, we got {value}"
+            )
+        value = (value.start, value.stop)
+    try:
+        start, stop = value
+    except (TypeError, ValueError):
+        raise ValueError(
+            f"region['{key}'] must be a slice or a (start, stop) tuple, we got {value}"
+        ) from None
+    return start, stop
+
+
+def _check_region(region):
+    """
+    Check the *region* given to open_domain_cfg / open_nemo and return its bounds
+
+    Returns
+    -------
+    bounds : dict
+        {key: (start, stop)}, with the keys being either in ('x', 'y') or in ('lon', 'lat')
+    """
+    if not isinstance(region, dict) or not region:
+        raise ValueError(
+            "*region* must be a dict with the keys 'x' and/or 'y' (index bounds), or "
+            f"'lon' and/or 'lat' (longitude / latitude bounds), we got region={region}"
+        )
+    keys = set(region)
+    if not (keys <= set(_INDEX_KEYS) or keys <= set(_LONLAT_KEYS)):
+        raise ValueError(
+            "*region* must be given either with the keys 'x' and 'y' or with the keys "
+            f"'lon' and 'lat', we got region={region}"
+        )
+    bounds = {key: _bounds(value, key) for key, value in region.items()}
+    for key in keys & set(_INDEX_KEYS):
+        if any(i is not None and i < 0 for i in bounds[key]):
+            raise ValueError(
+                f"The index bounds of *region* must be positive, we got region={region}"
+            )
+    return bounds
+
+
+def _is_lonlat(bounds):
+    """Whether the region *bounds* are given with longitude / latitude"""
+    return any(key in bounds for key in _LONLAT_KEYS)
+
+
+def _lonlat_mask(lon, lat, bounds):
+    """
+    Return the mask of the points of (*lon*, *lat*) within the lon/lat *bounds*.
+
+    If the first longitude bound is larger than the second one, the region crosses
+    the date line, e.g. (170, -170).
+    """
+    mask = np.ones(np.shape(lon), dtype=bool)
+    if "lon" in bounds:
+        lon0, lon1 = bounds["lon"]
+        if lon0 <= lon1:
+            mask &= (lon >= lon0) & (lon <= lon1)
+        else:
+            mask &= (lon >= lon0) | (lon <= lon1)
+    if "lat" in bounds:
+        lat0, lat1 = bounds["lat"]
+        mask &= (lat >= lat0) & (lat <= lat1)
+    return mask
+
+
+def _lonlat_points(lon, lat, x, y, bounds):
+    """
+    Return the global indices (columns, rows) of the points of (*lon*, *lat*) within the
+    lon/lat *bounds*, *x* and *y* being the global indices of their columns and rows.
+
+    Returns None if no point is within the bounds.
+    """
+    jj, ii = np.nonzero(_lonlat_mask(lon, lat, bounds))
+    if not ii.size:
+        return None
+    return np.asarray(x)[ii], np.asarray(y)[jj]
+
+
+def _box(points, covered, bounds):
+    """
+    Return the smallest index box {'x': (i0, i1), 'y': (j0, j1)} containing the *points*,
+    a list of the (columns, rows) returned by _lonlat_points (the None ones are ignored).
+
+    *covered* are the global indices of the columns where the points were looked for.
+    A covered column between the first and the last selected columns without any point
+    in the bounds means that the region is split by the seam of the grid (e.g. a
+    longitude range crossing the east-west periodicity), a ValueError is then raised
+    as the region can not be opened as a single index box.
+
+    Returns None if there is no point.
+    """
+    points = [i for i in points if i is not None]
+    if not points:
+        return None
+    columns = np.unique(np.concatenate([i for i, _ in points]))
+    rows = np.concatenate([j for _, j in points])
+    covered = np.asarray(covered)
+    inside = covered[(covered > columns[0]) & (covered < columns[-1])]
+    gaps = np.setdiff1d(inside, columns)
+    if gaps.size:
+        split = int(columns[np.searchsorted(columns, gaps[0]) - 1]) + 1
+        raise ValueError(
+            f"The points within the region {bounds} are on both sides of the seam of "
+            f"the grid: in the columns [{int(columns[0])}, {split}) and "
+            f"[{int(columns[columns > gaps[0]][0])}, {int(columns[-1]) + 1}), that can "
+            "not be opened as a single index box. Open the two parts separately (e.g. "
+            "with lon=(170, 180) and lon=(-180, -170) instead of lon=(170, -170)) and "
+            "concatenate them along the x dimensions."
+        )
+    return {
+        "x": (int(columns[0]), int(columns[-1]) + 1),
+        "y": (int(rows.min()), int(rows.max()) + 1),
+    }
+
+
+def _empty_region(bounds):
+    return ValueError(f"No T point of the grid is within the region {bounds}")
+
+
+def _resolve_region(bounds, glamt, gphit):
+    """
+    Return the index bounds of the region *bounds*, the lon/lat bounds being resolved
+    with the 2D DataArrays *glamt* and *gphit*, whose (y, x) coordinates are global indices.
+
+    The index box is the smallest one containing all the T points within the bounds.
+    """
+    if not _is_lonlat(bounds):
+        return bounds
+    y_dim, x_dim = glamt.dims[-2:]
+    x = glamt[x_dim].values
+    points = _lonlat_points(
+        np.asarray(glamt), np.asarray(gphit), x, glamt[y_dim].values, bounds
+    )
+    box = _box([points], x, bounds)
+    if box is None:
+        raise _empty_region(bounds)
+    return box
+
+
+def _read_file_points(file, bounds):
+    """
+    Return the global indices of the T points of the domcfg *file* within the lon/lat
+    *bounds* (see _lonlat_points) and the global indices of the columns of the file,
+    reading only its 'glamt' and 'gphit' variables.
+
+    The points are None if no point is within the bounds, or if the file has no
+    'glamt' / 'gphit'.
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(file) as nc:
+        if "glamt" not in nc.variables or "gphit" not in nc.variables:
+            return None, []
+        x0, y0 = (int(i) - 1 for i in nc.__dict__.get("DOMAIN_position_first", (1, 1)))
+        lon = np.squeeze(nc["glamt"][...])
+        lat = np.squeeze(nc["gphit"][...])
+    ny, nx = lon.shape
+    x = np.arange(nx) + x0
+    return _lonlat_points(lon, lat, x, np.arange(ny) + y0, bounds), x
+
+
+def _resolve_files_region(bounds, files):
+    """
+    Return the index bounds of the region *bounds*, the lon/lat bounds being resolved
+    with the 'glamt' and 'gphit' variables of the domcfg *files*
+    """
+    if not _is_lonlat(bounds):
+        return bounds
+    points, covered = zip(*(_read_file_points(f, bounds) for f in files))
+    box = _box(points, np.concatenate(covered), bounds)
+    if box is None:
+        raise _empty_region(bounds)
+    return box
+
+
+def _in_region(first, last, bounds):
+    """
+    Whether the tile spanning the 1-based global indices *first* to *last* (included)
+    intersects the index *bounds*
+    """
+    for key, i0, i1 in zip(_INDEX_KEYS, first, last):
+        start, stop = bounds.get(key, (None, None))
+        if (start is not None and i1 - 1 < start) or (
+            stop is not None and i0 - 1 >= stop
+        ):
+            return False
+    return True
+
+
+def _tile_span(file):
+    """
+    Return the 1-based (first, last) global indices of the processor tile *file*,
+    None if it is not a processor tile
+    """
+    import netCDF4
+
+    with netCDF4.Dataset(file) as nc:
+        attrs = nc.__dict__
+        if "DOMAIN_position_first" not in attrs:
+            return None
+        return attrs["DOMAIN_position_first"], attrs["DOMAIN_position_last"]
+
+
+def _region_files(files, region):
+    """
+    Return the domcfg *files* intersecting the *region*, and the index bounds of the region
+    """
+    bounds = _resolve_files_region(_check_region(region), files)
+    if len(files) > 1:
+        spans = [_tile_span(f) for f in files]
+        files = [
+            f
+            for f, span in zip(files, spans)
+            if span is None or _in_region(*span, bounds)
+        ]
+        if not files:
+            raise _empty_region(bounds)
+    return files, bounds
+
+
+def _select_region(ds, bounds):
+    """
+    Select the index *bounds* in the dataset *ds*, with the labels of its horizontal dimensions.
+
+    The coordinates of the centers (x_c, y_c, or x, y for a raw domcfg) are the global indices,
+    and the ones of the faces (x_f, y_f) are shifted by +0.5: the faces on the right of the
+    selected centers are selected, so that the centers and faces dimensions have the same size.
+    """
+    indexers = {}
+    for key, dims in [("x", ("x", "x_c", "x_f")), ("y", ("y", "y_c", "y_f"))]:
+        if key not in bounds:
+            continue
+        start, stop = bounds[key]
+        for dim in dims:
+            if dim not in ds.dims:
+                continue
+            shift = 0.5 if dim.endswith("_f") else 0
+            indexers[dim] = slice(
+                None if start is None else start + shift,
+                None if stop is None else stop - 1 + shift,
+            )
+    ds = ds.sel(indexers)
+    if any(ds.sizes[dim] == 0 for dim in indexers):
+        raise _empty_region(bounds)
+    return ds
+
+
+def _isel_region(ds, bounds):
+    """
+    Select the index *bounds* in the raw nemo dataset *ds* on the global grid, with the
+    positions along its horizontal dimensions (e.g. 'x', 'y_grid_T', 'x_grid_U_inner')
+    """
+    indexers = {}
+    for dim in ds.dims:
+        key = "x" if _is_x_dim(dim) else "y" if _is_y_dim(dim) else None
+        if key in bounds:
+            indexers[dim] = slice(*bounds[key])
+    return ds.isel(indexers)
@@ -0,0 +1,23 @@
+import pickle
+
+import pytest
+
+from xnemogcm import arakawa_points as akp
+
+
+def test_point_cached_and_immutable():
+    point = akp.Point("U")
+    assert point is akp.Point("U")
+    assert (point.x, point.y, point.z) == ("x_f", "y_c", "z_c")
+    assert pickle.loads(pickle.dumps(point)) is point
+    with pytest.raises(AttributeError):
+        point.x = "x_c"
+    with pytest.raises(ValueError):
+        akp.Point("X")
+
+
+def test_bulk_helpers():
+    assert akp.get_dims(["T", "FW"]) == [("x_c", "y_c", "z_c"), ("x_f", "y_f", "z_f")]
+    assert akp.get_rename_dims({"e1v": "V", "jpiglo": None}) == {
+        "e1v": {"x": "x_c", "y": "y_f", "nav_lev": "z_c"}
+    }
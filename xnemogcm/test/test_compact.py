@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from xnemogcm import open_nemo_and_domain_cfg
+
+
+@pytest.fixture
+def ds(data_path):
+    p = data_path / "open_and_merge"
+    return open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+
+
+def test_compress(ds):
+    """Test that the compact layout only has the ocean points"""
+    compact = ds.xnemogcm.compress()
+    assert "toce" in compact and "uoce" not in compact and "tmask" not in compact
+    assert compact.sizes["ocean"] == int(ds.tmask.sum())
+    assert compact.toce.dims == ("t", "ocean")
+    assert compact.toce.chunks is not None
+    assert compact.glamt.dims == ("ocean",)
+    assert not compact.toce.isnull().any()
+    point = compact.isel(ocean=-1)
+    np.testing.assert_array_equal(
+        point.toce,
+        ds.toce.sel(z_c=point.z_c, y_c=point.y_c, x_c=point.x_c),
+    )
+    surface = ds.xnemogcm.compress(["e1t"], surface=True)
+    assert surface.sizes["ocean"] == int(ds.tmaskutil.sum())
+    assert "area" in surface.coords
+    with pytest.raises(ValueError):
+        ds.xnemogcm.compress(["uoce"])
+    with pytest.raises(ValueError):
+        ds.xnemogcm.compress(surface=True, point_type="W")
+
+
+@pytest.mark.parametrize("point_type", ["T", "U"])
+def test_decompress(ds, point_type):
+    """Test scattering the compact layout back to the grid"""
+    compact = ds.xnemogcm.compress(point_type=point_type)
+    dense = ds.xnemogcm.decompress(compact)
+    masked = ds.xnemogcm.mask(list(dense.data_vars))
+    for name in dense.data_vars:
+        xr.testing.assert_identical(
+            dense[name], masked[name].transpose(*dense[name].dims)
+        )
+
+
+@pytest.mark.parametrize("surface", [False, True])
+def test_integral_mean(ds, surface):
+    """Test that the reductions give the same results on the grid and compressed"""
+    compact = ds.xnemogcm.compress(surface=surface)
+    variables = list(compact.data_vars)
+    xr.testing.assert_allclose(
+        compact.xnemogcm.integral(), ds.xnemogcm.integral(variables)
+    )
+    xr.testing.assert_allclose(compact.xnemogcm.mean(), ds.xnemogcm.mean(variables))
+    if not surface:
+        volume = ds.e1t * ds.e2t * ds.e3t
+        expected = (ds.toce * volume).where(ds.tmask == 1).sum(["z_c", "y_c", "x_c"])
+        xr.testing.assert_allclose(
+            compact.xnemogcm.integral(["toce"]).toce, expected, rtol=1e-5
+        )
+        assert compact.xnemogcm.mean(["toce"]).toce.dims == ("t",)
@@ -1,3 +1,8 @@
+import warnings
+
+import pytest
+import xarray as xr
+
 from xnemogcm import open_domain_cfg, open_nemo
 
 
@@ -41,3 +46,44 @@ def test_open_nemo_chunks(data_path):
     for i in ["uoce", "soce", "toce"]:
         assert nemo_ds[i].chunks is not None
     assert nemo_ds.chunks["t"] == (1,)
+
+
+def test_open_nemo_chunks_new_dims(data_path):
+    """Test opening of nemo files, with chunks given with the new dimensions"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    with pytest.warns(UserWarning, match="split the storage chunks"):
+        chunked = open_nemo(
+            datadir=data_path / "nemo",
+            domcfg=domcfg,
+            chunks={"t": 1, "x_c": 4, "x_f": 8, "z_f": 2},
+        )
+    assert chunked.toce.chunks[-1][0] == 4
+    assert chunked.uoce.chunks[-1][0] == 8
+    assert chunked.woce.chunks[1][0] == 2
+    assert len(chunked.toce.chunks[1]) == 1
+    # the files are read with the final chunks, without rechunking
+    assert not any("rechunk" in i for i in chunked.toce.data.dask.layers)
+    xr.testing.assert_identical(nemo_ds, chunked)
+
+
+def test_open_nemo_chunks_storage(data_path):
+    """Test that no warning is raised for chunks aligned with the storage chunks"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", UserWarning)
+        open_nemo(
+            datadir=data_path / "nemo",
+            domcfg=domcfg,
+            chunks={"t": 1, "x_c": -1},
+        )
+    with pytest.raises(ValueError):
+        open_nemo(
+            datadir=data_path / "nemo",
+            domcfg=domcfg,
+            chunks={"t": 1, "x": 4},
+        )
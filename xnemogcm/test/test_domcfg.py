@@ -1,4 +1,13 @@
-from xnemogcm import open_domain_cfg
+import os
+import shutil
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from xnemogcm import open_domain_cfg, recombine_domain_cfg
+from xnemogcm.recombine import main
+from xnemogcm.region import _region_files, _resolve_region
 
 
 def test_options_for_files(data_path, request):
@@ -120,3 +129,212 @@ def test_attributes(data_path):
         datadir=data_path / "mesh_mask_1_file",
     )
     assert domcfg.glamt.attrs.get("standard_name") == "longitude"
+
+
+def test_cache(data_path, tmp_path):
+    """Test that the cached domcfg is identical and invalidated when files change"""
+    datadir = data_path / "mesh_mask_multi_files"
+    cache_dir = tmp_path / "cache"
+    domcfg = open_domain_cfg(datadir=datadir)
+    domcfg_cached = open_domain_cfg(datadir=datadir, cache_dir=cache_dir)
+    xr.testing.assert_identical(domcfg, domcfg_cached)
+    assert len(list(cache_dir.glob("*.nc"))) == 1
+    # second call reuses the entry
+    domcfg_cached = open_domain_cfg(datadir=datadir, cache_dir=cache_dir)
+    xr.testing.assert_identical(domcfg, domcfg_cached)
+    assert len(list(cache_dir.glob("*.nc"))) == 1
+    # other options create a new entry
+    open_domain_cfg(datadir=datadir, cache_dir=cache_dir, add_coordinates=False)
+    assert len(list(cache_dir.glob("*.nc"))) == 2
+
+
+def test_cache_invalidation_and_eviction(data_path, tmp_path):
+    datadir = tmp_path / "data"
+    datadir.mkdir()
+    for f in (data_path / "mesh_mask_multi_files").glob("*.nc"):
+        shutil.copy(f, datadir)
+    cache_dir = tmp_path / "cache"
+    open_domain_cfg(datadir=datadir, cache_dir=cache_dir)
+    (entry,) = cache_dir.glob("*.nc")
+    # modifying a file invalidates the entry
+    f = next(datadir.glob("*.nc"))
+    os.utime(f, ns=(f.stat().st_atime_ns, f.stat().st_mtime_ns + 10**9))
+    open_domain_cfg(datadir=datadir, cache_dir=cache_dir, cache_max_size=0)
+    # the old entry has been evicted, the new one is kept
+    (new_entry,) = cache_dir.glob("*.nc")
+    assert new_entry != entry
+
+
+def test_chunks(data_path):
+    """Test the chunks given in the xgcm dimensions"""
+    datadir = data_path / "mesh_mask_multi_files"
+    domcfg = open_domain_cfg(datadir=datadir)
+    chunked = open_domain_cfg(datadir=datadir, chunks={"x_c": 5, "x_f": 5, "z_c": 2})
+    assert set(chunked.tmask.chunks[-1][:-1]) == {5}
+    assert set(chunked.umask.chunks[-1][:-1]) == {5}
+    assert set(chunked.tmask.chunks[0][:-1]) == {2}
+    xr.testing.assert_identical(domcfg.load(), chunked.load())
+
+
+def test_chunks_auto(data_path):
+    """Test that the auto chunks merge the processor tiles and do not split z"""
+    datadir = data_path / "mesh_mask_multi_files"
+    domcfg = open_domain_cfg(datadir=datadir)
+    chunked = open_domain_cfg(datadir=datadir, chunks="auto")
+    # the test files are small: one chunk per variable
+    assert len(domcfg.tmask.data.chunks[-1]) > 1
+    assert all(len(c) == 1 for c in chunked.tmask.chunks)
+    xr.testing.assert_identical(domcfg.load(), chunked.load())
+
+
+def test_cache_chunks(data_path, tmp_path):
+    """Test that the cache entry is reopened with the chunks"""
+    datadir = data_path / "mesh_mask_1_file"
+    cache_dir = tmp_path / "cache"
+    open_domain_cfg(datadir=datadir, cache_dir=cache_dir)
+    domcfg = open_domain_cfg(datadir=datadir, cache_dir=cache_dir, chunks={"y_c": 5})
+    assert len(os.listdir(cache_dir)) == 1
+    assert set(domcfg.tmask.chunks[1][:-1]) == {5}
+
+
+def test_recombine_domain_cfg(data_path, tmp_path):
+    """Test that the recombined tiles give the same domcfg as the tiles"""
+    datadir = data_path / "mesh_mask_multi_files"
+    domcfg = open_domain_cfg(datadir=datadir)
+    out = recombine_domain_cfg(tmp_path / "mesh_mask.nc", datadir=datadir)
+    xr.testing.assert_identical(domcfg, open_domain_cfg(files=[out]))
+    # command line, reading the tiles in 2 processes
+    main([str(tmp_path / "cli.nc"), *map(str, datadir.glob("*.nc")), "-j", "2"])
+    xr.testing.assert_identical(domcfg, open_domain_cfg(files=[tmp_path / "cli.nc"]))
+
+
+def test_recombine_domain_cfg_missing_tile(data_path, tmp_path):
+    """Test that the tiles removed by NEMO (land processors) are filled"""
+    files = sorted((data_path / "mesh_mask_multi_files").glob("*.nc"))
+    out = recombine_domain_cfg(tmp_path / "mesh_mask.nc", files=files[:-1])
+    domcfg = open_domain_cfg(files=[out])
+    assert domcfg.e1t.isnull().any()
+    assert domcfg.tmask.dtype == open_domain_cfg(files=files).tmask.dtype
+
+
+def test_region(data_path, tmp_path):
+    """Test that opening a region gives the region of the full domcfg"""
+    datadir = data_path / "mesh_mask_multi_files"
+    files = list(datadir.glob("*.nc"))
+    domcfg = open_domain_cfg(datadir=datadir)
+    region = {"x": slice(2, 9), "y": (1, 5)}
+    expected = domcfg.isel(
+        x_c=slice(2, 9), x_f=slice(2, 9), y_c=slice(1, 5), y_f=slice(1, 5)
+    )
+    xr.testing.assert_identical(
+        open_domain_cfg(datadir=datadir, region=region), expected
+    )
+    xr.testing.assert_identical(
+        open_domain_cfg(datadir=datadir, region=region, cache_dir=tmp_path),
+        expected,
+    )
+    # the tiles outside of the region are not opened
+    assert len(_region_files(files, region)[0]) < len(files)
+    # lon/lat bounds, resolved into the smallest box of T points
+    point = domcfg.isel(x_c=5, y_c=3)
+    region = {"lon": (float(point.glamt),) * 2, "lat": (float(point.gphit),) * 2}
+    sub = open_domain_cfg(datadir=datadir, region=region)
+    assert (sub.x_c.values, sub.y_c.values) == ([5], [3])
+    assert (sub.x_f.values, sub.y_f.values) == ([5.5], [3.5])
+    for region in [{"x": (0, 2), "lon": (0, 1)}, {"x": (0, 2, 1)}, {"x": (-1, 2)}]:
+        with pytest.raises(ValueError):
+            open_domain_cfg(datadir=datadir, region=region)
+    with pytest.raises(ValueError):
+        open_domain_cfg(datadir=datadir, region={"lat": (90, 91)})
+
+
+def test_region_dateline(data_path):
+    """Test the lon/lat regions crossing the date line"""
+    datadir = data_path / "mesh_mask_multi_files"
+    glamt = open_domain_cfg(datadir=datadir).glamt
+    lon0, lon1 = np.percentile(glamt, [10, 90])
+    # the points with lon >= lon1 or lon <= lon0 are in the two corners of the grid
+    with pytest.raises(ValueError, match="both sides of the seam"):
+        open_domain_cfg(datadir=datadir, region={"lon": (lon1, lon0)})
+    # crossing the date line, without any point beyond it
+    xr.testing.assert_identical(
+        open_domain_cfg(
+            datadir=datadir, region={"lon": (lon1, float(glamt.min()) - 1)}
+        ),
+        open_domain_cfg(datadir=datadir, region={"lon": (lon1, 180)}),
+    )
+    # a grid whose columns cross the date line
+    lon = xr.DataArray(
+        [[150.0, 160, 170, 180, -170, -160]], coords={"y": [0], "x": np.arange(6)}
+    )
+    box = _resolve_region({"lon": (165, -165)}, lon, lon * 0)
+    assert box == {"x": (2, 5), "y": (0, 1)}
+    lon = lon.copy(data=[[-175.0, -160, 0, 20, 160, 175]])
+    with pytest.raises(ValueError, match=r"\[0, 1\) and \[5, 6\)"):
+        _resolve_region({"lon": (165, -165)}, lon, lon * 0)
+
+
+def test_variables(data_path, tmp_path):
+    """Test that only the requested variables and the coordinates are opened"""
+    datadir = data_path / "mesh_mask_multi_files"
+    domcfg = open_domain_cfg(datadir=datadir)
+    variables = ["e1t", "tmask"]
+    expected = domcfg.drop_vars([i for i in domcfg.data_vars if i not in variables])
+    xr.testing.assert_identical(
+        open_domain_cfg(datadir=datadir, variables=variables), expected
+    )
+    xr.testing.assert_identical(
+        open_domain_cfg(datadir=datadir, variables=variables, cache_dir=tmp_path),
+        expected,
+    )
+    domcfg = open_domain_cfg(
+        datadir=datadir, variables=variables, add_coordinates=False
+    )
+    assert set(domcfg.data_vars) == set(variables)
+    assert "glamt" not in domcfg.coords
+
+
+def test_load_coords(data_path, tmp_path):
+    """Test that the variables with at most 2 dimensions are loaded within the budget"""
+    datadir = data_path / "mesh_mask_multi_files"
+    domcfg = open_domain_cfg(datadir=datadir)
+    domcfg_loaded = open_domain_cfg(datadir=datadir, load_coords=True)
+    xr.testing.assert_identical(domcfg, domcfg_loaded)
+    loaded = [
+        name
+        for name, var in domcfg_loaded.variables.items()
+        if var.chunks is None and domcfg[name].chunks is not None
+    ]
+    assert "glamt" in loaded and "e1t" in loaded
+    assert all(domcfg[name].ndim <= 2 for name in loaded)
+    assert domcfg_loaded.tmask.chunks is not None
+    # budget, the coordinates being loaded first
+    budget = domcfg.glamt.nbytes + domcfg.gphit.nbytes
+    domcfg_loaded = open_domain_cfg(datadir=datadir, load_coords=budget)
+    loaded_bytes = [
+        var.nbytes
+        for name, var in domcfg_loaded.variables.items()
+        if var.chunks is None and domcfg[name].chunks is not None
+    ]
+    assert 0 < sum(loaded_bytes) <= budget
+    assert domcfg_loaded.e1t.chunks is not None
+    # memory-mapped from the cache, removed with the cache entry
+    cache_dir = tmp_path / "cache"
+    for _ in range(2):
+        domcfg_loaded = open_domain_cfg(
+            datadir=datadir, load_coords="auto", cache_dir=cache_dir
+        )
+        xr.testing.assert_identical(domcfg, domcfg_loaded)
+    memmaps = [
+        name
+        for name, var in domcfg_loaded.variables.items()
+        if isinstance(var._data, np.memmap)
+    ]
+    assert "glamt" in memmaps and "e1t" in memmaps
+    assert len(list(cache_dir.glob("*.npy"))) == len(memmaps)
+    open_domain_cfg(
+        datadir=datadir, cache_dir=cache_dir, cache_max_size=0, add_coordinates=False
+    )
+    assert not list(cache_dir.glob("*.npy"))
+    with pytest.raises(ValueError):
+        open_domain_cfg(datadir=datadir, load_coords="all")
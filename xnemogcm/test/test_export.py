@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import pytest
+import xarray as xr
+
+from xnemogcm import open_domain_cfg, open_nemo_and_domain_cfg, process_nemo, to_zarr
+from xnemogcm.export import zarr_chunks
+
+
+def test_zarr_chunks(data_path):
+    """Test that the centers and faces of an axis have the same chunks"""
+    p = data_path / "open_and_merge"
+    ds = open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+    chunks = zarr_chunks(ds, profile="space")
+    assert chunks["t"] == 1
+    assert chunks["z_c"] == chunks["z_f"] == ds.sizes["z_c"]
+    assert chunks["x_c"] == chunks["x_f"]
+    chunks = zarr_chunks(ds, profile="time")
+    assert chunks["t"] == ds.sizes["t"]
+    assert chunks["z_c"] == chunks["z_f"] == 1
+    with pytest.raises(ValueError):
+        zarr_chunks(ds, profile="depth")
+
+
+@pytest.mark.parametrize("profile", ["space", "time"])
+def test_to_zarr(data_path, tmp_path, profile):
+    """Test that the zarr store gives back the same dataset"""
+    pytest.importorskip("zarr")
+    p = data_path / "open_and_merge"
+    ds = open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+    to_zarr(ds, tmp_path / "ds.zarr", profile=profile)
+    ds_zarr = xr.open_zarr(tmp_path / "ds.zarr")
+    xr.testing.assert_identical(ds, ds_zarr)
+    chunks = zarr_chunks(ds, profile)
+    assert ds_zarr.toce.encoding["chunks"] == tuple(chunks[dim] for dim in ds.toce.dims)
+
+
+def test_to_zarr_append(data_path, tmp_path):
+    """Test appending time steps to a zarr store"""
+    pytest.importorskip("zarr")
+    domcfg = open_domain_cfg(datadir=data_path / "mesh_mask_1_file")
+    first, second = [], []
+    for i in ["T", "U", "V", "W"]:
+        ds = xr.open_dataset(data_path / f"nemo_no_grid_in_filename/{i}.nc")
+        ds_next = ds.assign_coords(time_counter=ds.time_counter + timedelta(days=1))
+        first.append((ds, i))
+        second.append((ds_next, i))
+    store = tmp_path / "ds.zarr"
+    to_zarr(process_nemo(first, domcfg), store, profile="time")
+    to_zarr(process_nemo(second, domcfg), store, append=True, parallel=2)
+    xr.testing.assert_identical(
+        process_nemo(first + second, domcfg), xr.open_zarr(store)
+    )
@@ -0,0 +1,49 @@
+import logging
+
+import pytest
+
+from xnemogcm import instrument, open_domain_cfg, open_nemo, open_nemo_and_domain_cfg
+
+
+def test_instrument(data_path):
+    """Test the events recorded when opening nemo files"""
+    p = data_path / "open_and_merge"
+    events = []
+    with instrument(callback=events.append) as report:
+        ds = open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+    assert events == report.events
+    stages = [event["stage"] for event in events]
+    for stage in ["glob", "domcfg", "scan", "open", "preprocess", "combine", "merge"]:
+        assert stage in stages
+    # the outer stage ends last
+    assert stages[-1] == "open_nemo_and_domain_cfg"
+    assert events[-1]["depth"] == 0
+    summary = report.summary()
+    assert summary["open"]["n_files"] == len(list(p.glob("*grid_*.nc")))
+    assert summary["open"]["file_bytes"] > 0
+    assert summary["merge"]["graph_size"] == len(ds.__dask_graph__())
+    assert all(event["time"] >= 0 for event in events)
+    assert "open_nemo" in repr(report)
+    # nothing is recorded outside of the block
+    open_domain_cfg(datadir=p)
+    assert report.events == events
+
+
+def test_instrument_logging(data_path, caplog):
+    """Test that the events are emitted by the logger, without instrument"""
+    with caplog.at_level(logging.DEBUG, logger="xnemogcm"):
+        open_domain_cfg(datadir=data_path / "open_and_merge")
+    events = [record.xnemogcm_event for record in caplog.records]
+    assert [event["stage"] for event in events] == [
+        "glob",
+        "domcfg",
+        "open_domain_cfg",
+    ]
+
+
+def test_instrument_failed(tmp_path):
+    """Test that a failing stage is recorded"""
+    with instrument() as report, pytest.raises(FileNotFoundError):
+        open_nemo(datadir=tmp_path, domcfg=None)
+    assert report.events[-1]["stage"] == "open_nemo"
+    assert report.events[-1]["failed"]
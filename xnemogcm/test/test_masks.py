@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from xnemogcm import compute_missing_masks, open_domain_cfg, open_nemo_and_domain_cfg
+from xnemogcm.masks import all_masks
+
+
+def test_compute_missing_masks(data_path):
+    """Test that the computed masks are the ones of the mesh_mask"""
+    domcfg = open_domain_cfg(datadir=data_path / "mesh_mask_multi_files")
+    names = [name for name in all_masks if name in domcfg and name != "tmask"]
+    new = compute_missing_masks(domcfg.drop_vars(names))
+    for name in names:
+        assert new[name].dtype == bool
+        np.testing.assert_array_equal(new[name], domcfg[name].astype(bool))
+    assert isinstance(new.umask.data, type(domcfg.tmask.data))
+    assert set(all_masks) <= set(new.variables)
+    assert new.wmask.dims == ("z_f", "y_c", "x_c")
+    np.testing.assert_array_equal(new.wmask[0], domcfg.tmask[0])
+    np.testing.assert_array_equal(
+        new.wmask[1:], domcfg.tmask[1:].values & domcfg.tmask[:-1].values
+    )
+    with pytest.raises(ValueError):
+        compute_missing_masks(domcfg, ["e3t"])
+
+
+def test_tmask_from_levels(data_path):
+    """Test computing the tmask from top_level and bottom_level"""
+    domcfg = open_domain_cfg(datadir=data_path / "domcfg_mesh_mask")
+    if "bottom_level" not in domcfg:
+        pytest.skip("no top_level and bottom_level")
+    new = compute_missing_masks(domcfg.drop_vars(all_masks, errors="ignore"))
+    for name in ["tmask", "umask", "vmask", "fmask", "tmaskutil"]:
+        np.testing.assert_array_equal(new[name], domcfg[name].astype(bool))
+    with pytest.raises(ValueError):
+        compute_missing_masks(domcfg.drop_vars(["tmask", "top_level"]))
+
+
+def test_bool_masks(data_path, tmp_path):
+    """Test opening the domcfg with boolean masks"""
+    p = data_path / "mesh_mask_multi_files"
+    domcfg = open_domain_cfg(datadir=p)
+    domcfg_bool = open_domain_cfg(datadir=p, bool_masks=True)
+    for name in all_masks:
+        if name in domcfg:
+            assert domcfg_bool[name].dtype == bool
+            np.testing.assert_array_equal(domcfg_bool[name], domcfg[name] != 0)
+    assert domcfg_bool.e1t.dtype == domcfg.e1t.dtype
+    # the int8 and boolean masks loaded from the same cache entry
+    for bool_masks in [False, True]:
+        loaded = open_domain_cfg(
+            datadir=p, load_coords=True, cache_dir=tmp_path, bool_masks=bool_masks
+        )
+        assert isinstance(loaded.tmaskutil.variable._data, np.memmap)
+        assert (loaded.tmaskutil.dtype == bool) == bool_masks
+
+
+def test_accessor_mask(data_path):
+    """Test masking the variables with the mask of their grid point"""
+    p = data_path / "open_and_merge"
+    ds = open_nemo_and_domain_cfg(
+        nemo_files=p, domcfg_files=p, domcfg_kwargs={"bool_masks": True}
+    )
+    masked = ds.xnemogcm.mask()
+    for name, mask in [("toce", "tmask"), ("uoce", "umask"), ("voce", "vmask")]:
+        xr.testing.assert_identical(masked[name], ds[name].where(ds[mask]))
+    xr.testing.assert_identical(masked.tmask, ds.tmask)
+    assert masked.woce.isnull().any()
+    xr.testing.assert_identical(
+        ds.xnemogcm.mask("toce", other=0), ds.toce.where(ds.tmask, 0)
+    )
+    assert ds.xnemogcm.get_mask("wmask").dtype == bool
+    assert ds.xnemogcm.get_mask("wmask") is ds.xnemogcm.get_mask("wmask")
+    with pytest.raises(ValueError):
+        ds.xnemogcm.mask("t_bounds")
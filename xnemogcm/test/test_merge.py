@@ -1,4 +1,6 @@
+import xarray as xr
 from xnemogcm import (
+    instrument,
     open_domain_cfg,
     open_nemo,
     _merge_nemo_and_domain_cfg,
@@ -57,3 +59,37 @@ def test_open_nemo_files_without_datadir(data_path):
         nemo_files=p.glob("*_grid*.nc"), domcfg_files=p.glob("mesh_mask*.nc")
     )
     assert ds
+
+
+def test_variables(data_path):
+    """Test that only the requested variables and the scale factors are opened"""
+    p = data_path / "open_and_merge"
+    ds = open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+    ds_variables = open_nemo_and_domain_cfg(
+        nemo_files=p, domcfg_files=p, variables=["toce", "tmask"]
+    )
+    assert "toce" in ds_variables and "tmask" in ds_variables
+    assert "e1t" in ds_variables
+    assert "uoce" not in ds_variables and "umask" not in ds_variables
+    assert (ds_variables.toce == ds.toce).all()
+
+
+def test_merge_aligned(data_path):
+    """Test that the merge without alignment gives the same dataset as with alignment"""
+    domcfg = open_domain_cfg(datadir=data_path / "mesh_mask_1_file")
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    attrs = dict(domcfg.attrs)
+    with instrument() as report:
+        ds = _merge_nemo_and_domain_cfg(nemo_ds, domcfg, linear_free_surface=True)
+    assert [i["aligned"] for i in report.events if i["stage"] == "merge"] == [True]
+    # domcfg is not modified
+    assert domcfg.attrs == attrs
+    assert all("WARNING" not in var.attrs for var in domcfg.variables.values())
+    # a coordinate not taken from domcfg: the datasets are aligned and compared
+    nemo_ds = nemo_ds.assign_coords(glamt=nemo_ds.glamt + 0)
+    with instrument() as report:
+        ds_compared = _merge_nemo_and_domain_cfg(
+            nemo_ds, domcfg, linear_free_surface=True
+        )
+    assert [i["aligned"] for i in report.events if i["stage"] == "merge"] == [False]
+    xr.testing.assert_identical(ds, ds_compared)
@@ -1,4 +1,9 @@
-from xnemogcm import open_nemo_and_domain_cfg
+from unittest import mock
+import numpy as np
+import pytest
+import xarray as xr
+from xnemogcm import open_domain_cfg, open_nemo_and_domain_cfg
+from xnemogcm.boundaries import get_periodicity, lbc_lnk
 from xnemogcm.metrics import get_metrics, compute_missing_metrics
 
 
@@ -65,3 +70,122 @@ def test_calculate_all_metrics(data_path):
 def test_calculate_all_metrics_precision(data_path):
     """Should do some tests of precision of the calculated metrics"""
     pass
+
+
+@pytest.mark.parametrize("time_varying", [True, False])
+@pytest.mark.parametrize(
+    "drop", [[], ["e3u", "e3v", "e3w"], ["e3u_0", "e3v_0", "e3f_0", "e3w_0"]]
+)
+def test_numpy_engine(data_path, time_varying, drop):
+    """Test that the numpy engine gives the same results as xgcm"""
+    p = data_path / "open_and_merge"
+    ds = open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+    ds = ds.drop_vars(drop, errors="ignore").chunk({"x_c": 5, "x_f": 5, "z_c": 2})
+    expected = compute_missing_metrics(ds.copy(), time_varying=time_varying)
+    result = compute_missing_metrics(
+        ds.copy(), time_varying=time_varying, engine="numpy"
+    )
+    xr.testing.assert_identical(expected.load(), result.load())
+    with pytest.raises(ValueError):
+        compute_missing_metrics(ds.copy(), engine="fortran")
+
+
+def test_lazy_metrics(data_path):
+    """Test that the lazy scale factors are only computed when read"""
+    p = data_path / "open_and_merge"
+    ds = open_nemo_and_domain_cfg(nemo_files=p, domcfg_files=p)
+    ds = ds.drop_vars(["e3u", "e3v", "e3w"], errors="ignore")
+    expected = compute_missing_metrics(ds.copy(), engine="numpy")
+    lazy = compute_missing_metrics(ds.copy(), lazy=True)
+    assert get_metrics(lazy) == get_metrics(expected)
+    # not loaded, and not in a dask graph
+    assert lazy.e3f.chunks is None
+    backend = lazy.e3f.variable._data.array
+    ny = lazy.sizes["y_f"]
+    # a region is computed alone
+    region = {"x_f": slice(3, 9), "y_f": -1}
+    with mock.patch.object(backend, "_compute", wraps=backend._compute) as compute:
+        xr.testing.assert_identical(
+            expected.e3f.isel(region).load(), lazy.e3f.isel(region).load()
+        )
+        (computed,) = compute.call_args.args
+        assert computed[lazy.e3f.dims.index("x_f")] == slice(3, 9)
+        assert computed[lazy.e3f.dims.index("y_f")] == slice(ny - 1, ny)
+    for region in [{"x_f": slice(None, None, -2)}, {"y_f": slice(8, 1, -3), "t": 0}]:
+        xr.testing.assert_identical(
+            expected.e3f.isel(region).load(), lazy.e3f.isel(region).load()
+        )
+    # the scale factor is kept once read entirely, unless cache_lazy=False
+    for cache_lazy, n_calls in [(True, 1), (False, 2)]:
+        lazy = compute_missing_metrics(ds.copy(), lazy=True, cache_lazy=cache_lazy)
+        backend = lazy.e3f.variable._data.array
+        with mock.patch.object(backend, "_compute", wraps=backend._compute) as compute:
+            for _ in range(2):
+                xr.testing.assert_identical(expected.e3f.load(), lazy.e3f.compute())
+            assert compute.call_count == n_calls
+    xr.testing.assert_identical(
+        expected.load(), lazy.chunk({"x_c": 5, "x_f": 5}).load()
+    )
+    with pytest.raises(ValueError):
+        compute_missing_metrics(ds.copy(), lazy=True, engine="xgcm")
+
+
+def test_nemo_engine(data_path):
+    """Test that the nemo engine gives the scale factors of the NEMO files"""
+    domcfg_files = data_path / "domcfg_mesh_mask"
+    domcfg = open_domain_cfg(datadir=domcfg_files)
+    if "e3u_0" not in domcfg:
+        pytest.skip("No reference scale factors in the domcfg files")
+    names = ["e3u_0", "e3v_0", "e3f_0", "e3w_0", "e3uw_0", "e3vw_0"]
+    result = compute_missing_metrics(
+        domcfg.drop_vars(names), time_varying=False, engine="nemo"
+    )
+    for name in names:
+        xr.testing.assert_allclose(result[name], domcfg[name])
+
+    ds = open_nemo_and_domain_cfg(
+        nemo_files=data_path / "open_and_merge", domcfg_files=domcfg_files
+    )
+    result = compute_missing_metrics(
+        ds.drop_vars(["e3u", "e3v", "e3w"]).chunk({"x_c": 5, "x_f": 5}),
+        engine="nemo",
+    )
+    assert result.e3f.chunks is not None
+    for name, mask in [("e3u", "umask"), ("e3v", "vmask"), ("e3w", "tmask")]:
+        ocean = ds[mask].values == 1
+        np.testing.assert_allclose(
+            np.where(ocean, result[name], 0), np.where(ocean, ds[name], 0), atol=1e-5
+        )
+    # the vertical scheme of the other nemo versions
+    scheme = "vvl" if "Iperio" in ds.attrs else "qco"
+    result = compute_missing_metrics(
+        ds.drop_vars(["e3w"]), engine="nemo", scheme=scheme
+    )
+    assert abs(result.e3w - ds.e3w).max() > 1e-3
+
+
+@pytest.mark.parametrize("jperio", [4, 6])
+def test_nemo_engine_periodic(data_path, jperio):
+    """Test the east-west periodicity and the north fold of the nemo engine"""
+    domcfg = open_domain_cfg(datadir=data_path / "domcfg_mesh_mask")
+    domcfg = domcfg.drop_vars(["jperio"], errors="ignore")
+    domcfg.attrs.pop("Iperio", None)
+    domcfg["jperio"] = jperio
+    periodicity = get_periodicity(domcfg)
+    assert periodicity == (True, False, "T" if jperio == 4 else "F")
+    result = compute_missing_metrics(
+        domcfg.drop_vars(["e3u_0", "e3v_0", "e3f_0", "e3w_0"], errors="ignore"),
+        time_varying=False,
+        engine="nemo",
+    )
+    for name, point_type in [("e3u_0", "U"), ("e3f_0", "F"), ("e3w_0", "W")]:
+        var = result[name]
+        x = var.dims[-1]
+        # cyclic columns, and halos already set
+        np.testing.assert_equal(var.isel({x: 0}).values, var.isel({x: -2}).values)
+        xr.testing.assert_equal(var, lbc_lnk(var, point_type, periodicity))
+    # T pivot: the last row is the symmetric of the row -3
+    n = domcfg.sizes["x_c"]
+    field = xr.DataArray(np.random.rand(6, n), dims=("y_c", "x_c"))
+    field = lbc_lnk(field, "T", (True, False, "T"))
+    np.testing.assert_equal(field[-1, 1:].values, field[-3, n - np.arange(1, n)].values)
@@ -1,6 +1,10 @@
+from datetime import timedelta
+from unittest import mock
 import pytest
-from xnemogcm import open_domain_cfg, open_nemo, process_nemo
-from xnemogcm.nemo import nemo_preprocess
+from xnemogcm import instrument, open_domain_cfg, open_nemo, process_nemo
+from xnemogcm.nemo import nemo_preprocess, _scan_nemo_files
+from xnemogcm.recombine import recombine_nemo
+from xnemogcm.tools import _read_header
 import xarray as xr
 
 # ruff: noqa: F841
@@ -149,6 +153,22 @@ def test_use_preprocess(data_path):
     assert "t" in ds
 
 
+def test_preprocess_attach_coords(data_path):
+    """Test that the coordinates of domcfg are attached once, sharing the arrays of domcfg"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    ).load()
+    ds_raw = xr.open_dataset(data_path / "nemo/GYRE_1y_00010101_00011230_grid_T.nc")
+    ds = nemo_preprocess(ds_raw, domcfg, "T")
+    ds_dims = nemo_preprocess(ds_raw, domcfg, "T", attach_coords=False)
+    assert "glamt" in ds.coords and "glamt" not in ds_dims.coords
+    domcfg_coords = [i for i in ds.coords if i in domcfg.coords and i not in ds.dims]
+    xr.testing.assert_identical(ds_dims, ds.drop_vars(domcfg_coords))
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    for name in ["glamt", "glamu", "gdept_1d"]:
+        assert nemo_ds[name].variable._data is domcfg[name].variable._data
+
+
 def test_use_preprocess_no_time_bound(data_path):
     """Test that if the time_bound variable does not exist, no error is raised"""
     domcfg = open_domain_cfg(
@@ -206,3 +226,245 @@ def test_coordinates_vertical_1d(data_path, request):
         domcfg=domcfg,
     )
     assert "gdept_1d" in nemo_ds.toce.coords
+
+
+def test_open_nemo_parallel_identical(data_path):
+    """Test that opening the files in a pool of processes gives the same dataset"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    nemo_ds_parallel = open_nemo(datadir=data_path / "nemo", domcfg=domcfg, parallel=2)
+    xr.testing.assert_identical(nemo_ds, nemo_ds_parallel)
+    # the region and variables are applied in the workers
+    kwargs = {"region": {"x": (2, 9)}, "variables": ["toce", "uoce"]}
+    xr.testing.assert_identical(
+        open_nemo(datadir=data_path / "nemo", domcfg=domcfg, **kwargs),
+        open_nemo(datadir=data_path / "nemo", domcfg=domcfg, parallel=2, **kwargs),
+    )
+    # process_nemo preprocesses the datasets in the same pool
+    positions = [
+        (xr.open_dataset(f, chunks={}), None)
+        for f in sorted((data_path / "nemo").glob("*grid_*.nc"))
+    ]
+    for ds, _ in positions:
+        ds.attrs["description"] = (
+            "ocean " + ds.encoding["source"][-4] + " grid variables"
+        )
+    xr.testing.assert_identical(
+        process_nemo(positions, domcfg), process_nemo(positions, domcfg, parallel=2)
+    )
+
+
+def test_scan_nemo_files(data_path):
+    """Test that the point types are found from the file headers only"""
+    files = sorted((data_path / "nemo_no_grid_in_filename").glob("*.nc"))
+    groups = _scan_nemo_files(files)
+    assert [key[0] for key in groups] == ["T", "U", "V", "W"]
+    for (point_type, variables), group in groups.items():
+        ((f, scan),) = group
+        assert f == data_path / f"nemo_no_grid_in_filename/{point_type}.nc"
+        assert "time_counter" in variables
+        assert scan["point_type"] == point_type
+
+
+def test_open_nemo_skip_scan(data_path):
+    """Test that the headers are only read when needed"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    datadir = data_path / "nemo"
+    with mock.patch(
+        "xnemogcm.nemo._read_header", side_effect=_read_header
+    ) as read_header:
+        nemo_ds = open_nemo(datadir=datadir, domcfg=domcfg)
+        read_header.assert_not_called()
+        nemo_ds_toce = open_nemo(datadir=datadir, domcfg=domcfg, variables=["toce"])
+        assert read_header.call_count == 4
+    xr.testing.assert_equal(
+        nemo_ds.toce.reset_coords(drop=True), nemo_ds_toce.toce.reset_coords(drop=True)
+    )
+
+
+def test_process_nemo_combine_time_split(data_path):
+    """Test the combination of files split along time"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    positions = []
+    for i in ["T", "U", "V", "W"]:
+        ds = xr.open_dataset(data_path / f"nemo_no_grid_in_filename/{i}.nc")
+        ds_next = ds.assign_coords(time_counter=ds.time_counter + timedelta(days=1))
+        # unordered on purpose
+        positions += [(ds_next, i), (ds, i)]
+    nemo_ds = process_nemo(positions=positions, domcfg=domcfg)
+    nemo_ds_coords = process_nemo(
+        positions=positions, domcfg=domcfg, combine="by_coords"
+    )
+    assert nemo_ds.sizes["t"] == 2
+    assert nemo_ds.indexes["t"].is_monotonic_increasing
+    for i in ["toce", "uoce", "t_bounds"]:
+        xr.testing.assert_identical(nemo_ds[i], nemo_ds_coords[i])
+    with pytest.raises(ValueError):
+        process_nemo(positions=positions, domcfg=domcfg, combine="nested")
+
+
+def _split_tiles(datadir, tiles_dir, skip=()):
+    """
+    Write the nemo files of *datadir* as 2x2 processor tiles, as in the 'multiple_file'
+    mode of XIOS, without the tiles whose number is in *skip* (land processors)
+    """
+    import netCDF4
+
+    tiles_dir.mkdir()
+    for f in datadir.glob("*grid_*.nc"):
+        with netCDF4.Dataset(f) as nc:
+            nc.set_auto_maskandscale(False)
+            sizes = {d: len(dim) for d, dim in nc.dimensions.items()}
+            nx = next(n for d, n in sizes.items() if d.startswith("x"))
+            ny = next(n for d, n in sizes.items() if d.startswith("y"))
+            for i, (x0, y0) in enumerate(
+                [(0, 0), (nx // 2, 0), (0, ny // 2), (nx // 2, ny // 2)]
+            ):
+                if i in skip:
+                    continue
+                x1 = nx // 2 if x0 == 0 else nx
+                y1 = ny // 2 if y0 == 0 else ny
+                index = {d: slice(x0, x1) for d in sizes if d.startswith("x")}
+                index |= {d: slice(y0, y1) for d in sizes if d.startswith("y")}
+                with netCDF4.Dataset(tiles_dir / f"{f.stem}_{i:04d}.nc", "w") as tile:
+                    for d, dim in nc.dimensions.items():
+                        size = (
+                            index[d].stop - index[d].start if d in index else sizes[d]
+                        )
+                        tile.createDimension(d, None if dim.isunlimited() else size)
+                    for name, var in nc.variables.items():
+                        attrs = var.__dict__
+                        out = tile.createVariable(
+                            name,
+                            var.dtype,
+                            var.dimensions,
+                            fill_value=attrs.pop("_FillValue", None),
+                        )
+                        out.setncatts(attrs)
+                        out.set_auto_maskandscale(False)
+                        out[...] = var[
+                            tuple(index.get(d, slice(None)) for d in var.dimensions)
+                        ]
+                    tile.setncatts(nc.__dict__)
+                    tile.setncatts(
+                        {
+                            "DOMAIN_number": i,
+                            "DOMAIN_size_global": [nx, ny],
+                            "DOMAIN_size_local": [x1 - x0, y1 - y0],
+                            "DOMAIN_position_first": [x0 + 1, y0 + 1],
+                            "DOMAIN_position_last": [x1, y1],
+                        }
+                    )
+
+
+def test_open_nemo_tiles(data_path, tmp_path):
+    """Test that the per-processor files are placed on the global grid"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    _split_tiles(data_path / "nemo", tmp_path / "tiles")
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    nemo_ds_tiles = open_nemo(datadir=tmp_path / "tiles", domcfg=domcfg)
+    xr.testing.assert_identical(nemo_ds, nemo_ds_tiles)
+    # one chunk per tile
+    assert len(nemo_ds_tiles.toce.chunks[-1]) == 2
+
+
+def test_open_nemo_missing_tile(data_path, tmp_path):
+    """Test that the tiles removed by NEMO (land processors) are filled with NaN"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    _split_tiles(data_path / "nemo", tmp_path / "tiles", skip=[3])
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    nemo_ds_tiles = open_nemo(datadir=tmp_path / "tiles", domcfg=domcfg)
+    land = {"x_c": slice(nemo_ds.sizes["x_c"] // 2, None)}
+    land["y_c"] = slice(nemo_ds.sizes["y_c"] // 2, None)
+    assert nemo_ds_tiles.toce.isel(land).isnull().all()
+    xr.testing.assert_identical(
+        nemo_ds.toce.isel(x_c=slice(0, nemo_ds.sizes["x_c"] // 2)),
+        nemo_ds_tiles.toce.isel(x_c=slice(0, nemo_ds.sizes["x_c"] // 2)),
+    )
+
+
+def test_recombine_nemo(data_path, tmp_path, monkeypatch):
+    """Test that the recombined files give the same dataset"""
+    # read the tiles by bands of a few time steps and variables
+    monkeypatch.setattr("xnemogcm.recombine._BAND_BYTES", 1000)
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    _split_tiles(data_path / "nemo", tmp_path / "tiles")
+    out_files = recombine_nemo(
+        tmp_path / "recombined", datadir=tmp_path / "tiles", parallel=2
+    )
+    assert sorted(f.name for f in out_files) == sorted(
+        f.name for f in (data_path / "nemo").glob("*.nc")
+    )
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    nemo_ds_recombined = open_nemo(datadir=tmp_path / "recombined", domcfg=domcfg)
+    xr.testing.assert_identical(nemo_ds, nemo_ds_recombined)
+
+
+def test_open_nemo_region(data_path, tmp_path):
+    """Test that opening a region gives the region of the full dataset"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    nx, ny = nemo_ds.sizes["x_c"] // 2, nemo_ds.sizes["y_c"] // 2
+    region = {"x": (1, nx), "y": (2, ny)}
+    index = {"x_c": slice(1, nx), "x_f": slice(1, nx)}
+    index |= {"y_c": slice(2, ny), "y_f": slice(2, ny)}
+    expected = nemo_ds.isel(index)
+    xr.testing.assert_identical(
+        open_nemo(datadir=data_path / "nemo", domcfg=domcfg, region=region),
+        expected,
+    )
+    # with the domcfg of the region
+    domcfg_region = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file", region=region
+    )
+    xr.testing.assert_identical(
+        open_nemo(datadir=data_path / "nemo", domcfg=domcfg_region, region=region),
+        expected,
+    )
+    # only the tile within the region is opened, out of the 4 tiles of each file
+    _split_tiles(data_path / "nemo", tmp_path / "tiles")
+    with instrument() as report:
+        nemo_ds_tiles = open_nemo(
+            datadir=tmp_path / "tiles", domcfg=domcfg, region=region
+        )
+    assert report.summary()["open"]["n_files"] == len(
+        list((data_path / "nemo").glob("*.nc"))
+    )
+    xr.testing.assert_identical(nemo_ds_tiles, expected)
+
+
+def test_open_nemo_variables(data_path):
+    """Test that only the files and variables needed are opened"""
+    domcfg = open_domain_cfg(
+        datadir=data_path / "mesh_mask_1_file",
+    )
+    nemo_ds = open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    with instrument() as report:
+        nemo_ds_variables = open_nemo(
+            datadir=data_path / "nemo", domcfg=domcfg, variables=["toce", "voce"]
+        )
+    # only the T and V files are opened
+    assert report.summary()["open"]["n_files"] == 2
+    assert {"toce", "voce"} <= set(nemo_ds_variables.data_vars)
+    assert "soce" not in nemo_ds_variables and "uoce" not in nemo_ds_variables
+    # the coordinates of the dropped variables (e.g. 'nav_lon_grid_T_3D_inner') are not kept
+    xr.testing.assert_identical(
+        nemo_ds_variables.reset_coords(drop=True),
+        nemo_ds[list(nemo_ds_variables.data_vars)].reset_coords(drop=True),
+    )
+    with pytest.raises(FileNotFoundError):
+        open_nemo(datadir=data_path / "nemo", domcfg=domcfg, variables=["foo"])
@@ -0,0 +1,48 @@
+import shutil
+from datetime import timedelta
+
+import xarray as xr
+
+from xnemogcm import NemoRunWatcher, open_domain_cfg, open_nemo
+
+
+def _write_next_year(datadir):
+    """Write the outputs of the next year, shifting the time of the existing files"""
+    for f in list(datadir.glob("*grid_*.nc")):
+        with xr.open_dataset(f, decode_times=False) as ds:
+            ds = ds.load()
+        ds = ds.assign_coords(time_counter=ds.time_counter + 365 * 86400)
+        ds["time_counter"].attrs = ds.time_counter.attrs
+        ds.to_netcdf(datadir / f.name.replace("00010101", "00020101"))
+
+
+def test_watcher(data_path, tmp_path):
+    domcfg = open_domain_cfg(datadir=data_path / "mesh_mask_1_file")
+    datadir = tmp_path / "nemo"
+    shutil.copytree(data_path / "nemo", datadir)
+    watcher = NemoRunWatcher(domcfg, datadir, min_age=0)
+    nemo_ds = watcher.update()
+    xr.testing.assert_identical(
+        nemo_ds, open_nemo(datadir=data_path / "nemo", domcfg=domcfg)
+    )
+    xr.testing.assert_identical(nemo_ds, watcher.dataset)
+    assert watcher.update() is None
+
+    _write_next_year(datadir)
+    slab = watcher.update()
+    assert slab.sizes["t"] == 1
+    assert slab.t.values[0] - nemo_ds.t.values[0] == timedelta(days=365)
+    assert watcher.dataset.sizes["t"] == 2
+    xr.testing.assert_identical(watcher.dataset.isel(t=[0]), nemo_ds)
+    xr.testing.assert_identical(watcher.dataset.toce.isel(t=[1]), slab.toce)
+    # nothing new
+    assert list(watcher.watch(poll_interval=0, timeout=0)) == []
+
+
+def test_watcher_min_age(data_path, tmp_path):
+    domcfg = open_domain_cfg(datadir=data_path / "mesh_mask_1_file")
+    datadir = tmp_path / "nemo"
+    shutil.copytree(data_path / "nemo", datadir, copy_function=shutil.copy)
+    watcher = NemoRunWatcher(domcfg, datadir, min_age=3600)
+    # files just copied, considered as still being written
+    assert watcher.update() is None
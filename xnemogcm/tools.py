@@ -1,6 +1,11 @@
+import os
+import re
 from pathlib import Path
+from functools import partial
 from itertools import chain
 
+from .instrument import _stage
+
 
 def _dir_or_files_to_files(datadir=None, files=None, patterns=[]):
     """
@@ -38,13 +43,150 @@ def _dir_or_files_to_files(datadir=None, files=None, patterns=[]):
         datadir = Path(datadir).expanduser()
         if not files:
             # understood as taking all mesh_mask and domain_cfg files from datadir
-            files = chain(*[datadir.glob(pattern) for pattern in patterns])
+            with _stage("glob", patterns=patterns, n_files=lambda: len(files)):
+                files = list(chain(*[datadir.glob(pattern) for pattern in patterns]))
         else:
             # understood as taking [datadir / files[0], datadir / files[1], ...]
             files = [datadir / file for file in files]
     return list(files)
 
 
+def _parallel_map(func, *iterables, parallel=False, **kwargs):
+    """
+    Return list(map(func, *iterables)), computed in a pool of processes if *parallel*.
+
+    netcdf4 is not thread safe, so processes are used instead of threads.
+    The default multiprocessing start method is used, it can be changed with
+    multiprocessing.set_start_method.
+
+    parallel : bool or int
+        If True, use one process per CPU, if an int, the number of processes
+    kwargs : passed to each call of func
+    """
+    func = partial(func, **kwargs)
+    iterables = [list(i) for i in iterables]
+    if not parallel:
+        return list(map(func, *iterables))
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    max_workers = os.cpu_count() or 1 if parallel is True else int(parallel)
+    with ProcessPoolExecutor(max_workers) as executor:
+        return list(
+            executor.map(
+                func,
+                *iterables,
+                chunksize=max(1, len(iterables[0]) // (4 * max_workers)),
+            )
+        )
+
+
+def _parallel_imap(func, *iterables, parallel=False, **kwargs):
+    """
+    Yield the results of map(func, *iterables) in order, computed in a pool of
+    processes if *parallel*.
+
+    Unlike _parallel_map, at most 2 tasks per process are running or waiting to be
+    consumed, so that the results are streamed and never all held in memory.
+
+    parallel : bool or int
+        If True, use one process per CPU, if an int, the number of processes
+    kwargs : passed to each call of func
+    """
+    func = partial(func, **kwargs)
+    if not parallel:
+        yield from map(func, *iterables)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    max_workers = os.cpu_count() or 1 if parallel is True else int(parallel)
+    with ProcessPoolExecutor(max_workers) as executor:
+        pending = deque()
+        for args in zip(*iterables):
+            pending.append(executor.submit(func, *args))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _storage_chunks(var):
+    """
+    Return the storage chunks of a netCDF4 variable, None if it is not chunked
+    """
+    chunking = var.chunking()
+    return chunking if isinstance(chunking, list) else None
+
+
+def _read_header(file):
+    """
+    Return the global attributes, the dimensions and the variables of a netcdf file.
+
+    Only the header of the file is read: no data is read or decoded.
+    Returns None if the file can not be read by the netcdf4 library (e.g. a zarr store).
+
+    Returns
+    -------
+    header : dict or None
+        {'attrs': {name: value}, 'dims': {name: size}, 'variables': {name: dims},
+        'coords': {dim: attrs}, 'chunking': {name: storage chunks}}
+        'coords' contains the attributes of the variables named as a dimension,
+        and the storage chunks are None for contiguous variables.
+    """
+    import netCDF4
+
+    try:
+        with netCDF4.Dataset(file, "r") as nc:
+            return {
+                "attrs": {i: nc.getncattr(i) for i in nc.ncattrs()},
+                "dims": {i: len(dim) for i, dim in nc.dimensions.items()},
+                "variables": {i: var.dimensions for i, var in nc.variables.items()},
+                "coords": {
+                    i: {j: nc[i].getncattr(j) for j in nc[i].ncattrs()}
+                    for i in nc.dimensions
+                    if i in nc.variables
+                },
+                "chunking": {
+                    i: _storage_chunks(var) for i, var in nc.variables.items()
+                },
+            }
+    except OSError:
+        return None
+
+
+def _same_data(a, b):
+    """
+    Whether the variables *a* and *b* hold the same data, comparing the dask graph
+    names or the array objects, without computing or reading anything
+    """
+    if a.dims != b.dims or a.shape != b.shape:
+        return False
+    if a.data is b.data:
+        return True
+    name_a = getattr(a.data, "name", None)
+    return name_a is not None and name_a == getattr(b.data, "name", None)
+
+
+def _is_x_dim(i):
+    # e.g. x, x_grid_U, x_grid_U_inner etc
+    return "x_grid" in i or i == "x"
+
+
+def _is_y_dim(i):
+    # e.g. y, y_grid_U, y_grid_U_inner etc
+    return "y_grid" in i or i == "y"
+
+
+def _tile_stem(file):
+    """
+    Return the name of the file *file* without its processor number, e.g.
+    'GYRE_1y_grid_T' for 'GYRE_1y_grid_T_0003.nc'
+    """
+    return re.sub(r"_\d+$", "", Path(file).stem)
+
+
 def get_domcfg_points():
     """The points are hard coded at hand to be sure to not introduce errors from the reading of the names"""
     domcfg_points = {
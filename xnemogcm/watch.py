@@ -0,0 +1,143 @@
+import time
+from pathlib import Path
+
+from .nemo import (
+    _add_attributes,
+    _attach_coords,
+    _concat_by_point,
+    _concat_time,
+    _merge_groups,
+    _scan_and_open_nemo_files,
+)
+from .tools import _dir_or_files_to_files
+
+
+class NemoRunWatcher:
+    """
+    Incrementally open the outputs of a NEMO run that is still being written.
+
+    The files already processed are kept in memory, and only the new files found in
+    *datadir* are opened, preprocessed with the stored domcfg, and appended along 't'.
+
+    Examples
+    --------
+    >>> watcher = NemoRunWatcher(domcfg, "path/to/run")
+    >>> nemo_ds = watcher.update()  # all files present in the directory
+    >>> for slab in watcher.watch(poll_interval=600):
+    ...     diagnostic(slab)  # only the new time steps
+    """
+
+    def __init__(
+        self,
+        domcfg,
+        datadir,
+        chunks=None,
+        parallel=False,
+        min_age=60,
+        **kwargs_open,
+    ):
+        """
+        Parameters
+        ----------
+        domcfg : xarray.Dataset
+            the domcfg dataset, e.g. opened with xnemogcm.open_domain_cfg
+        datadir : string or pathlib.Path
+            The directory containing the nemo files, the files matching '*grid_*.nc' are opened
+        chunks, parallel, kwargs_open :
+            see xnemogcm.open_nemo
+        min_age : float, default 60
+            Files modified less than *min_age* seconds ago are considered still being
+            written by NEMO, and are only opened by a later update
+        """
+        self.domcfg = domcfg
+        self.datadir = Path(datadir).expanduser()
+        self.chunks = chunks
+        self.parallel = parallel
+        self.min_age = min_age
+        self.kwargs_open = kwargs_open
+        self.files = set()
+        self.dataset = None
+        self._groups = {}
+
+    def new_files(self):
+        """
+        Return the files of *datadir* that are complete and not yet processed
+        """
+        files = _dir_or_files_to_files(self.datadir, None, patterns=["*grid_*.nc"])
+        now = time.time()
+        return sorted(
+            f
+            for f in files
+            if f not in self.files and now - f.stat().st_mtime >= self.min_age
+        )
+
+    def update(self):
+        """
+        Open the new files and append them to the dataset.
+
+        The full dataset is available as the *dataset* attribute.
+
+        Returns
+        -------
+        slab : xarray.Dataset or None
+            The dataset of the new files only, None if no new file is found
+        """
+        files = self.new_files()
+        if not files:
+            return None
+        positions = _scan_and_open_nemo_files(
+            files,
+            self.domcfg,
+            self.chunks,
+            self.parallel,
+            self.kwargs_open,
+        )
+        datasets = [ds for ds, _ in positions]
+        groups = _concat_by_point(datasets, [X for _, X in positions])
+        if groups is None:
+            raise ValueError(
+                "The new files can not be concatenated along time, use open_nemo instead"
+            )
+        for key, ds in groups.items():
+            if key in self._groups:
+                ds = _concat_time([self._groups[key], ds])
+            self._groups[key] = ds
+        self.files.update(files)
+        # the coordinates of domcfg are attached once to the merged datasets
+        self.dataset = _add_attributes(
+            _attach_coords(
+                _merge_groups(self._groups.values()),
+                self.domcfg,
+                self._groups.values(),
+            )
+        )
+        return _add_attributes(
+            _attach_coords(_merge_groups(groups.values()), self.domcfg, datasets)
+        )
+
+    def watch(self, poll_interval=60, timeout=None):
+        """
+        Generator yielding the new time slabs as soon as new files are written.
+
+        Parameters
+        ----------
+        poll_interval : float, default 60
+            Time in seconds between two checks of the directory
+        timeout : float or None
+            Stop after *timeout* seconds without any new file. If None, never stop.
+
+        Yields
+        ------
+        slab : xarray.Dataset
+            The dataset of the new files, see NemoRunWatcher.update
+        """
+        last = time.monotonic()
+        while True:
+            slab = self.update()
+            if slab is not None:
+                last = time.monotonic()
+                yield slab
+            elif timeout is not None and time.monotonic() - last >= timeout:
+                return
+            else:
+                time.sleep(poll_interval)